@@ -0,0 +1,218 @@
+"""
+Write-behind для GPS-точек курьеров (COURIER_LOCATION_WRITE_BEHIND=1).
+
+post_location только кладет точку в буфер и отвечает 202; в CourierLocation точки уезжают пачками
+bulk_create по COURIER_LOCATION_FLUSH_BATCH. Буфер:
+- Redis-список (COURIER_LOCATION_BUFFER_URL, по умолчанию — Redis кэша): общий для всех воркеров,
+  сбрасывает beat-задача courier.tasks.flush_courier_locations;
+- без Redis — deque процесса: сбрасывает фоновый поток раз в COURIER_LOCATION_FLUSH_INTERVAL сек.
+  (0 — потока нет, сброс только явный: тесты) и atexit при штатной остановке воркера.
+Буфер дорос до COURIER_LOCATION_BUFFER_MAX — сбрасываем прямо в запросе: лучше медленный ответ, чем
+потерянные точки. Время точки — момент приема, а не записи в БД. CourierPosition обновляется при
+сбросе (самой свежей точкой пачки), так что текущая позиция отстает не больше чем на интервал
+сброса.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - redis не установлен
+    redis = None  # type: ignore
+
+from .models import CourierLocation
+from .positions import upsert_positions
+
+logger = logging.getLogger(__name__)
+
+# (courier_id, lat, lon, ts — unix-время)
+Point = Tuple[int, float, float, float]
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def enabled() -> bool:
+    return bool(_setting("COURIER_LOCATION_WRITE_BEHIND", False))
+
+
+class LocalLocationBuffer:
+    """Буфер в памяти процесса."""
+
+    def __init__(self) -> None:
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+
+    def push(self, point: Point) -> int:
+        with self._lock:
+            self._items.append(point)
+            return len(self._items)
+
+    def take(self, n: int) -> List[Point]:
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(n, len(self._items)))]
+
+    def put_back(self, points: List[Point]) -> None:
+        with self._lock:
+            self._items.extendleft(reversed(points))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RedisLocationBuffer:
+    """Буфер в Redis-списке: RPUSH на прием, LRANGE+LTRIM одной транзакцией на сброс."""
+
+    KEY = "courier:locations:buffer"
+
+    def __init__(self, url: str) -> None:
+        self._redis = redis.Redis.from_url(url)
+
+    def push(self, point: Point) -> int:
+        return int(self._redis.rpush(self.KEY, "%d,%r,%r,%r" % point))
+
+    def take(self, n: int) -> List[Point]:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.lrange(self.KEY, 0, n - 1)
+        pipe.ltrim(self.KEY, n, -1)
+        raw, _ = pipe.execute()
+        points = []
+        for item in raw:
+            courier_id, lat, lon, ts = item.decode().split(",")
+            points.append((int(courier_id), float(lat), float(lon), float(ts)))
+        return points
+
+    def put_back(self, points: List[Point]) -> None:
+        if points:
+            self._redis.lpush(self.KEY, *["%d,%r,%r,%r" % p for p in reversed(points)])
+
+    def __len__(self) -> int:
+        return int(self._redis.llen(self.KEY))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_flusher: Optional["_Flusher"] = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                url = _setting("COURIER_LOCATION_BUFFER_URL", None)
+                _buffer = (
+                    RedisLocationBuffer(url) if url and redis is not None else LocalLocationBuffer()
+                )
+    return _buffer
+
+
+def reset() -> None:
+    """Забыть буфер процесса (тесты, смена настроек). Несброшенные локальные точки теряются."""
+    global _buffer
+    with _buffer_lock:
+        _buffer = None
+
+
+def buffer_location(courier_id: int, lat: float, lon: float, ts: datetime) -> None:
+    buf = get_buffer()
+    size = buf.push((courier_id, lat, lon, ts.timestamp()))
+    if isinstance(buf, LocalLocationBuffer):
+        _ensure_flusher()
+    if size >= int(_setting("COURIER_LOCATION_BUFFER_MAX", 100_000)):
+        flush_locations(max_batches=1)
+
+
+def flush_locations(max_batches: Optional[int] = None) -> int:
+    """Переложить буфер в CourierLocation пачками bulk_create. Возвращает число записанных точек."""
+    buf = get_buffer()
+    batch = int(_setting("COURIER_LOCATION_FLUSH_BATCH", 5000))
+    written = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        points = buf.take(batch)
+        if not points:
+            break
+        try:
+            written += _write(points)
+        except Exception:
+            buf.put_back(points)
+            raise
+        batches += 1
+        if len(points) < batch:
+            break
+    return written
+
+
+def _write(points: List[Point]) -> int:
+    # Курьера могли удалить, пока точка лежала в буфере: FK-ошибка уронила бы всю пачку
+    known = set(
+        get_user_model().objects.filter(pk__in={p[0] for p in points}).values_list("pk", flat=True)
+    )
+    rows = [
+        CourierLocation(
+            courier_id=courier_id,
+            lat=lat,
+            lon=lon,
+            ts=datetime.fromtimestamp(ts, tz=dt_timezone.utc),
+        )
+        for courier_id, lat, lon, ts in points
+        if courier_id in known
+    ]
+    with transaction.atomic():
+        CourierLocation.objects.bulk_create(rows, batch_size=len(rows) or 1)
+        upsert_positions((r.courier_id, r.lat, r.lon, r.ts) for r in rows)
+    return len(rows)
+
+
+class _Flusher(threading.Thread):
+    """Фоновый сброс локального буфера; свое соединение с БД, как у обычного потока-обработчика."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="courier-location-flusher", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                flush_locations()
+            except Exception:  # pragma: no cover - БД недоступна, точки вернулись в буфер
+                logger.exception("Не удалось сбросить буфер локаций курьеров")
+            finally:
+                close_old_connections()
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    interval = float(_setting("COURIER_LOCATION_FLUSH_INTERVAL", 2.0))
+    if interval <= 0 or _flusher is not None:
+        return
+    with _buffer_lock:
+        if _flusher is None:
+            _flusher = _Flusher(interval)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    # Штатная остановка процесса: дописываем, что осталось в локальном буфере
+    if _flusher is not None:
+        _flusher.stopped.set()
+    if isinstance(_buffer, LocalLocationBuffer) and len(_buffer):
+        try:
+            flush_locations()
+        except Exception:  # pragma: no cover - на выходе остается только залогировать
+            logger.exception("Буфер локаций курьеров не сброшен при остановке")
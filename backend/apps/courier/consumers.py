@@ -0,0 +1,167 @@
+"""
+Поток GPS курьера по одному WebSocket: /ws/courier/location/?token=<JWT access>.
+
+Кадр — {"lat", "lon", "device_ts"?, "seq"?} или {"points": [...], "seq"?}; без device_ts — время
+приема. В кадре не больше COURIER_WS_BATCH точек (больше — ошибка: делите кадр или шлите
+HTTP-батчем). Запись и раздача — тот же путь, что у HTTP-батча (store_points, publish_newest), но
+пачками: кадры копятся в очереди соединения, писатель склеивает целые кадры, пока в пачке не больше
+COURIER_WS_BATCH точек, и отвечает {"type": "ack", "seq", "seqs", "stored"}: seqs — все кадры пачки,
+seq — последний из них. Ошибка записи — до COURIER_WS_WRITE_RETRIES повторов с растущей паузой; не
+вышло — {"type": "error", "seqs", ...} с seq всех потерянных кадров, их клиенту нужно переслать.
+Повторяется только запись: раздача по заказам идет один раз после нее, и ее сбой сохраненные кадры
+потерянными не делает.
+
+Обратное давление. Очередь ограничена COURIER_WS_QUEUE_MAX кадрами. Пока она полна, прием ждет
+места — следующие кадры не читаются из сокета, и клиент упирается в TCP-окно. Не дождались за
+COURIER_WS_PUT_TIMEOUT сек. — кадр отбрасываем и шлем {"type": "slow_down", "seq", "dropped"}:
+клиенту пора реже слать или копить точки для батча.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.utils import timezone
+
+from apps.users.models import UserRole
+from .serializers import CourierLocationBatchSerializer
+from .tracking import publish_newest, store_points
+
+logger = logging.getLogger(__name__)
+
+# (seq, проверенные точки); None — сигнал писателю дописать очередь и выйти
+Frame = Optional[Tuple[object, List[dict]]]
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class CourierLocationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Прием GPS-кадров курьера: проверка и очередь в приеме, запись и ack — в фоновом писателе
+    соединения.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if (
+            not getattr(user, "is_authenticated", False)
+            or getattr(user, "role", None) != UserRole.COURIER
+        ):
+            await self.close(code=4003)
+            return
+        self.user = user
+        self.batch = int(_setting("COURIER_WS_BATCH", 100))
+        self.retries = int(_setting("COURIER_WS_WRITE_RETRIES", 2))
+        self.put_timeout = float(_setting("COURIER_WS_PUT_TIMEOUT", 1.0))
+        self.dropped = 0
+        self.closing = False
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=int(_setting("COURIER_WS_QUEUE_MAX", 256))
+        )
+        self.writer = asyncio.ensure_future(self._write_loop())
+        await self.accept()
+
+    async def disconnect(self, close_code):  # noqa: ARG002
+        writer = getattr(self, "writer", None)
+        if writer is None:
+            return
+        self.closing = True
+        try:
+            # Дописываем принятое до обрыва; зависшую БД не ждем бесконечно
+            await asyncio.wait_for(self.queue.put(None), timeout=self.put_timeout)
+            await asyncio.wait_for(writer, timeout=float(_setting("COURIER_WS_DRAIN_TIMEOUT", 5.0)))
+        except asyncio.TimeoutError:
+            writer.cancel()
+            logger.warning("Курьер %s: очередь GPS не дописана при отключении", self.user.id)
+
+    async def receive_json(self, content, **kwargs):
+        seq = content.get("seq") if isinstance(content, dict) else None
+        points, errors = self._validate(content)
+        if errors is None and len(points) > self.batch:
+            errors = f"В кадре не больше {self.batch} точек."
+        if errors is not None:
+            await self.send_json({"type": "error", "seq": seq, "detail": errors})
+            return
+        try:
+            await asyncio.wait_for(self.queue.put((seq, points)), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            await self.send_json({"type": "slow_down", "seq": seq, "dropped": self.dropped})
+
+    @staticmethod
+    def _validate(content) -> Tuple[Optional[List[dict]], object]:
+        if not isinstance(content, dict):
+            return None, "Ожидается объект."
+        raw = content.get("points")
+        if raw is None:
+            raw = [{k: content[k] for k in ("lat", "lon", "device_ts") if k in content}]
+        if isinstance(raw, list):
+            now = timezone.now().isoformat()
+            raw = [
+                dict(p, device_ts=p.get("device_ts") or now) if isinstance(p, dict) else p
+                for p in raw
+            ]
+        serializer = CourierLocationBatchSerializer(data={"points": raw})
+        if not serializer.is_valid():
+            return None, serializer.errors
+        return serializer.validated_data["points"], None
+
+    async def _write_loop(self):
+        carry: Frame = None
+        stop = False
+        while not stop:
+            frame: Frame = carry or await self.queue.get()
+            carry = None
+            if frame is None:
+                break
+            seqs, points = [frame[0]], list(frame[1])
+            # Добираем целые кадры, что уже накопились: одна транзакция и одна раздача на пачку
+            while not self.queue.empty():
+                more = self.queue.get_nowait()
+                if more is None:
+                    stop = True
+                    break
+                if len(points) + len(more[1]) > self.batch:
+                    carry = more  # не влез — начнет следующую пачку
+                    break
+                seqs.append(more[0])
+                points.extend(more[1])
+            await self._write(seqs, points)
+
+    async def _write(self, seqs: list, points: List[dict]) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                newest = await database_sync_to_async(store_points)(self.user, points)
+            except Exception:
+                logger.exception(
+                    "Курьер %s: не удалось записать %d GPS-точек (попытка %d)",
+                    self.user.id,
+                    len(points),
+                    attempt + 1,
+                )
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2**attempt)
+                continue
+            await self._reply({"type": "ack", "seq": seqs[-1], "seqs": seqs, "stored": len(points)})
+            await self._publish(newest)
+            return
+        await self._reply(
+            {"type": "error", "seq": seqs[-1], "seqs": seqs, "detail": "Точки не сохранены."}
+        )
+
+    async def _publish(self, newest: dict) -> None:
+        # Точки уже в БД: сбой раздачи не повторяем записью и не выдаем за потерю кадров
+        try:
+            await database_sync_to_async(publish_newest)(self.user, newest)
+        except Exception:
+            logger.exception("Курьер %s: не удалось раздать GPS-точку по заказам", self.user.id)
+
+    async def _reply(self, data: dict) -> None:
+        if not self.closing:
+            await self.send_json(data)
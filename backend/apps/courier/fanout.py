@@ -0,0 +1,174 @@
+"""
+Схлопывающая раздача координат курьера по трекерам заказов.
+
+Раньше каждый GPS-пинг давал по сообщению в брокер на каждый активный заказ. Теперь пинг только
+перезаписывает «последнюю точку» заказа в общем хранилище, а раз в окно
+(1 / COURIER_FANOUT_MAX_PER_SEC сек.) одна задача flush_location_fanout забирает все накопленное и
+шлет по одному групповому сообщению на заказ:
+- на заказ — не больше N обновлений в секунду, промежуточные точки схлопываются в последнюю;
+- в брокер — одно сообщение на окно на весь кластер, а не на пинг × заказ.
+Окно открывает первый пинг после тишины (SET NX с TTL окна) и ставит отложенную задачу. Хранилище —
+Redis-хэш (COURIER_FANOUT_REDIS_URL, по умолчанию Redis кэша): его видят и веб, и воркер. Без общего
+Redis схлопывания нет — шлем сразу, как раньше: из памяти веб-процесса flush_location_fanout в
+воркере ничего бы не забрал. Без брокера (CELERY_TASK_ALWAYS_EAGER) отложить нечего — тоже шлем
+сразу. LocalFanoutStore — для бенчмарка в одном процессе. Статусные события (in_transit и т.п.) сюда
+не идут: их не схлопываем и не теряем.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - redis не установлен
+    redis = None  # type: ignore
+
+Event = Tuple[int, dict]
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def window_seconds() -> float:
+    rate = float(_setting("COURIER_FANOUT_MAX_PER_SEC", 2.0))
+    return 1.0 / rate if rate > 0 else 0.0
+
+
+class LocalFanoutStore:
+    """Последние точки по заказам в памяти процесса. clock подменяется в бенчмарке."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._latest: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._window_until = 0.0
+
+    def put(self, order_id: int, payload: dict) -> None:
+        with self._lock:
+            self._latest[order_id] = payload
+
+    def open_window(self, seconds: float) -> bool:
+        with self._lock:
+            now = self._clock()
+            if now < self._window_until:
+                return False
+            self._window_until = now + seconds
+            return True
+
+    def close_window(self) -> None:
+        with self._lock:
+            self._window_until = 0.0
+
+    def drain(self) -> List[Event]:
+        with self._lock:
+            events, self._latest = list(self._latest.items()), {}
+            return events
+
+
+class RedisFanoutStore:
+    """HSET заказ -> последняя точка; окно — SET NX PX; забор — HGETALL + DEL одной транзакцией."""
+
+    KEY = "courier:fanout:latest"
+    WINDOW_KEY = "courier:fanout:window"
+
+    def __init__(self, url: str) -> None:
+        self._redis = redis.Redis.from_url(url)
+
+    def put(self, order_id: int, payload: dict) -> None:
+        self._redis.hset(self.KEY, order_id, json.dumps(payload))
+
+    def open_window(self, seconds: float) -> bool:
+        return bool(self._redis.set(self.WINDOW_KEY, 1, nx=True, px=max(1, int(seconds * 1000))))
+
+    def close_window(self) -> None:
+        self._redis.delete(self.WINDOW_KEY)
+
+    def drain(self) -> List[Event]:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hgetall(self.KEY)
+        pipe.delete(self.KEY)
+        raw, _ = pipe.execute()
+        return [(int(k), json.loads(v)) for k, v in raw.items()]
+
+
+class LocationFanout:
+    """publish — на каждый пинг; drain — из отложенной задачи, раз в окно."""
+
+    def __init__(self, store, window: float, schedule: Callable[[float], None]) -> None:
+        self.store = store
+        self.window = window
+        self.schedule = schedule
+
+    def publish(self, order_id: int, payload: dict) -> bool:
+        """Запомнить точку заказа. True — этот вызов открыл окно и поставил сброс."""
+        self.store.put(order_id, payload)
+        if self.store.open_window(self.window):
+            self.schedule(self.window)
+            return True
+        return False
+
+    def drain(self) -> List[Event]:
+        # Сначала закрываем окно, потом забираем: пинг между ними откроет новое окно, а не зависнет
+        self.store.close_window()
+        return self.store.drain()
+
+
+_fanout: Optional[LocationFanout] = None
+_fanout_lock = threading.Lock()
+
+
+def _schedule_flush(countdown: float) -> None:
+    from .tasks import flush_location_fanout
+
+    flush_location_fanout.apply_async(countdown=countdown)
+
+
+def get_fanout() -> LocationFanout:
+    global _fanout
+    if _fanout is None:
+        with _fanout_lock:
+            if _fanout is None:
+                store = RedisFanoutStore(_setting("COURIER_FANOUT_REDIS_URL", None))
+                _fanout = LocationFanout(store, window_seconds(), _schedule_flush)
+    return _fanout
+
+
+def reset() -> None:
+    """Забыть хранилище процесса (тесты, смена настроек)."""
+    global _fanout
+    with _fanout_lock:
+        _fanout = None
+
+
+def enabled() -> bool:
+    # Хранилище должно быть общим для веба и воркера, иначе пинги осядут в памяти веб-процесса
+    shared = bool(_setting("COURIER_FANOUT_REDIS_URL", None)) and redis is not None
+    return shared and window_seconds() > 0 and not _setting("CELERY_TASK_ALWAYS_EAGER", False)
+
+
+def publish_location_event(order_id: int, payload: dict) -> None:
+    from apps.orders.tasks import broadcast_order_event
+
+    if not enabled():
+        broadcast_order_event.delay(order_id, payload)
+        return
+    get_fanout().publish(order_id, payload)
+
+
+def flush() -> int:
+    """Разослать накопленное: одно групповое сообщение на заказ. Возвращает число заказов."""
+    from apps.orders.tasks import broadcast_order_events
+
+    if not enabled():
+        return 0
+    events = get_fanout().drain()
+    if events:
+        # Прямой вызов тела задачи: мы уже в воркере, второе сообщение в брокер не нужно
+        broadcast_order_events([(order_id, payload) for order_id, payload in events])
+    return len(events)
@@ -0,0 +1,99 @@
+"""
+Бенчмарк раздачи координат: сообщение в брокер на каждый пинг × заказ (как было) против схлопывания
+по окнам (courier/fanout.py). Прогон в виртуальном времени, без БД, брокера и Redis: считаем
+сообщения, а не миллисекунды.
+Пример: python manage.py bench_location_fanout --couriers 1000 --ping-hz 1 --max-per-sec 2
+"""
+from __future__ import annotations
+
+import heapq
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.courier.fanout import LocalFanoutStore, LocationFanout
+
+
+class _Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Command(BaseCommand):
+    help = "Сравнить число сообщений в брокер и в WS-группы: без схлопывания и с ним."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--couriers", type=int, default=1000)
+        parser.add_argument("--orders-per-courier", type=int, default=1)
+        parser.add_argument(
+            "--ping-hz", type=float, default=1.0, help="Пингов в секунду на курьера"
+        )
+        parser.add_argument(
+            "--seconds", type=float, default=60.0, help="Длительность прогона (виртуальная)"
+        )
+        parser.add_argument(
+            "--max-per-sec", type=float, default=None, help="Лимит обновлений на заказ в секунду"
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rate = opts["max_per_sec"] or float(getattr(settings, "COURIER_FANOUT_MAX_PER_SEC", 2.0))
+        rnd = random.Random(opts["seed"])
+        per = opts["orders_per_courier"]
+        period = 1.0 / opts["ping_hz"]
+
+        # Пинги курьеров со случайной фазой и небольшим дрожанием
+        pings = []
+        for courier in range(opts["couriers"]):
+            t = rnd.uniform(0, period)
+            while t < opts["seconds"]:
+                pings.append((t, courier))
+                t += period * rnd.uniform(0.9, 1.1)
+        pings.sort()
+
+        clock = _Clock()
+        flushes: list = []
+        fanout = LocationFanout(
+            LocalFanoutStore(clock),
+            1.0 / rate,
+            lambda countdown: heapq.heappush(flushes, clock.now + countdown),
+        )
+        delivered = 0
+        scheduled = 0
+
+        def run_due(until: float) -> int:
+            sent = 0
+            while flushes and flushes[0] <= until:
+                clock.now = heapq.heappop(flushes)
+                sent += len(fanout.drain())
+            return sent
+
+        for t, courier in pings:
+            delivered += run_due(t)
+            clock.now = t
+            for k in range(per):
+                scheduled += fanout.publish(courier * per + k, {"t": t})
+        delivered += run_due(float("inf"))
+
+        before = len(pings) * per
+        orders = opts["couriers"] * per
+        self.stdout.write(
+            f"Курьеров: {opts['couriers']}, заказов: {orders}, "
+            f"пингов: {len(pings)} за {opts['seconds']:.0f} с, лимит {rate:g}/с на заказ"
+        )
+        self.stdout.write(f"{'':24}{'было':>12}{'стало':>12}{'×':>8}")
+        self.stdout.write(
+            f"{'сообщений в брокер':24}{before:>12}{scheduled:>12}"
+            f"{before / max(scheduled, 1):>8.1f}"
+        )
+        self.stdout.write(
+            f"{'сообщений в WS-группы':24}{before:>12}{delivered:>12}"
+            f"{before / max(delivered, 1):>8.1f}"
+        )
+        self.stdout.write(
+            f"{'обновлений/с на заказ':24}{before / orders / opts['seconds']:>12.2f}"
+            f"{delivered / orders / opts['seconds']:>12.2f}"
+        )
@@ -0,0 +1,42 @@
+"""
+Ручной прогон обслуживания истории GPS: сжатие завершенных поездок и удаление сжатых сырых точек
+старше окна ретенции. Печатает отчет: треки, точки до/после сжатия, удаленные строки и освобожденные
+байты.
+Пример: python manage.py compact_courier_tracks --retention-hours 48 --tolerance 10
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from apps.courier.tracks import maintain
+
+
+class Command(BaseCommand):
+    help = (
+        "Сжать треки курьеров (Дуглас — Пекер) и удалить сжатые сырые точки старше окна ретенции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-hours",
+            type=float,
+            help="Окно ретенции сырых точек (по умолчанию из настроек)",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, help="Допуск упрощения, м (по умолчанию из настроек)"
+        )
+
+    def handle(self, *args, **opts):
+        report = maintain(retention_hours=opts["retention_hours"], tolerance_m=opts["tolerance"])
+        ratio = report["points_kept"] / report["points_in"] if report["points_in"] else 0
+        self.stdout.write(
+            f"Треков: {report['tracks']}, "
+            f"точек сжато: {report['points_in']} -> {report['points_kept']} ({ratio:.1%})"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено строк: {report['rows_deleted']}, "
+                f"освобождено ~{report['bytes_reclaimed'] / 1024:.1f} КиБ, "
+                f"осталось строк: {report['rows_left']}"
+            )
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courier', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='courierlocation',
+            name='ts',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Метка времени'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_positions(apps, schema_editor):
+    # Последняя точка каждого курьера из истории: по индексу (courier, -ts) — один короткий запрос на курьера
+    CourierLocation = apps.get_model("courier", "CourierLocation")
+    CourierPosition = apps.get_model("courier", "CourierPosition")
+    rows = []
+    for courier_id in CourierLocation.objects.values_list("courier_id", flat=True).distinct().iterator():
+        last = CourierLocation.objects.filter(courier_id=courier_id).order_by("-ts", "-id").first()
+        rows.append(CourierPosition(courier_id=courier_id, lat=last.lat, lon=last.lon, ts=last.ts))
+        if len(rows) >= 1000:
+            CourierPosition.objects.bulk_create(rows)
+            rows = []
+    CourierPosition.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_rating_counters'),
+        ('courier', '0003_location_ts_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierPosition',
+            fields=[
+                ('courier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Курьер')),
+                ('lat', models.FloatField(verbose_name='Широта')),
+                ('lon', models.FloatField(verbose_name='Долгота')),
+                ('ts', models.DateTimeField(verbose_name='Метка времени')),
+            ],
+            options={
+                'verbose_name': 'Позиция курьера',
+                'verbose_name_plural': 'Позиции курьеров',
+            },
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+    ]
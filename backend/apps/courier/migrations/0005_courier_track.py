@@ -0,0 +1,33 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courier', '0004_courier_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('ended_at', models.DateTimeField(verbose_name='Конец')),
+                ('points', models.JSONField(verbose_name='Точки')),
+                ('raw_count', models.PositiveIntegerField(verbose_name='Сырых точек')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to=settings.AUTH_USER_MODEL, verbose_name='Курьер')),
+            ],
+            options={
+                'verbose_name': 'Трек курьера',
+                'verbose_name_plural': 'Треки курьеров',
+                'indexes': [models.Index(fields=['courier', 'ended_at'], name='idx_track_courier_ended')],
+            },
+        ),
+    ]
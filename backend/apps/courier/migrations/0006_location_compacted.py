@@ -0,0 +1,33 @@
+# Generated by Django 4.2.14 on 2026-10-17 17:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def mark_compacted(apps, schema_editor):
+    # До флага покрытие считалось по водяному знаку max(ended_at); то, что под ним, уже в треках
+    CourierLocation = apps.get_model('courier', 'CourierLocation')
+    CourierTrack = apps.get_model('courier', 'CourierTrack')
+    marks = CourierTrack.objects.values('courier_id').annotate(w=Max('ended_at')).values_list('courier_id', 'w')
+    for courier_id, watermark in marks:
+        CourierLocation.objects.filter(courier_id=courier_id, ts__lte=watermark).update(compacted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courier', '0005_courier_track'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courierlocation',
+            name='compacted',
+            field=models.BooleanField(default=False, verbose_name='Сжата в трек'),
+        ),
+        migrations.RunPython(mark_compacted, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='courierlocation',
+            index=models.Index(condition=models.Q(('compacted', False)), fields=['ts'], name='idx_courier_loc_uncompacted'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class CourierLocation(models.Model):
@@ -15,7 +16,10 @@ class CourierLocation(models.Model):
     )
     lat = models.FloatField("Широта")
     lon = models.FloatField("Долгота")
-    ts = models.DateTimeField("Метка времени", auto_now_add=True)
+    # Не auto_now_add: в режиме write-behind время ставится при приеме, а в БД точка попадает позже
+    ts = models.DateTimeField("Метка времени", default=timezone.now)
+    # Точка вошла в CourierTrack (см. tracks.py); удалять по ретенции можно только такие
+    compacted = models.BooleanField("Сжата в трек", default=False)
 
     class Meta:
         verbose_name = "Локация курьера"
@@ -23,7 +27,66 @@ class CourierLocation(models.Model):
         indexes = [
             # btree (courier_id, ts DESC) — как и просили
             models.Index(fields=["courier", "-ts"], name="idx_courier_ts_desc"),
+            # Частичный: несжатых точек мало (окно до сжатия), compact_tracks ищет работу дешево
+            models.Index(
+                fields=["ts"],
+                name="idx_courier_loc_uncompacted",
+                condition=models.Q(compacted=False),
+            ),
         ]
 
     def __str__(self) -> str:  # pragma: no cover
         return f"{self.courier_id} @ {self.lat},{self.lon} {self.ts}"
+
+
+class CourierPosition(models.Model):
+    """
+    Где курьер сейчас: одна строка на курьера, upsert на каждый прием точки (см. positions.py). Все
+    чтения «текущей позиции» идут сюда; CourierLocation — недавняя история
+    (старое сжимается в CourierTrack).
+    """
+
+    courier = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="position",
+        verbose_name="Курьер",
+    )
+    lat = models.FloatField("Широта")
+    lon = models.FloatField("Долгота")
+    ts = models.DateTimeField("Метка времени")
+
+    class Meta:
+        verbose_name = "Позиция курьера"
+        verbose_name_plural = "Позиции курьеров"
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.courier_id} @ {self.lat},{self.lon} {self.ts}"
+
+
+class CourierTrack(models.Model):
+    """
+    Сжатый отрезок трека (см. tracks.py): точки после Дугласа — Пекера одним JSON-массивом
+    [[lat, lon, ts], ...], ts — unix-время. Сырые точки, покрытые треками, со временем удаляются из
+    CourierLocation.
+    """
+
+    courier = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="tracks",
+        verbose_name="Курьер",
+    )
+    started_at = models.DateTimeField("Начало")
+    ended_at = models.DateTimeField("Конец")
+    points = models.JSONField("Точки")
+    raw_count = models.PositiveIntegerField("Сырых точек")
+    created_at = models.DateTimeField("Создан", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Трек курьера"
+        verbose_name_plural = "Треки курьеров"
+        indexes = [
+            models.Index(fields=["courier", "ended_at"], name="idx_track_courier_ended"),
+        ]
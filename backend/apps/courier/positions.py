@@ -0,0 +1,79 @@
+"""
+Текущие позиции курьеров (CourierPosition): одна строка на курьера вместо ORDER BY ts DESC по
+истории.
+
+Запись — upsert с защитой от старых точек: строка меняется, только если пришедшая точка новее.
+Postgres и SQLite (>= 3.24) умеют это одним INSERT ... ON CONFLICT DO UPDATE ... WHERE; на остальных
+БД — условный UPDATE и INSERT, если строки еще нет. В write-behind режиме (buffer.py) позиции
+обновляются при сбросе буфера — самая свежая точка курьера из пачки.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, connection, transaction
+
+from .models import CourierPosition
+
+# (courier_id, lat, lon, ts)
+Fix = Tuple[int, float, float, datetime]
+
+
+def current_position(courier_id: int) -> Optional[CourierPosition]:
+    return CourierPosition.objects.filter(courier_id=courier_id).first()
+
+
+def upsert_positions(fixes: Iterable[Fix]) -> int:
+    """Обновить позиции по точкам (в любом порядке). Возвращает число затронутых курьеров."""
+    latest: Dict[int, Fix] = {}
+    for fix in fixes:
+        seen = latest.get(fix[0])
+        if seen is None or fix[3] > seen[3]:
+            latest[fix[0]] = fix
+    if not latest:
+        return 0
+    if connection.vendor in ("postgresql", "sqlite"):
+        _upsert_on_conflict(latest.values())
+    else:  # pragma: no cover - MySQL и прочие
+        for fix in latest.values():
+            _upsert_portable(*fix)
+    return len(latest)
+
+
+def _upsert_on_conflict(fixes: Iterable[Fix]) -> None:
+    meta = CourierPosition._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    ts_field = meta.get_field("ts")
+    sql = (
+        f"INSERT INTO {table} ({qn('courier_id')}, {qn('lat')}, {qn('lon')}, {qn('ts')}) "
+        f"VALUES (%s, %s, %s, %s) "
+        f"ON CONFLICT ({qn('courier_id')}) DO UPDATE SET "
+        f"{qn('lat')} = excluded.{qn('lat')}, {qn('lon')} = excluded.{qn('lon')}, "
+        f"{qn('ts')} = excluded.{qn('ts')} "
+        f"WHERE {table}.{qn('ts')} < excluded.{qn('ts')}"
+    )
+    params = [
+        (courier_id, lat, lon, ts_field.get_db_prep_value(ts, connection))
+        for courier_id, lat, lon, ts in fixes
+    ]
+    with transaction.mark_for_rollback_on_error(), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _upsert_portable(  # pragma: no cover
+    courier_id: int, lat: float, lon: float, ts: datetime
+) -> None:
+    if CourierPosition.objects.filter(courier_id=courier_id, ts__lt=ts).update(
+        lat=lat, lon=lon, ts=ts
+    ):
+        return
+    try:
+        with transaction.atomic():
+            CourierPosition.objects.create(courier_id=courier_id, lat=lat, lon=lon, ts=ts)
+    except IntegrityError:
+        # Строка уже есть и не старее нашей — или ее только что вставил соседний запрос
+        CourierPosition.objects.filter(courier_id=courier_id, ts__lt=ts).update(
+            lat=lat, lon=lon, ts=ts
+        )
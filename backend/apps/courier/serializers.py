@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from .models import CourierLocation
+from .positions import upsert_positions
 
 User = get_user_model()
 
@@ -19,4 +24,34 @@ class CourierLocationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user: User = self.context["request"].user
-        return CourierLocation.objects.create(courier=user, **validated_data)
+        obj = CourierLocation.objects.create(courier=user, **validated_data)
+        upsert_positions([(user.id, obj.lat, obj.lon, obj.ts)])
+        return obj
+
+
+# Часы телефона спешат — немного прощаем, дальше точка из будущего сломала бы «текущую позицию»
+DEVICE_CLOCK_SKEW = timedelta(minutes=5)
+# Потолок пачки офлайн-точек за один запрос
+LOCATION_BATCH_MAX = 500
+
+
+class CourierPointSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    device_ts = serializers.DateTimeField()
+
+    def validate_device_ts(self, value):
+        now = timezone.now()
+        if value > now + DEVICE_CLOCK_SKEW:
+            raise serializers.ValidationError("Метка времени из будущего.")
+        # Старше окна ретенции — сразу ушла бы в сжатие и удаление; сбитые часы (1970) сюда же
+        max_age = timedelta(hours=float(getattr(settings, "COURIER_LOCATION_MAX_AGE_HOURS", 24)))
+        if value < now - max_age:
+            raise serializers.ValidationError("Метка времени слишком старая.")
+        return value
+
+
+class CourierLocationBatchSerializer(serializers.Serializer):
+    points = serializers.ListField(
+        child=CourierPointSerializer(), min_length=1, max_length=LOCATION_BATCH_MAX
+    )
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from celery import shared_task
+
+
+@shared_task
+def flush_courier_locations() -> int:
+    """Beat: перекладываем буфер GPS-точек в CourierLocation пачками (см. courier.buffer)."""
+    from .buffer import flush_locations
+
+    return flush_locations()
+
+
+@shared_task
+def publish_courier_location(courier_id: int, lat: float, lon: float, ts: str) -> None:
+    """Write-behind: раздача точки по активным заказам курьера — вне HTTP-запроса."""
+    from django.contrib.auth import get_user_model
+    from django.utils.dateparse import parse_datetime
+    from .tracking import publish_location
+
+    courier = get_user_model().objects.filter(pk=courier_id).first()
+    if courier is not None:
+        publish_location(courier, lat, lon, parse_datetime(ts))
+
+
+@shared_task
+def maintain_courier_tracks() -> dict:
+    """Beat: сжатие поездок в CourierTrack и ретенция сырых точек (см. courier.tracks)."""
+    from .tracks import maintain
+
+    return maintain()
+
+
+@shared_task
+def flush_location_fanout() -> int:
+    """Раз в окно: по одному сообщению с последней точкой на каждый заказ (см. courier.fanout)."""
+    from .fanout import flush
+
+    return flush()
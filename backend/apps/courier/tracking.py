@@ -0,0 +1,107 @@
+"""
+Раздача свежей точки курьера по его активным заказам: автопереход ACCEPTED -> IN_TRANSIT и
+WS-события трекинга. Зовется из post_location (синхронный режим) или задачей
+courier.tasks.publish_courier_location (write-behind). Статусы — одним UPDATE на все заказы и одной
+задачей на события; координаты — через схлопывание (fanout.py).
+
+ingest_points — общий путь для пачек точек: HTTP-батч (post_location_batch) и WebSocket
+(CourierLocationConsumer). Это запись (store_points) и раздача (publish_newest): WebSocket повторяет
+при сбое только запись, чтобы не вставить одни и те же точки дважды.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List
+
+from django.db import transaction
+
+from apps.orders.models import COURIER_ACTIVE_STATUSES, Order, OrderStatus
+from apps.users.models import UserRole
+from apps.orders.services import transition_many
+from apps.orders.tasks import broadcast_order_events
+from . import buffer as location_buffer
+from .fanout import publish_location_event
+from .models import CourierLocation
+from .positions import current_position, upsert_positions
+
+
+def publish_location(courier, lat: float, lon: float, ts: datetime) -> None:
+    active_orders = list(
+        Order.objects.filter(courier_id=courier.id, status__in=COURIER_ACTIVE_STATUSES)
+        .order_by()  # порядок не нужен, а сортировка по Meta.ordering — лишний temp B-tree
+        .only("id", "status", "restaurant_id")
+    )
+    # Лёгкий автопереход: как только курьер поехал — статус IN_TRANSIT
+    accepted = [o.id for o in active_orders if o.status == OrderStatus.ACCEPTED]
+    if accepted:
+        moved = transition_many(
+            accepted,
+            OrderStatus.ACCEPTED,
+            OrderStatus.IN_TRANSIT,
+            actor=courier,
+            courier_id=courier.id,
+        )
+        if moved:
+            broadcast_order_events.delay(
+                [(o.id, {"type": "in_transit", "order_id": o.id}, o.restaurant_id) for o in moved]
+            )
+
+    for order in active_orders:
+        publish_location_event(
+            order.id,
+            {
+                "type": "courier_location",
+                "order_id": order.id,
+                "lat": lat,
+                "lon": lon,
+                "ts": ts.isoformat(),
+            },
+        )
+
+
+def ingest_points(user, points: List[dict]) -> dict:
+    """
+    Сохранить пачку проверенных точек [{lat, lon, device_ts}, ...] и отдать трекингу самую свежую.
+    Возвращает самую свежую точку.
+    """
+    newest = store_points(user, points)
+    publish_newest(user, newest)
+    return newest
+
+
+def store_points(user, points: List[dict]) -> dict:
+    """
+    bulk_create с временем устройства (или буфер в write-behind режиме) и один upsert позиции —
+    одной транзакцией: упала — не записано ничего. Возвращает самую свежую точку.
+    """
+    points = sorted(points, key=lambda p: p["device_ts"])
+    newest = points[-1]
+    if location_buffer.enabled():
+        for p in points:
+            location_buffer.buffer_location(user.id, p["lat"], p["lon"], p["device_ts"])
+    else:
+        with transaction.atomic():
+            CourierLocation.objects.bulk_create(
+                [
+                    CourierLocation(courier=user, lat=p["lat"], lon=p["lon"], ts=p["device_ts"])
+                    for p in points
+                ]
+            )
+            upsert_positions([(user.id, newest["lat"], newest["lon"], newest["device_ts"])])
+    return newest
+
+
+def publish_newest(user, newest: dict) -> None:
+    """Трекинг получает самую свежую точку пачки — и только если она не старее текущей позиции."""
+    if getattr(user, "role", None) == UserRole.COURIER:
+        # Точки старше того, что курьер уже прислал онлайн, трекинг назад не откатывают
+        position = current_position(user.id)
+        if position is None or position.ts <= newest["device_ts"]:
+            if location_buffer.enabled():
+                from .tasks import publish_courier_location
+
+                publish_courier_location.delay(
+                    user.id, newest["lat"], newest["lon"], newest["device_ts"].isoformat()
+                )
+            else:
+                publish_location(user, newest["lat"], newest["lon"], newest["device_ts"])
@@ -0,0 +1,156 @@
+"""
+Обслуживание истории GPS: сжатие завершенных поездок и ретенция сырых точек.
+
+1. Сжатие. Точки старше COURIER_TRACK_COMPACT_AFTER_MIN минут считаем завершенной поездкой
+   (активная доставка столько не живет). Для каждого курьера берем еще не сжатые точки
+   (compacted=False), режем на отрезки по паузам длиннее COURIER_TRACK_GAP_SEC и упрощаем Дугласом —
+   Пекером с допуском COURIER_TRACK_TOLERANCE_M метров. Треки и флаг compacted на их сырых точках
+   пишутся одной транзакцией. Отбор по флагу, а не по времени: точки хранятся с временем устройства,
+   и офлайн-догрузка «в прошлое» тоже попадет в трек (отдельным отрезком).
+2. Ретенция. Сырые точки старше COURIER_LOCATION_RETENTION_HOURS удаляем, но только покрытые треками
+   (compacted=True) — несжатое не теряется. Удаляем по id пачками COURIER_TRACK_DELETE_BATCH,
+   каждая пачка — своя короткая транзакция: длинных блокировок на таблице нет.
+В итоге CourierLocation держит окно ретенции — размер пропорционален активным курьерам, а не всей
+истории. Запуск — beat-задача courier.tasks.maintain_courier_tracks или manage.py
+compact_courier_tracks.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.geo.simplify import douglas_peucker
+from .models import CourierLocation, CourierTrack
+
+logger = logging.getLogger(__name__)
+
+# Оценка строки CourierLocation с индексом, если БД не умеет сказать точнее
+_FALLBACK_ROW_BYTES = 64
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _segments(rows: List[tuple], gap: timedelta) -> List[List[tuple]]:
+    segments: List[List[tuple]] = []
+    for row in rows:
+        if segments and row[2] - segments[-1][-1][2] <= gap:
+            segments[-1].append(row)
+        else:
+            segments.append([row])
+    return segments
+
+
+def compact_tracks(now=None, tolerance_m: Optional[float] = None) -> Dict[str, int]:
+    """
+    Сжать завершенные поездки в CourierTrack. Возвращает счетчики: треков, сырых точек, оставлено
+    точек.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(minutes=float(_setting("COURIER_TRACK_COMPACT_AFTER_MIN", 60)))
+    gap = timedelta(seconds=float(_setting("COURIER_TRACK_GAP_SEC", 600)))
+    tolerance = (
+        tolerance_m if tolerance_m is not None else float(_setting("COURIER_TRACK_TOLERANCE_M", 15))
+    )
+    limit = int(_setting("COURIER_TRACK_MAX_POINTS", 50_000))
+    batch = int(_setting("COURIER_TRACK_DELETE_BATCH", 5000))
+    stats = {"tracks": 0, "points_in": 0, "points_kept": 0}
+
+    pending = CourierLocation.objects.filter(compacted=False, ts__lte=cutoff)
+    couriers = pending.values_list("courier_id", flat=True).distinct()
+    for courier_id in list(couriers):
+        qs = pending.filter(courier_id=courier_id)
+        # Не больше limit точек за проход: остальное доберет следующий запуск
+        # (флаг уже снят с сжатых)
+        rows = list(qs.order_by("ts", "id").values_list("lat", "lon", "ts", "id")[:limit])
+        if not rows:
+            continue
+        tracks = []
+        for seg in _segments(rows, gap):
+            kept = douglas_peucker([r[0] for r in seg], [r[1] for r in seg], tolerance)
+            tracks.append(
+                CourierTrack(
+                    courier_id=courier_id,
+                    started_at=seg[0][2],
+                    ended_at=seg[-1][2],
+                    points=[[seg[i][0], seg[i][1], seg[i][2].timestamp()] for i in kept],
+                    raw_count=len(seg),
+                )
+            )
+            stats["points_kept"] += len(kept)
+        ids = [r[3] for r in rows]
+        with transaction.atomic():
+            CourierTrack.objects.bulk_create(tracks)
+            for i in range(0, len(ids), batch):
+                CourierLocation.objects.filter(id__in=ids[i : i + batch]).update(compacted=True)
+        stats["tracks"] += len(tracks)
+        stats["points_in"] += len(rows)
+    return stats
+
+
+def purge_compacted_points(now=None, retention_hours: Optional[float] = None) -> int:
+    """Удалить сжатые сырые точки старше окна ретенции пачками. Возвращает число удаленных строк."""
+    now = now or timezone.now()
+    if retention_hours is None:
+        retention_hours = float(_setting("COURIER_LOCATION_RETENTION_HOURS", 24))
+    retention_cutoff = now - timedelta(hours=retention_hours)
+    batch = int(_setting("COURIER_TRACK_DELETE_BATCH", 5000))
+    deleted = 0
+    qs = CourierLocation.objects.filter(compacted=True, ts__lte=retention_cutoff)
+    while True:
+        ids = list(qs.values_list("id", flat=True)[:batch])
+        if not ids:
+            break
+        with transaction.atomic():
+            n, _ = CourierLocation.objects.filter(id__in=ids).delete()
+        deleted += n
+        if len(ids) < batch:
+            break
+    return deleted
+
+
+def row_bytes() -> float:
+    """Средний размер строки CourierLocation вместе с индексами — по статистике БД, иначе оценка."""
+    table = CourierLocation._meta.db_table
+    try:
+        # Савепоинт: ошибка запроса (нет dbstat) не должна отравить внешнюю транзакцию
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_total_relation_size(%s::regclass)::float8 / GREATEST(reltuples, 1) "
+                    "FROM pg_class WHERE oid = %s::regclass",
+                    [table, table],
+                )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT CAST(SUM(pgsize) AS REAL) / MAX((SELECT COUNT(*) FROM "
+                    + connection.ops.quote_name(table)
+                    + "), 1) FROM dbstat "
+                    "WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table],
+                )
+            else:  # pragma: no cover
+                return float(_FALLBACK_ROW_BYTES)
+            value = cursor.fetchone()[0]
+    except Exception:  # нет dbstat в сборке SQLite, нет прав и т.п.
+        return float(_FALLBACK_ROW_BYTES)
+    return float(value) if value else float(_FALLBACK_ROW_BYTES)
+
+
+def maintain(
+    now=None, retention_hours: Optional[float] = None, tolerance_m: Optional[float] = None
+) -> Dict[str, int]:
+    """Сжатие + ретенция + отчет: сколько строк и (оценочно) байт освобождено в CourierLocation."""
+    per_row = row_bytes()
+    report = compact_tracks(now, tolerance_m=tolerance_m)
+    report["rows_deleted"] = purge_compacted_points(now, retention_hours=retention_hours)
+    report["bytes_reclaimed"] = int(report["rows_deleted"] * per_row)
+    report["rows_left"] = CourierLocation.objects.count()
+    logger.info("Обслуживание треков курьеров: %s", report)
+    return report
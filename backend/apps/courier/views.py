@@ -4,46 +4,68 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.utils import timezone
 
-from .serializers import CourierLocationSerializer
-from .models import CourierLocation
+from . import buffer as location_buffer
+from .serializers import CourierLocationBatchSerializer, CourierLocationSerializer
+from .positions import current_position
+from .tasks import publish_courier_location
+from .tracking import ingest_points, publish_location
 from apps.users.models import UserRole
-from apps.orders.models import Order, OrderStatus
+from apps.orders.models import AVAILABLE_STATUSES, Order, OrderStatus
+from apps.orders.services import transition
 from apps.orders.tasks import broadcast_order_event
 try:
     from django.contrib.gis.geos import Point as GeoPoint
 except Exception:  # pragma: no cover - окружение без GEOS
     GeoPoint = None  # type: ignore
 try:
+    from django.contrib.gis.measure import D  # type: ignore
     from django.contrib.gis.db.models.functions import Distance  # type: ignore
 except Exception:  # pragma: no cover - окружение без GIS
+    D = None  # type: ignore
     Distance = None  # type: ignore
-import math
+
+from apps.geo.distance import nearest
+from apps.geo.queries import bbox_q
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def available_orders(request):
-    """Доступные заказы для курьера, отсортированные по дистанции до ресторана (если есть GPS)."""
+    """
+    Доступные заказы для курьера, отсортированные по дистанции до ресторана (если есть GPS).
+    Необязательный radius (км) ограничивает выдачу рестораном в радиусе от курьера.
+    """
     user = request.user
     if getattr(user, "role", None) != UserRole.COURIER:
         return Response({"detail": "Только курьеры могут смотреть доступные заказы."}, status=status.HTTP_403_FORBIDDEN)
+    radius = None
+    if request.query_params.get("radius"):
+        try:
+            radius = float(request.query_params["radius"])
+        except ValueError:
+            return Response(
+                {"detail": "radius должен быть числом"}, status=status.HTTP_400_BAD_REQUEST
+            )
 
     qs = (
         Order.objects.filter(
-            status__in=[OrderStatus.READY_FOR_PICKUP, OrderStatus.RESTAURANT_CONFIRMED],
+            status__in=AVAILABLE_STATUSES,
             courier__isnull=True,
         )
         .select_related("restaurant")
     )
 
-    last_loc = CourierLocation.objects.filter(courier=user).order_by("-ts").first()
+    last_loc = current_position(user.id)
     if last_loc and last_loc.lon is not None and last_loc.lat is not None:
         user_point = GeoPoint(last_loc.lon, last_loc.lat, srid=4326) if GeoPoint else None
         try:
             # Предпочитаем PostGIS: быстро и индексно
             if Distance and user_point is not None:
                 qs = qs.annotate(distance=Distance("restaurant__location", user_point)).order_by("distance")
+                if radius is not None and D is not None:
+                    qs = qs.filter(restaurant__location__distance_lte=(user_point, D(km=radius)))
                 use_python_sort = False
             else:
                 raise Exception("GIS unavailable")
@@ -51,28 +73,31 @@ def available_orders(request):
             # Фолбэк без PostGIS: сортируем по Хаверсину на питоне
             use_python_sort = True
         if use_python_sort:
-            def _haversine_km(lat1, lon1, lat2, lon2):
-                R = 6371.0
-                phi1 = math.radians(lat1)
-                phi2 = math.radians(lat2)
-                dphi = math.radians(lat2 - lat1)
-                dlambda = math.radians(lon2 - lon1)
-                a = math.sin(dphi/2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2) ** 2
-                return 2 * R * math.asin(math.sqrt(a))
-
-            with_loc = qs.select_related("restaurant").only(
-                "id", "restaurant__id", "restaurant__name", "restaurant__lat", "restaurant__lon", "total", "status"
-            )[:200]  # ограничим, чтобы не выкачивать лишнее
-            enriched = []
-            for o in with_loc:
-                r = o.restaurant
-                if r and r.lat is not None and r.lon is not None:
-                    dist_km = _haversine_km(last_loc.lat, last_loc.lon, r.lat, r.lon)
-                else:
-                    dist_km = float("inf")
-                enriched.append((dist_km, o))
-            enriched.sort(key=lambda x: x[0])
-            qs = [o for _, o in enriched]
+            # Фолбэк без PostGIS: грубый bbox-отбор в SQL (если задан радиус), тянем только
+            # координаты, дистанции считаем одним пакетом
+            if radius is not None:
+                qs = qs.filter(bbox_q(last_loc.lat, last_loc.lon, radius, prefix="restaurant__"))
+            coords = list(qs.values_list("id", "restaurant__lat", "restaurant__lon"))
+            if coords:
+                ids, lats, lons = zip(*coords)
+                top = nearest(last_loc.lat, last_loc.lon, lats, lons, radius_km=radius, k=50)
+                by_id = qs.only(
+                    "id",
+                    "restaurant__id",
+                    "restaurant__name",
+                    "restaurant__lat",
+                    "restaurant__lon",
+                    "total",
+                    "status",
+                ).in_bulk([ids[i] for i, _ in top])
+                qs = []
+                for i, dist_km in top:
+                    o = by_id.get(ids[i])
+                    if o is not None:
+                        o.distance_km = dist_km
+                        qs.append(o)
+            else:
+                qs = []
     else:
         qs = qs.order_by("-created_at")
 
@@ -87,21 +112,9 @@ def available_orders(request):
                 dist_km = round(d.km, 3)
             except Exception:  # pragma: no cover
                 pass
-        # Для фолбэка пометим расстояние, если его посчитали вручную
-        if dist_km is None and last_loc and hasattr(o, "restaurant") and o.restaurant and o.restaurant.lat is not None:
-            try:
-                # При фолбэке уже отсортировано; можно пересчитать аккуратно
-                def _hv(lat1, lon1, lat2, lon2):
-                    R = 6371.0
-                    from math import radians, sin, cos, asin, sqrt
-                    phi1, phi2 = radians(lat1), radians(lat2)
-                    dphi = radians(lat2 - lat1)
-                    dl = radians(lon2 - lon1)
-                    a = sin(dphi/2)**2 + cos(phi1)*cos(phi2)*sin(dl/2)**2
-                    return 2 * R * asin(sqrt(a))
-                dist_km = round(_hv(last_loc.lat, last_loc.lon, o.restaurant.lat, o.restaurant.lon), 3)
-            except Exception:
-                pass
+        # Для фолбэка расстояние уже посчитано пакетом
+        if dist_km is None and getattr(o, "distance_km", None) is not None:
+            dist_km = round(o.distance_km, 3)
         results.append(
             {
                 "id": o.id,
@@ -123,20 +136,23 @@ def accept_order(request, id: int):  # noqa: A002
     if getattr(user, "role", None) != UserRole.COURIER:
         return Response({"detail": "Только курьер может принять заказ."}, status=status.HTTP_403_FORBIDDEN)
 
-    updated = (
-        Order.objects.filter(
-            id=id,
-            courier__isnull=True,
-            status__in=[OrderStatus.READY_FOR_PICKUP, OrderStatus.RESTAURANT_CONFIRMED],
-        )
-        .update(courier=user, status=OrderStatus.ACCEPTED)
+    order = transition(
+        id,
+        AVAILABLE_STATUSES,
+        OrderStatus.ACCEPTED,
+        actor=user,
+        extra={"courier_id": user.id},
+        courier__isnull=True,
     )
-    if updated == 0:
+    if order is None:
         return Response({"detail": "Заказ уже кем-то принят или недоступен."}, status=status.HTTP_409_CONFLICT)
 
-    # Подтянем запись и сообщим по WS
-    order = Order.objects.select_related("restaurant").get(pk=id)
-    broadcast_order_event.delay(order.id, {"type": "accepted", "order_id": order.id, "courier_id": user.id})
+    # Сообщим по WS
+    broadcast_order_event.delay(
+        order.id,
+        {"type": "accepted", "order_id": order.id, "courier_id": user.id},
+        order.restaurant_id,
+    )
     return Response(
         {
             "order_id": order.id,
@@ -150,34 +166,55 @@ def accept_order(request, id: int):  # noqa: A002
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def post_location(request):
-    """Прием GPS точки курьера. Лаконично, валидно, по делу."""
+    """
+    Прием GPS точки курьера. Лаконично, валидно, по делу. В режиме write-behind
+    (COURIER_LOCATION_WRITE_BEHIND) точка только ложится в буфер — ответ 202 без id, в историю она
+    попадет пачкой (см. buffer.py), раздача по заказам уходит в задачу.
+    """
     serializer = CourierLocationSerializer(data=request.data, context={"request": request})
     serializer.is_valid(raise_exception=True)
-    obj = serializer.save()
-
-    # Если это курьер — пушим координаты всем его активным заказам, чтобы фронт видел live-трекинг
     user = request.user
-    if getattr(user, "role", None) == UserRole.COURIER:
-        active_orders = (
-            Order.objects.filter(courier=user, status__in=[OrderStatus.ACCEPTED, OrderStatus.IN_TRANSIT])
-            .only("id", "status")
+    is_courier = getattr(user, "role", None) == UserRole.COURIER
+
+    if location_buffer.enabled():
+        lat, lon = serializer.validated_data["lat"], serializer.validated_data["lon"]
+        ts = timezone.now()
+        location_buffer.buffer_location(user.id, lat, lon, ts)
+        if is_courier:
+            publish_courier_location.delay(user.id, lat, lon, ts.isoformat())
+        return Response(
+            {"id": None, "lat": lat, "lon": lon, "ts": ts.isoformat()},
+            status=status.HTTP_202_ACCEPTED,
         )
-        for order in active_orders:
-            # Лёгкий автопереход: как только курьер поехал — статус IN_TRANSIT
-            if order.status == OrderStatus.ACCEPTED:
-                Order.objects.filter(id=order.id, status=OrderStatus.ACCEPTED).update(status=OrderStatus.IN_TRANSIT)
-                order.status = OrderStatus.IN_TRANSIT
-                broadcast_order_event.delay(order.id, {"type": "in_transit", "order_id": order.id})
-
-            broadcast_order_event.delay(
-                order.id,
-                {
-                    "type": "courier_location",
-                    "order_id": order.id,
-                    "lat": obj.lat,
-                    "lon": obj.lon,
-                    "ts": obj.ts.isoformat(),
-                },
-            )
 
+    obj = serializer.save()
+    # Если это курьер — пушим координаты всем его активным заказам, чтобы фронт видел live-трекинг
+    if is_courier:
+        publish_location(user, obj.lat, obj.lon, obj.ts)
     return Response(CourierLocationSerializer(obj).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def post_location_batch(request):
+    """
+    Пачка GPS-точек, накопленных офлайн (туннель, лифт): [{lat, lon, device_ts}, ...] или {"points":
+    [...]}. Одна валидация на всю пачку, один bulk_create с временем устройства, один upsert
+    позиции. Трекинг заказов получает только самую свежую точку пачки — и только если она новее
+    текущей позиции.
+    """
+    data = {"points": request.data} if isinstance(request.data, list) else request.data
+    serializer = CourierLocationBatchSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    newest = ingest_points(request.user, serializer.validated_data["points"])
+    return Response(
+        {
+            "accepted": len(serializer.validated_data["points"]),
+            "latest": {
+                "lat": newest["lat"],
+                "lon": newest["lon"],
+                "ts": newest["device_ts"].isoformat(),
+            },
+        },
+        status=status.HTTP_202_ACCEPTED if location_buffer.enabled() else status.HTTP_201_CREATED,
+    )
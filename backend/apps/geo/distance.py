@@ -0,0 +1,113 @@
+"""
+Расстояния по поверхности Земли. Одна реализация на весь проект — без копипасты по вьюхам.
+
+Пакетный движок (haversine_many/nearest) считает дистанции массивом: через NumPy, если он есть,
+иначе — на array('d') в чистом питоне. Интерфейс одинаковый, NumPy — опциональная зависимость.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from array import array
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - окружение без NumPy
+    np = None  # type: ignore
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (км) между двумя точками в градусах."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    """
+    Прямоугольник (min_lat, max_lat, min_lon, max_lon), гарантированно покрывающий круг радиуса
+    radius_km. Долготу у полюсов не ужимаем — просто отдаем весь диапазон. Через антимеридиан бокс
+    не склеиваем (обрезаем по ±180): для наших городов это не актуально.
+    """
+    # Угловой радиус; для долготы — точная формула, а не r/cos(lat): иначе края круга за боксом
+    delta = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(delta)
+    cos_lat = math.cos(math.radians(lat))
+    if delta >= math.pi / 2 or math.sin(delta) >= cos_lat:
+        dlon = 180.0
+    else:
+        dlon = math.degrees(math.asin(math.sin(delta) / cos_lat))
+    return (
+        max(-90.0, lat - dlat),
+        min(90.0, lat + dlat),
+        max(-180.0, lon - dlon),
+        min(180.0, lon + dlon),
+    )
+
+
+def haversine_many(
+    lat: float, lon: float, lats: Iterable[float], lons: Iterable[float]
+) -> Sequence[float]:
+    """
+    Дистанции (км) от точки (lat, lon) до каждой из точек (lats[i], lons[i]) одним пакетом.
+    Возвращает numpy.ndarray при наличии NumPy, иначе array('d').
+    """
+    if np is not None:
+        la = np.radians(np.asarray(lats, dtype=np.float64))
+        lo = np.radians(np.asarray(lons, dtype=np.float64))
+        phi = math.radians(lat)
+        a = np.sin((la - phi) / 2) ** 2
+        a += math.cos(phi) * np.cos(la) * np.sin((lo - math.radians(lon)) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    la_arr = array("d", lats)
+    lo_arr = array("d", lons)
+    phi1 = math.radians(lat)
+    cos_phi1 = math.cos(phi1)
+    lam1 = math.radians(lon)
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    out = array("d", bytes(8 * len(la_arr)))
+    for i in range(len(la_arr)):
+        phi2 = radians(la_arr[i])
+        dl = radians(lo_arr[i]) - lam1
+        a = sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos(phi2) * sin(dl / 2) ** 2
+        out[i] = 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+    return out
+
+
+def nearest(
+    lat: float,
+    lon: float,
+    lats: Iterable[float],
+    lons: Iterable[float],
+    radius_km: Optional[float] = None,
+    k: Optional[int] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Ближайшие точки: [(позиция во входных массивах, дистанция_км)] по возрастанию дистанции.
+    radius_km — отсечка по радиусу (включительно), k — сколько максимум вернуть.
+    """
+    dists = haversine_many(lat, lon, lats, lons)
+    if np is not None:
+        idx = np.arange(len(dists))
+        if radius_km is not None:
+            idx = idx[dists <= radius_km]
+        if k is not None and k < len(idx):
+            if k <= 0:
+                return []
+            idx = idx[np.argpartition(dists[idx], k - 1)[:k]]
+        # lexsort: сначала по дистанции, при равенстве — по позиции (стабильный порядок)
+        idx = idx[np.lexsort((idx, dists[idx]))]
+        return [(int(i), float(dists[i])) for i in idx]
+
+    pairs = [(d, i) for i, d in enumerate(dists) if radius_km is None or d <= radius_km]
+    if k is not None and k < len(pairs):
+        pairs = heapq.nsmallest(max(k, 0), pairs)
+    else:
+        pairs.sort()
+    return [(i, d) for d, i in pairs]
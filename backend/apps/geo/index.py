@@ -0,0 +1,156 @@
+"""
+Пространственный индекс в памяти процесса — для окружений без PostGIS.
+
+Сетка из ячеек фиксированного размера (в градусах): точка лежит ровно в одной ячейке,
+запрос по радиусу обходит только ячейки, пересекающие bounding box круга. Для городов
+с десятками тысяч точек это на порядки дешевле полного прохода по таблице.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .distance import bounding_box, nearest
+
+Cell = Tuple[int, int]
+LatLon = Tuple[float, float]
+
+
+class GridIndex:
+    """Сеточный индекс точек по id. Потокобезопасный: все мутации и чтения — под локом."""
+
+    def __init__(self, cell_deg: float = 0.01) -> None:
+        if cell_deg <= 0:
+            raise ValueError("cell_deg должен быть положительным")
+        self.cell_deg = cell_deg
+        self._cells: Dict[Cell, Dict[int, LatLon]] = {}
+        self._points: Dict[int, LatLon] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def upsert(self, pk: int, lat: float, lon: float) -> None:
+        with self._lock:
+            self._discard(pk)
+            self._points[pk] = (lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), {})[pk] = (lat, lon)
+
+    def remove(self, pk: int) -> None:
+        with self._lock:
+            self._discard(pk)
+
+    def _discard(self, pk: int) -> None:
+        old = self._points.pop(pk, None)
+        if old is None:
+            return
+        cell = self._cell(*old)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(pk, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def bulk_load(self, rows: Iterable[Tuple[int, float, float]]) -> None:
+        """Полная перезаливка индекса (старое содержимое выбрасываем)."""
+        cells: Dict[Cell, Dict[int, LatLon]] = {}
+        points: Dict[int, LatLon] = {}
+        for pk, lat, lon in rows:
+            if lat is None or lon is None:
+                continue
+            points[pk] = (lat, lon)
+            cells.setdefault(self._cell(lat, lon), {})[pk] = (lat, lon)
+        with self._lock:
+            self._cells = cells
+            self._points = points
+
+    def candidates(
+        self, lat: float, lon: float, radius_km: float
+    ) -> List[Tuple[int, float, float]]:
+        """Грубый отбор: все точки из ячеек, пересекающих bbox круга. Без точной дистанции."""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        y0, x0 = self._cell(min_lat, min_lon)
+        y1, x1 = self._cell(max_lat, max_lon)
+        out: List[Tuple[int, float, float]] = []
+        with self._lock:
+            # Если bbox покрывает больше ячеек, чем их вообще есть, — дешевле пройти по непустым
+            if (y1 - y0 + 1) * (x1 - x0 + 1) > len(self._cells):
+                for (cy, cx), bucket in self._cells.items():
+                    if y0 <= cy <= y1 and x0 <= cx <= x1:
+                        out.extend((pk, p[0], p[1]) for pk, p in bucket.items())
+                return out
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    bucket = self._cells.get((cy, cx))
+                    if bucket:
+                        out.extend((pk, p[0], p[1]) for pk, p in bucket.items())
+        return out
+
+    def query(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+        """Точки в радиусе radius_km: список (дистанция_км, id), отсортированный по дистанции."""
+        cands = self.candidates(lat, lon, radius_km)
+        if not cands:
+            return []
+        pks, lats, lons = zip(*cands)
+        return [
+            (dist_km, pks[i]) for i, dist_km in nearest(lat, lon, lats, lons, radius_km=radius_km)
+        ]
+
+
+class LazyGridIndex:
+    """
+    Индекс, который сам подгружается из источника при первом обращении и перестраивается раз в ttl
+    секунд. TTL нужен для нескольких воркеров: сигналы обновляют только индекс своего процесса,
+    изменения из соседних процессов подхватываем при перестройке.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[Tuple[int, float, float]]],
+        cell_deg: float = 0.01,
+        ttl: float = 300.0,
+    ) -> None:
+        self._loader = loader
+        self._ttl = ttl
+        self._index = GridIndex(cell_deg=cell_deg)
+        self._loaded_at: Optional[float] = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def reset(self) -> None:
+        """Сбросить индекс — следующий запрос загрузит его заново."""
+        with self._load_lock:
+            self._index.bulk_load(())
+            self._loaded_at = None
+
+    def _ensure_loaded(self) -> GridIndex:
+        loaded_at = self._loaded_at
+        if loaded_at is None or (self._ttl > 0 and time.monotonic() - loaded_at > self._ttl):
+            with self._load_lock:
+                loaded_at = self._loaded_at
+                if loaded_at is None or (
+                    self._ttl > 0 and time.monotonic() - loaded_at > self._ttl
+                ):
+                    self._index.bulk_load(self._loader())
+                    self._loaded_at = time.monotonic()
+        return self._index
+
+    def upsert(self, pk: int, lat: float, lon: float) -> None:
+        # Пока индекс не загружен — трогать нечего, свежие данные придут с загрузкой
+        if self.is_loaded:
+            self._index.upsert(pk, lat, lon)
+
+    def remove(self, pk: int) -> None:
+        if self.is_loaded:
+            self._index.remove(pk)
+
+    def query(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+        return self._ensure_loaded().query(lat, lon, radius_km)
@@ -0,0 +1,68 @@
+"""
+Бенчмарк: полный проход с Хаверсином (как в старом фолбэке restaurants_list) против сеточного
+индекса.
+Пример: python manage.py bench_spatial_index --sizes 1000,10000,100000 --queries 200
+"""
+from __future__ import annotations
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.geo.distance import haversine_km
+from apps.geo.index import GridIndex
+
+# Прямоугольник «города» — примерно Москва
+_CITY = (55.55, 55.95, 37.35, 37.85)
+
+
+class Command(BaseCommand):
+    help = "Сравнить радиус-поиск полным сканом и in-process сеточным индексом."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="1000,10000,100000", help="Размеры каталога через запятую"
+        )
+        parser.add_argument(
+            "--queries", type=int, default=200, help="Число запросов на каждый размер"
+        )
+        parser.add_argument("--radius", type=float, default=5.0, help="Радиус поиска, км")
+        parser.add_argument(
+            "--cell", type=float, default=0.01, help="Размер ячейки индекса, градусы"
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        radius = opts["radius"]
+        min_lat, max_lat, min_lon, max_lon = _CITY
+        self.stdout.write(f"{'N':>8} {'scan, ms/q':>12} {'index, ms/q':>12} {'speedup':>9}")
+        for size in (int(x) for x in opts["sizes"].split(",") if x.strip()):
+            points = [
+                (pk, rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon))
+                for pk in range(1, size + 1)
+            ]
+            queries = [
+                (rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon))
+                for _ in range(opts["queries"])
+            ]
+            index = GridIndex(cell_deg=opts["cell"])
+            index.bulk_load(points)
+
+            t0 = time.perf_counter()
+            for lat, lon in queries:
+                hits = []
+                for pk, plat, plon in points:
+                    dist_km = haversine_km(lat, lon, plat, plon)
+                    if dist_km <= radius:
+                        hits.append((dist_km, pk))
+                hits.sort()
+            scan = (time.perf_counter() - t0) / len(queries) * 1000
+
+            t0 = time.perf_counter()
+            for lat, lon in queries:
+                index.query(lat, lon, radius)
+            indexed = (time.perf_counter() - t0) / len(queries) * 1000
+
+            self.stdout.write(f"{size:>8} {scan:>12.3f} {indexed:>12.3f} {scan / indexed:>8.1f}x")
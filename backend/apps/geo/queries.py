@@ -0,0 +1,19 @@
+"""
+Хелперы для ORM: грубый гео-отбор на стороне БД, чтобы в питон приезжали только кандидаты.
+"""
+from __future__ import annotations
+
+from django.db.models import Q
+
+from .distance import bounding_box
+
+
+def bbox_q(lat: float, lon: float, radius_km: float, prefix: str = "") -> Q:
+    """
+    Q-фильтр lat__range/lon__range по bounding box круга. prefix — путь до модели с полями lat/lon,
+    например "restaurant__". Точную дистанцию после него всё равно считаем (углы бокса лишние).
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    return Q(
+        **{f"{prefix}lat__range": (min_lat, max_lat), f"{prefix}lon__range": (min_lon, max_lon)}
+    )
@@ -0,0 +1,58 @@
+"""
+Упрощение GPS-трека алгоритмом Дугласа — Пекера.
+
+Точки проецируем в локальные метры (равнопромежуточная проекция вокруг первой точки трека): на
+масштабах городской доставки ошибка ничтожна, а считать расстояние до отрезка на плоскости — дешево.
+Стек вместо рекурсии: треки за смену бывают длиннее лимита рекурсии.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Sequence, Tuple
+
+from .distance import EARTH_RADIUS_KM
+
+_M_PER_DEG = math.pi * EARTH_RADIUS_KM * 1000.0 / 180.0
+
+
+def _project(lats: Sequence[float], lons: Sequence[float]) -> Tuple[List[float], List[float]]:
+    k = math.cos(math.radians(lats[0]))
+    xs = [(lon - lons[0]) * _M_PER_DEG * k for lon in lons]
+    ys = [(lat - lats[0]) * _M_PER_DEG for lat in lats]
+    return xs, ys
+
+
+def _segment_distance(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> float:
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if length2 == 0.0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker(lats: Sequence[float], lons: Sequence[float], tolerance_m: float) -> List[int]:
+    """
+    Индексы точек, которые остаются в треке: первая, последняя и все, что отходят от упрощенной
+    линии дальше tolerance_m метров. Порядок — возрастающий.
+    """
+    n = len(lats)
+    if n <= 2:
+        return list(range(n))
+    xs, ys = _project(lats, lons)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_d = -1, tolerance_m
+        ax, ay, bx, by = xs[first], ys[first], xs[last], ys[last]
+        for i in range(first + 1, last):
+            d = _segment_distance(xs[i], ys[i], ax, ay, bx, by)
+            if d > worst_d:
+                worst, worst_d = i, d
+        if worst >= 0:
+            keep[worst] = True
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [i for i, kept in enumerate(keep) if kept]
@@ -5,3 +5,7 @@ class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.orders"
     verbose_name = "Заказы"
+
+    def ready(self):
+        # Подписки: роллапы продаж на order_status_changed, счетчики оценок на создание Rating
+        from . import ratings, rollups  # noqa: F401
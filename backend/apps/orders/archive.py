@@ -0,0 +1,114 @@
+"""
+Горячее/холодное хранение заказов.
+
+Доставленные и отмененные заказы, не менявшиеся дольше ORDER_ARCHIVE_AFTER_DAYS, переезжают вместе с
+позициями и оценками в архивные таблицы пачками по ORDER_ARCHIVE_BATCH — каждая пачка в своей
+транзакции. В рабочих таблицах остаются живые заказы: ленты курьеров и ресторанов работают по
+маленькому набору. История клиента и детали заказа читают архив прозрачно
+(см. views.list_my_orders / get_order_detail).
+"""
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    TERMINAL_STATUSES,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    ArchivedRating,
+    Order,
+    OrderItem,
+    Rating,
+)
+
+
+def archive_batch(cutoff, batch_size: int) -> int:
+    """
+    Перенести в архив одну пачку завершенных заказов, не менявшихся с cutoff. Возвращает число
+    заказов.
+    """
+    with transaction.atomic():
+        qs = Order.objects.filter(status__in=TERMINAL_STATUSES, updated_at__lt=cutoff).order_by(
+            "id"
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            # Два воркера не возьмут одни и те же строки, а пересечение с живым апдейтом пропустим
+            qs = qs.select_for_update(skip_locked=True)
+        orders: List[Order] = list(qs[:batch_size])
+        if not orders:
+            return 0
+        ids = [o.id for o in orders]
+        ArchivedOrder.objects.bulk_create(
+            [
+                ArchivedOrder(
+                    id=o.id,
+                    client_id=o.client_id,
+                    restaurant_id=o.restaurant_id,
+                    courier_id=o.courier_id,
+                    status=o.status,
+                    total=o.total,
+                    stripe_payment_intent_id=o.stripe_payment_intent_id,
+                    created_at=o.created_at,
+                    updated_at=o.updated_at,
+                )
+                for o in orders
+            ]
+        )
+        ArchivedOrderItem.objects.bulk_create(
+            [
+                ArchivedOrderItem(
+                    id=item.id,
+                    order_id=item.order_id,
+                    dish_id=item.dish_id,
+                    dish_name=item.dish.name,
+                    qty=item.qty,
+                    price_each=item.price_each,
+                )
+                for item in OrderItem.objects.filter(order_id__in=ids).select_related("dish")
+            ]
+        )
+        ArchivedRating.objects.bulk_create(
+            [
+                ArchivedRating(
+                    id=r.id,
+                    order_id=r.order_id,
+                    from_role=r.from_role,
+                    stars=r.stars,
+                    comment=r.comment,
+                    created_at=r.created_at,
+                )
+                for r in Rating.objects.filter(order_id__in=ids)
+            ]
+        )
+        # Дети — первыми: тогда каскад при удалении заказов ничего не находит и не тянет строки
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Rating.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+        return len(ids)
+
+
+def archive_finished_orders(
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> int:
+    """
+    Архивировать пачками, пока есть что или пока не кончился лимит пачек. Возвращает число заказов.
+    """
+    days = older_than_days if older_than_days is not None else settings.ORDER_ARCHIVE_AFTER_DAYS
+    size = batch_size or settings.ORDER_ARCHIVE_BATCH
+    cutoff = timezone.now() - timedelta(days=days)
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        n = archive_batch(cutoff, size)
+        moved += n
+        batches += 1
+        if n < size:
+            break
+    return moved
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from apps.restaurants.models import Restaurant
+from apps.users.models import UserRole
+from .tasks import order_group, restaurant_group
+
 
 class OrderTrackerConsumer(AsyncJsonWebsocketConsumer):
     """Примитивный консюмер — просто вступает в группу заказа и ретрансмитит события."""
@@ -13,7 +18,7 @@ class OrderTrackerConsumer(AsyncJsonWebsocketConsumer):
         except Exception:
             await self.close(code=4001)
             return
-        self.group_name = f"order_{order_id}"
+        self.group_name = order_group(order_id)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
@@ -24,3 +29,36 @@ class OrderTrackerConsumer(AsyncJsonWebsocketConsumer):
     async def order_event(self, event):
         # event должен содержать ключ "data"
         await self.send_json(event.get("data", {}))
+
+
+class RestaurantOrdersConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Лента входящих заказов владельца ресторана: одно соединение на все его рестораны. path:
+    /ws/restaurant/orders/?token=<JWT access>. Пропущенное за время обрыва — добираем HTTP-лентой
+    /api/v1/orders/incoming?cursor=... (события несут order_id, полный заказ — там).
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if (
+            not getattr(user, "is_authenticated", False)
+            or getattr(user, "role", None) != UserRole.RESTAURANT
+        ):
+            await self.close(code=4003)
+            return
+        self.group_names = [restaurant_group(pk) for pk in await _owned_restaurant_ids(user.id)]
+        for name in self.group_names:
+            await self.channel_layer.group_add(name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):  # noqa: ARG002
+        for name in getattr(self, "group_names", []):
+            await self.channel_layer.group_discard(name, self.channel_name)
+
+    async def order_event(self, event):
+        await self.send_json(event.get("data", {}))
+
+
+@database_sync_to_async
+def _owned_restaurant_ids(owner_id: int) -> list:
+    return list(Restaurant.objects.filter(owner_id=owner_id).values_list("id", flat=True))
@@ -0,0 +1,194 @@
+"""
+Idempotency-Key для небезопасных ручек (создание заказа, оплата).
+
+Клиент шлет заголовок Idempotency-Key (любая уникальная строка, обычно UUID) и при ретрае повторяет
+его. Первый запрос выполняется как обычно, ответ сохраняется на IDEMPOTENCY_TTL; повтор с тем же
+ключом и тем же телом получает сохраненный ответ (заголовок Idempotent-Replayed: true) — без
+сериализатора и без Stripe. Тот же ключ с другим запросом — 422. Параллельные дубли ждут первый
+запрос за локом до IDEMPOTENCY_WAIT секунд, потом — 409 с Retry-After. Ответы 5xx (в т.ч. 502 при
+сбое Stripe) и 409 не сохраняются: повтор с тем же ключом выполнится заново.
+
+Хранилище: кэш (быстро, общий при Redis) + таблица IdempotencyKey (переживает вытеснение из кэша).
+Лок — cache.add, если кэш общий для процессов; иначе (LocMemCache и т.п.) — строка IdempotencyKey в
+состоянии «выполняется» (status_code NULL), вставленная до вызова вьюхи: уникальный (user, key)
+пускает одного.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodradar.renderers import ORJSONRenderer
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Ответы, которые не сохраняем: повтор должен выполниться заново
+_NOT_STORED = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "IDEMPOTENCY_TTL", 24 * 3600))
+
+
+def _cache_key(user_id: int, key: str) -> str:
+    return f"idem:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def _shared_cache() -> bool:
+    """Видят ли cache.add соседние процессы: память процесса и dummy — нет."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def _fingerprint(request) -> str:
+    data = request.data if request.method not in ("GET", "HEAD") else {}
+    raw = json.dumps(
+        {"m": request.method, "p": request.path, "d": data}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _lookup(user_id: int, key: str) -> Optional[dict]:
+    ck = _cache_key(user_id, key)
+    record = cache.get(ck)
+    if record is not None:
+        return record
+    row = (
+        IdempotencyKey.objects.filter(
+            user_id=user_id, key=key, status_code__isnull=False, expires_at__gt=timezone.now()
+        )
+        .values("fingerprint", "status_code", "body", "expires_at")
+        .first()
+    )
+    if row is None:
+        return None
+    record = {"fp": row["fingerprint"], "status": row["status_code"], "data": row["body"]}
+    remaining = int((row["expires_at"] - timezone.now()).total_seconds())
+    if remaining > 0:
+        cache.set(ck, record, remaining)
+    return record
+
+
+def _store(user_id: int, key: str, fingerprint: str, response: Response) -> None:
+    # Нормализуем данные так же, как их увидит клиент (Decimal, даты, ленивые строки -> JSON)
+    data = json.loads(ORJSONRenderer().render(response.data) or b"null")
+    record = {"fp": fingerprint, "status": response.status_code, "data": data}
+    ttl = _ttl()
+    cache.set(_cache_key(user_id, key), record, ttl)
+    values = {
+        "fingerprint": fingerprint,
+        "status_code": response.status_code,
+        "body": data,
+        "expires_at": timezone.now() + timedelta(seconds=ttl),
+    }
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.update_or_create(user_id=user_id, key=key, defaults=values)
+    except IntegrityError:  # pragma: no cover - соседний процесс успел раньше, его запись не хуже
+        pass
+
+
+def _acquire(user_id: int, key: str, fingerprint: str, hold: int) -> bool:
+    if _shared_cache():
+        return cache.add(f"{_cache_key(user_id, key)}:lock", 1, timeout=hold)
+    now = timezone.now()
+    # Истекшая строка (упавший держатель или старый ответ) ключ не держит
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user_id=user_id,
+                key=key,
+                fingerprint=fingerprint,
+                status_code=None,
+                body=None,
+                expires_at=now + timedelta(seconds=hold),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def _release(user_id: int, key: str) -> None:
+    if _shared_cache():
+        cache.delete(f"{_cache_key(user_id, key)}:lock")
+    else:
+        # Ответ сохранен — строка уже не «выполняется»; не сохранен — освобождаем ключ для повтора
+        IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+
+
+def _replay(record: dict, fingerprint: str) -> Response:
+    if record["fp"] != fingerprint:
+        return Response(
+            {"detail": "Idempotency-Key уже использован с другим запросом."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(
+        record["data"], status=record["status"], headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def idempotent(view):
+    """
+    Декоратор для function-based DRF-вьюх; ставится под @permission_classes
+    (пользователь уже известен). Без заголовка Idempotency-Key вьюха работает как раньше.
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        user = request.user
+        if not key or not getattr(user, "is_authenticated", False):
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} длиннее {MAX_KEY_LENGTH} символов."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = _fingerprint(request)
+        record = _lookup(user.id, key)
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        wait = float(getattr(settings, "IDEMPOTENCY_WAIT", 5.0))
+        deadline = time.monotonic() + wait
+        # Лок живет дольше ожидания: если держатель упал, ключ освободится сам
+        while not _acquire(user.id, key, fingerprint, int(wait * 6) or 30):
+            if time.monotonic() >= deadline:
+                return Response(
+                    {"detail": "Запрос с этим Idempotency-Key еще выполняется."},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+            time.sleep(0.05)
+            record = _lookup(user.id, key)
+            if record is not None:
+                return _replay(record, fingerprint)
+
+        try:
+            # Пока ждали лок, первый запрос мог успеть закончиться
+            record = _lookup(user.id, key)
+            if record is not None:
+                return _replay(record, fingerprint)
+            response = view(request, *args, **kwargs)
+            if response.status_code < 500 and response.status_code not in _NOT_STORED:
+                _store(user.id, key, fingerprint, response)
+            return response
+        finally:
+            _release(user.id, key)
+
+    return wrapper
@@ -0,0 +1,69 @@
+"""
+Пересчет дневных роллапов продаж по заказам (рабочим и архивным): первичное заполнение и сверка
+после сбоев. Диапазон режется на окна по --chunk-days, каждое окно — своя транзакция.
+Пример: python manage.py backfill_sales_rollups --from 2024-01-01 --to 2024-03-31 --restaurant 7
+"""
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.orders.models import ArchivedOrder, Order
+from apps.orders.rollups import rebuild_sales_rollups, sales_day
+
+
+def _date(value: str, name: str):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"--{name}: ожидается дата YYYY-MM-DD")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитать роллапы продаж ресторанов по дням "
+        "(RestaurantDailySales / RestaurantDailyDishSales)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="day_from", help="Первый день (по умолчанию — самый ранний заказ)"
+        )
+        parser.add_argument("--to", dest="day_to", help="Последний день (по умолчанию — сегодня)")
+        parser.add_argument("--restaurant", type=int, help="Только один ресторан")
+        parser.add_argument("--chunk-days", type=int, default=31, help="Дней в одной транзакции")
+
+    def handle(self, *args, **opts):
+        day_to = _date(opts["day_to"], "to") if opts["day_to"] else timezone.localdate()
+        if opts["day_from"]:
+            day_from = _date(opts["day_from"], "from")
+        else:
+            firsts = [
+                m.objects.aggregate(first=Min("created_at"))["first"]
+                for m in (Order, ArchivedOrder)
+            ]
+            firsts = [sales_day(f) for f in firsts if f is not None]
+            if not firsts:
+                self.stdout.write("Заказов нет — считать нечего.")
+                return
+            day_from = min(firsts)
+        if day_from > day_to:
+            raise CommandError("--from позже --to")
+
+        step = max(opts["chunk_days"], 1)
+        total = 0
+        start = day_from
+        while start <= day_to:
+            end = min(start + timedelta(days=step - 1), day_to)
+            n = rebuild_sales_rollups(start, end, restaurant_id=opts["restaurant"])
+            total += n
+            self.stdout.write(f"{start}..{end}: {n} дней-строк")
+            start = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Готово: {total} дней-строк за {day_from}..{day_to}"))
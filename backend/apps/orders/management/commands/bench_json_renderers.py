@@ -0,0 +1,110 @@
+"""
+Бенчмарк: стандартный JSONRenderer/JSONParser DRF против orjson-версий на списках заказов.
+Данные — в форме вывода OrderSerializer (id, статусы, суммы, даты, позиции), БД не нужна.
+Пример: python manage.py bench_json_renderers --sizes 20,100,1000 --repeat 200
+"""
+from __future__ import annotations
+
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from foodradar.parsers import ORJSONParser
+from foodradar.renderers import ORJSONRenderer, orjson
+
+
+def _orders(size: int, rnd: random.Random, raw: bool) -> list:
+    """
+    raw=True — Decimal/datetime как есть (идут через default=), иначе строки, как отдает
+    сериализатор.
+    """
+    now = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+    out = []
+    for pk in range(1, size + 1):
+        items = []
+        for j in range(rnd.randint(1, 5)):
+            price = Decimal(rnd.randint(100, 99999)) / 100
+            items.append(
+                {
+                    "id": pk * 10 + j,
+                    "dish": rnd.randint(1, 5000),
+                    "dish_name": f"Блюдо №{rnd.randint(1, 500)}",
+                    "qty": rnd.randint(1, 4),
+                    "price_each": price if raw else str(price),
+                }
+            )
+        created = now - timedelta(
+            minutes=rnd.randint(0, 10_000), microseconds=rnd.randint(0, 999_999)
+        )
+        total = sum((Decimal(str(i["price_each"])) * i["qty"] for i in items), Decimal("0"))
+        out.append(
+            {
+                "id": pk,
+                "client": rnd.randint(1, 10_000),
+                "restaurant": rnd.randint(1, 500),
+                "courier": None,
+                "status": "CREATED",
+                "total": total if raw else str(total),
+                "stripe_payment_intent_id": "",
+                "created_at": created if raw else created.isoformat().replace("+00:00", "Z"),
+                "updated_at": created if raw else created.isoformat().replace("+00:00", "Z"),
+                "items": items,
+            }
+        )
+    return out
+
+
+def _timeit(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = "Сравнить время рендера/парсинга JSON: stdlib (DRF) против orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="20,100,1000", help="Число заказов в ответе через запятую"
+        )
+        parser.add_argument("--repeat", type=int, default=200, help="Повторов на каждый размер")
+        parser.add_argument(
+            "--raw", action="store_true", help="Decimal/datetime объектами, а не строками"
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        if orjson is None:
+            self.stdout.write(
+                self.style.WARNING("orjson не установлен — сравниваем stdlib сам с собой")
+            )
+        rnd = random.Random(opts["seed"])
+        repeat = max(1, opts["repeat"])
+        std_r, fast_r = JSONRenderer(), ORJSONRenderer()
+        std_p, fast_p = JSONParser(), ORJSONParser()
+        self.stdout.write(
+            f"{'N':>6} {'render std':>11} {'render orj':>11} {'x':>6} "
+            f"{'parse std':>10} {'parse orj':>10} {'x':>6}"
+        )
+        for size in (int(x) for x in opts["sizes"].split(",") if x.strip()):
+            data = _orders(size, rnd, opts["raw"])
+            body = std_r.render(data)
+            if fast_r.render(data) != body:
+                self.stdout.write(
+                    self.style.WARNING(f"N={size}: вывод orjson отличается от stdlib")
+                )
+            r_std = _timeit(lambda: std_r.render(data), repeat)
+            r_fast = _timeit(lambda: fast_r.render(data), repeat)
+            p_std = _timeit(lambda: std_p.parse(io.BytesIO(body)), repeat)
+            p_fast = _timeit(lambda: fast_p.parse(io.BytesIO(body)), repeat)
+            self.stdout.write(
+                f"{size:>6} {r_std:>9.3f}ms {r_fast:>9.3f}ms {r_std / r_fast:>5.1f}x "
+                f"{p_std:>8.3f}ms {p_fast:>8.3f}ms {p_std / p_fast:>5.1f}x"
+            )
@@ -0,0 +1,133 @@
+"""
+Бенчмарк истории заказов: OFFSET-пагинация (как было) против keyset по (created_at, id).
+Создает клиента с --orders заказами во временной транзакции и откатывает ее в конце — БД не мусорим.
+Пример: python manage.py bench_order_history --orders 10000 --pages 1,10,100,500
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem, OrderStatus
+from apps.orders.serializers import OrderSerializer
+from apps.orders.views import _history_page
+from apps.restaurants.models import Dish, Restaurant
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _ms(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = "Сравнить задержку страниц истории заказов: OFFSET против keyset (created_at, id)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=10_000, help="Заказов у клиента")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--pages", default="1,10,100,500", help="Номера страниц через запятую")
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов на каждую страницу")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, opts):
+        size = opts["page_size"]
+        pages = sorted({int(x) for x in opts["pages"].split(",") if x.strip()})
+        client = self._seed(opts["orders"])
+        qs = Order.objects.filter(client_id=client.id)
+
+        # Позиции курсора для нужных страниц — честным проходом по keyset
+        cursors = {1: None}
+        after = None
+        for page in range(1, pages[-1]):
+            rows = list(_history_page(qs, after, size).only("id", "created_at"))
+            if not rows:
+                break
+            after = (rows[-1].created_at, rows[-1].id)
+            cursors[page + 1] = after
+
+        repeat = max(1, opts["repeat"])
+        self.stdout.write(f"{'page':>6} {'offset, ms':>11} {'keyset, ms':>11}")
+        for page in pages:
+            if page not in cursors:
+                self.stdout.write(f"{page:>6} — за пределами истории")
+                continue
+            start = (page - 1) * size
+
+            def offset_page():
+                qs.count()
+                return OrderSerializer(
+                    qs.order_by("-created_at")[start : start + size], many=True
+                ).data
+
+            def keyset_page():
+                return OrderSerializer(list(_history_page(qs, cursors[page], size)), many=True).data
+
+            self.stdout.write(
+                f"{page:>6} {_ms(offset_page, repeat):>11.2f} {_ms(keyset_page, repeat):>11.2f}"
+            )
+
+    def _seed(self, n: int):
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        client = User.objects.create(email=f"bench-client-{tag}@example.com")
+        owner = User.objects.create(email=f"bench-owner-{tag}@example.com")
+        restaurant = Restaurant.objects.create(
+            owner=owner, name="Bench", address="-", lat=55.75, lon=37.61
+        )
+        dishes = Dish.objects.bulk_create(
+            [
+                Dish(restaurant=restaurant, name=f"Dish {i}", price=Decimal("10.00"))
+                for i in range(20)
+            ]
+        )
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    client=client,
+                    restaurant=restaurant,
+                    status=OrderStatus.DELIVERED,
+                    total=Decimal("20.00"),
+                )
+                for _ in range(n)
+            ],
+            batch_size=1000,
+        )
+        # auto_now_add проставил всем одно время — разнесем по минутам, как в живой истории
+        now = timezone.now()
+        for i, order in enumerate(orders):
+            order.created_at = now - timedelta(minutes=n - i)
+        Order.objects.bulk_update(orders, ["created_at"], batch_size=1000)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=o,
+                    dish=dishes[(o.pk + j) % len(dishes)],
+                    qty=1,
+                    price_each=Decimal("10.00"),
+                )
+                for o in orders
+                for j in range(2)
+            ],
+            batch_size=2000,
+        )
+        return client
@@ -0,0 +1,161 @@
+"""
+EXPLAIN для горячих запросов заказов/курьеров/ресторанов: показывает план и помечает полный проход
+по таблице (Seq Scan в Postgres, любой «SCAN» в SQLite — «SCAN … USING [COVERING] INDEX» тоже
+проход, только по индексу; поиск — это SEARCH) и сортировку во временном B-дереве
+(«USE TEMP B-TREE FOR ORDER BY» в SQLite). Исключения — в ORDERED_SCANS
+(проход по индексу ради ORDER BY с LIMIT) и BOUNDED_SORTS (сортируем заведомо мало строк). На почти
+пустой БД Postgres честно выбирает Seq Scan — для проверки индексов есть --no-seqscan (SET LOCAL
+enable_seqscan = off: план покажет, способен ли запрос вообще пойти по индексу).
+Пример: python manage.py explain_hot_queries --no-seqscan --fail
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, FrozenSet, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.courier.models import CourierPosition
+from apps.geo.queries import bbox_q
+from apps.orders.models import AVAILABLE_STATUSES, COURIER_ACTIVE_STATUSES, Order, OrderStatus
+from apps.restaurants.models import Restaurant
+from foodradar.pagination import keyset_filter
+
+# Значения параметров для плана не важны — важна форма запроса
+_USER_ID = 1
+_AT = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+_LAT, _LON = 55.75, 37.62
+
+_SEQ_SCAN = re.compile(r"Seq Scan on (\S+)")
+_SQLITE_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_SQLITE_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY")
+
+# Запрос -> индексы, проход по которым задуман: порядок индекса = ORDER BY, проход обрывает LIMIT
+ORDERED_SCANS: Dict[str, FrozenSet[str]] = {}
+# Запрос -> почему сортировка во временном B-дереве допустима
+BOUNDED_SORTS: Dict[str, str] = {
+    "available_orders": (
+        "сортируются только свободные заказы (status IN, courier IS NULL) — их единицы"
+    ),
+}
+
+
+def hot_queries() -> List[Tuple[str, Callable]]:
+    """(название, фабрика queryset) — те же фильтры, что во вьюхах."""
+    available = Order.objects.filter(status__in=AVAILABLE_STATUSES, courier__isnull=True)
+    return [
+        ("available_orders", lambda: available.order_by("-created_at")[:50]),
+        ("accept_order", lambda: available.filter(id=_USER_ID)),
+        (
+            "post_location: активные заказы курьера",
+            lambda: Order.objects.filter(courier_id=_USER_ID, status__in=COURIER_ACTIVE_STATUSES)
+            .order_by()
+            .only("id", "status", "restaurant_id"),
+        ),
+        (
+            "list_my_orders: первая страница",
+            lambda: keyset_filter(
+                Order.objects.filter(client_id=_USER_ID),
+                ("created_at", "id"),
+                None,
+                descending=True,
+            )[:21],
+        ),
+        (
+            "list_my_orders: по курсору",
+            lambda: keyset_filter(
+                Order.objects.filter(client_id=_USER_ID),
+                ("created_at", "id"),
+                (_AT, 10),
+                descending=True,
+            )[:21],
+        ),
+        (
+            "list_my_orders: со статусом",
+            lambda: keyset_filter(
+                Order.objects.filter(client_id=_USER_ID, status=OrderStatus.DELIVERED),
+                ("created_at", "id"),
+                None,
+                descending=True,
+            )[:21],
+        ),
+        (
+            "лента входящих заказов ресторана",
+            lambda: keyset_filter(
+                Order.objects.filter(restaurant_id=_USER_ID), ("updated_at", "id"), (_AT, 10)
+            )[:21],
+        ),
+        (
+            "текущая позиция курьера",
+            lambda: CourierPosition.objects.filter(courier_id=_USER_ID)[:1],
+        ),
+        (
+            "рестораны рядом (bbox)",
+            lambda: Restaurant.objects.filter(is_active=True)
+            .filter(bbox_q(_LAT, _LON, 5.0))
+            .values_list("id", "lat", "lon"),
+        ),
+    ]
+
+
+def full_scans(plan: str, ordered: FrozenSet[str] = frozenset()) -> List[str]:
+    """
+    Таблицы, которые план проходит целиком; проход по индексу из ordered — задуманный, не считаем.
+    """
+    tables = _SEQ_SCAN.findall(plan)
+    for line in plan.splitlines():
+        m = _SQLITE_SCAN.search(line)
+        if m and m.group(2) not in ordered:
+            tables.append(m.group(1))
+    return tables
+
+
+def temp_sorts(plan: str) -> int:
+    """Сколько сортировок во временном B-дереве (ORDER BY, который не покрыл индекс)."""
+    return len(_SQLITE_TEMP_SORT.findall(plan))
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN горячих запросов и пометка полных проходов по таблицам."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="Postgres: запретить Seq Scan на время EXPLAIN",
+        )
+        parser.add_argument(
+            "--fail", action="store_true", help="Код выхода != 0, если найден полный проход"
+        )
+        parser.add_argument("--quiet", action="store_true", help="Не печатать планы, только итог")
+
+    def handle(self, *args, **opts):
+        flagged = []
+        with transaction.atomic():
+            if opts["no_seqscan"] and connection.vendor == "postgresql":
+                with connection.cursor() as cur:
+                    cur.execute("SET LOCAL enable_seqscan = off")
+            for title, make in hot_queries():
+                plan = make().explain()
+                scans = full_scans(plan, ORDERED_SCANS.get(title, frozenset()))
+                sorts = temp_sorts(plan)
+                problems = []
+                if scans:
+                    problems.append(f"ПОЛНЫЙ ПРОХОД: {', '.join(scans)}")
+                if sorts and title not in BOUNDED_SORTS:
+                    problems.append("СОРТИРОВКА ВО ВРЕМЕННОМ B-ДЕРЕВЕ")
+                if problems:
+                    mark = self.style.ERROR("; ".join(problems))
+                elif sorts:
+                    mark = self.style.WARNING(f"ok, сортировка: {BOUNDED_SORTS[title]}")
+                else:
+                    mark = self.style.SUCCESS("ok")
+                self.stdout.write(f"== {title}: {mark}")
+                if not opts["quiet"]:
+                    self.stdout.write(plan)
+                if problems:
+                    flagged.append(title)
+        if flagged and opts["fail"]:
+            raise CommandError(f"Полный проход или сортировка в запросах: {', '.join(flagged)}")
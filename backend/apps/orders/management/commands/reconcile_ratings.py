@@ -0,0 +1,27 @@
+"""
+Сверка денормализованных счетчиков оценок (Restaurant.rating_*, User.courier_rating_*) с самими
+оценками, включая архивные. Нужна после ручных правок/удалений Rating и для первичного заполнения.
+Пример: python manage.py reconcile_ratings --batch 2000
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from apps.orders.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересчитать счетчики оценок ресторанов и курьеров по таблицам Rating/ArchivedRating."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch", type=int, default=1000, help="Размер пачки чтения/bulk_update"
+        )
+
+    def handle(self, *args, **opts):
+        fixed = reconcile_ratings(batch_size=max(1, opts["batch"]))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Поправлено ресторанов: {fixed['restaurant']}, курьеров: {fixed['courier']}"
+            )
+        )
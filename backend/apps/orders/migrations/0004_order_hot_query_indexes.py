@@ -0,0 +1,29 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('courier__isnull', True), ('status__in', ('restaurant_confirmed', 'ready_for_pickup'))), fields=['-created_at'], name='idx_order_available'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'courier'], name='idx_order_status_courier'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('accepted', 'in_transit'))), fields=['courier', 'status'], name='idx_order_courier_active'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['client', '-created_at', '-id'], name='idx_order_client_created'),
+        ),
+    ]
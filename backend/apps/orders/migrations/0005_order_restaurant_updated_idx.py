@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'updated_at', 'id'], name='idx_order_restaurant_updated'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('restaurants', '0004_dish_allergen_mask'),
+        ('orders', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('created', 'Создан (корзина)'), ('pending_payment', 'Ожидает оплаты'), ('paid', 'Оплачен'), ('restaurant_confirmed', 'Ресторан подтвердил'), ('ready_for_pickup', 'Готов к выдаче'), ('accepted', 'Курьер принял'), ('in_transit', 'В пути'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=32, verbose_name='Статус')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма')),
+                ('stripe_payment_intent_id', models.CharField(blank=True, default='', max_length=255, verbose_name='Stripe PaymentIntent')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(verbose_name='Обновлен')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='В архиве с')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Клиент')),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Курьер')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='restaurants.restaurant', verbose_name='Ресторан')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архивные заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRating',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_role', models.CharField(choices=[('client', 'Клиент'), ('courier', 'Курьер'), ('restaurant', 'Ресторан')], max_length=20, verbose_name='От кого')),
+                ('stars', models.PositiveSmallIntegerField(verbose_name='Звезды')),
+                ('comment', models.TextField(blank=True, default='', verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='orders.archivedorder', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Архивная оценка',
+                'verbose_name_plural': 'Архивные оценки',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('dish_name', models.CharField(max_length=255, verbose_name='Блюдо (название)')),
+                ('qty', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price_each', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена за ед.')),
+                ('dish', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='restaurants.dish', verbose_name='Блюдо')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Позиция архивного заказа',
+                'verbose_name_plural': 'Позиции архивных заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['client', '-created_at', '-id'], name='idx_archorder_client_created'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:11
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_dish_allergen_mask'),
+        ('orders', '0007_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantDailyDishSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('dish_id', models.BigIntegerField(verbose_name='Блюдо (id)')),
+                ('dish_name', models.CharField(max_length=255, verbose_name='Блюдо (название)')),
+                ('qty', models.PositiveIntegerField(default=0, verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи блюда за день',
+                'verbose_name_plural': 'Продажи блюд по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='RestaurantDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Оплаченных заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Выручка')),
+                ('delivered_count', models.PositiveIntegerField(default=0, verbose_name='Доставлено')),
+                ('canceled_count', models.PositiveIntegerField(default=0, verbose_name='Отменено после оплаты')),
+                ('refunded', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Возвраты')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+            ],
+            options={
+                'verbose_name': 'Продажи ресторана за день',
+                'verbose_name_plural': 'Продажи ресторанов по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollupMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='Заказ (id)')),
+                ('kind', models.CharField(choices=[('created', 'Создан (корзина)'), ('pending_payment', 'Ожидает оплаты'), ('paid', 'Оплачен'), ('restaurant_confirmed', 'Ресторан подтвердил'), ('ready_for_pickup', 'Готов к выдаче'), ('accepted', 'Курьер принял'), ('in_transit', 'В пути'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=32, verbose_name='Событие')),
+            ],
+            options={
+                'verbose_name': 'Учтенное событие продаж',
+                'verbose_name_plural': 'Учтенные события продаж',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollupmark',
+            constraint=models.UniqueConstraint(fields=('order_id', 'kind'), name='uniq_sales_mark_order_kind'),
+        ),
+        migrations.AddField(
+            model_name='restaurantdailysales',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurants.restaurant', verbose_name='Ресторан'),
+        ),
+        migrations.AddField(
+            model_name='restaurantdailydishsales',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurants.restaurant', verbose_name='Ресторан'),
+        ),
+        migrations.AddConstraint(
+            model_name='restaurantdailysales',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'day'), name='uniq_daily_sales_restaurant_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='restaurantdailydishsales',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'day', 'dish_id'), name='uniq_daily_dish_sales'),
+        ),
+    ]
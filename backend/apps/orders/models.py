@@ -20,6 +20,29 @@ class OrderStatus(models.TextChoices):
     CANCELED = "canceled", "Отменен"
 
 
+# Допустимые переходы: из статуса -> в какие можно. Применяет их orders.services.transition
+ORDER_TRANSITIONS = {
+    OrderStatus.CREATED: {OrderStatus.PENDING_PAYMENT, OrderStatus.PAID, OrderStatus.CANCELED},
+    OrderStatus.PENDING_PAYMENT: {OrderStatus.PAID, OrderStatus.CANCELED},
+    OrderStatus.PAID: {OrderStatus.RESTAURANT_CONFIRMED, OrderStatus.CANCELED},
+    OrderStatus.RESTAURANT_CONFIRMED: {
+        OrderStatus.READY_FOR_PICKUP,
+        OrderStatus.ACCEPTED,
+        OrderStatus.CANCELED,
+    },
+    OrderStatus.READY_FOR_PICKUP: {OrderStatus.ACCEPTED, OrderStatus.CANCELED},
+    OrderStatus.ACCEPTED: {OrderStatus.IN_TRANSIT, OrderStatus.CANCELED},
+    OrderStatus.IN_TRANSIT: {OrderStatus.DELIVERED},
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.CANCELED: set(),
+}
+
+# Заказ ждет курьера (лента available_orders, accept_order) и заказ уже у курьера (post_location).
+# На эти наборы завязаны частичные индексы ниже — меняете список, меняйте и индекс (миграцией)
+AVAILABLE_STATUSES = (OrderStatus.RESTAURANT_CONFIRMED, OrderStatus.READY_FOR_PICKUP)
+COURIER_ACTIVE_STATUSES = (OrderStatus.ACCEPTED, OrderStatus.IN_TRANSIT)
+
+
 class Order(models.Model):
     client = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="orders", verbose_name="Клиент")
     restaurant = models.ForeignKey(Restaurant, on_delete=models.PROTECT, related_name="orders", verbose_name="Ресторан")
@@ -36,6 +59,28 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ("-created_at",)
+        indexes = [
+            # Свободные заказы: частичный индекс только по ждущим курьера — мал при любой истории.
+            # Частичные индексы умеют и Postgres, и SQLite; на остальных БД выручит составной ниже
+            models.Index(
+                fields=["-created_at"],
+                name="idx_order_available",
+                condition=models.Q(courier__isnull=True, status__in=AVAILABLE_STATUSES),
+            ),
+            models.Index(fields=["status", "courier"], name="idx_order_status_courier"),
+            # Активные заказы курьера
+            models.Index(
+                fields=["courier", "status"],
+                name="idx_order_courier_active",
+                condition=models.Q(status__in=COURIER_ACTIVE_STATUSES),
+            ),
+            # История клиента: keyset по (created_at, id) в list_my_orders
+            models.Index(fields=["client", "-created_at", "-id"], name="idx_order_client_created"),
+            # Лента входящих заказов ресторана: seek по (updated_at, id) внутри ресторана
+            models.Index(
+                fields=["restaurant", "updated_at", "id"], name="idx_order_restaurant_updated"
+            ),
+        ]
 
     def recalc_total(self) -> Decimal:
         """Пересчитываем сумму заказа по позициям. Возвращаем финальную сумму."""
@@ -72,3 +117,190 @@ class Rating(models.Model):
     class Meta:
         verbose_name = "Оценка"
         verbose_name_plural = "Оценки"
+
+
+# --- Архив: завершенные заказы старше ORDER_ARCHIVE_AFTER_DAYS (см. orders.archive) ---
+# id сохраняем исходные: ссылки на заказ (в письмах, у Stripe, в клиентах) продолжают работать
+
+TERMINAL_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELED)
+
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", verbose_name="Клиент"
+    )
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.PROTECT, related_name="+", verbose_name="Ресторан"
+    )
+    courier = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Курьер",
+    )
+
+    status = models.CharField("Статус", max_length=32, choices=OrderStatus.choices)
+    total = models.DecimalField("Сумма", max_digits=10, decimal_places=2)
+    stripe_payment_intent_id = models.CharField(
+        "Stripe PaymentIntent", max_length=255, blank=True, default=""
+    )
+
+    created_at = models.DateTimeField("Создан")
+    updated_at = models.DateTimeField("Обновлен")
+    archived_at = models.DateTimeField("В архиве с", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архивные заказы"
+        indexes = [
+            models.Index(
+                fields=["client", "-created_at", "-id"], name="idx_archorder_client_created"
+            ),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.CASCADE, related_name="items", verbose_name="Заказ"
+    )
+    dish = models.ForeignKey(
+        Dish, on_delete=models.SET_NULL, null=True, related_name="+", verbose_name="Блюдо"
+    )
+    # Название на момент архивации: блюдо переименуют или удалят, а история читается без join
+    dish_name = models.CharField("Блюдо (название)", max_length=255)
+    qty = models.PositiveIntegerField("Количество")
+    price_each = models.DecimalField("Цена за ед.", max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Позиция архивного заказа"
+        verbose_name_plural = "Позиции архивных заказов"
+
+
+class ArchivedRating(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.CASCADE, related_name="ratings", verbose_name="Заказ"
+    )
+    from_role = models.CharField("От кого", max_length=20, choices=RatingFromRole.choices)
+    stars = models.PositiveSmallIntegerField("Звезды")
+    comment = models.TextField("Комментарий", blank=True, default="")
+    created_at = models.DateTimeField("Создан")
+
+    class Meta:
+        verbose_name = "Архивная оценка"
+        verbose_name_plural = "Архивные оценки"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Сохраненный ответ на запрос с заголовком Idempotency-Key (см. orders.idempotency). Основное
+    хранилище — кэш; таблица — страховка на случай вытеснения из кэша и для соседних процессов. Без
+    общего кэша строка со status_code NULL — лок: запрос с этим ключом еще выполняется.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Пользователь",
+    )
+    key = models.CharField("Ключ", max_length=255)
+    fingerprint = models.CharField("Отпечаток запроса", max_length=64)
+    status_code = models.PositiveSmallIntegerField("HTTP-статус", null=True)
+    body = models.JSONField("Тело ответа", null=True)
+    created_at = models.DateTimeField("Создан", auto_now_add=True)
+    expires_at = models.DateTimeField("Истекает", db_index=True)
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="uniq_idempotency_user_key")
+        ]
+
+
+# --- Роллапы продаж (см. orders.rollups): отчеты ресторана читают только их ---
+
+# Заказ попал в выручку: оплачен и дальше по цепочке (отмена после оплаты — отдельно, как возврат)
+PAID_STATUSES = (
+    OrderStatus.PAID,
+    OrderStatus.RESTAURANT_CONFIRMED,
+    OrderStatus.READY_FOR_PICKUP,
+    OrderStatus.ACCEPTED,
+    OrderStatus.IN_TRANSIT,
+    OrderStatus.DELIVERED,
+)
+
+
+class RestaurantDailySales(models.Model):
+    """Продажи ресторана за день (день — дата создания заказа)."""
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="+", verbose_name="Ресторан"
+    )
+    day = models.DateField("День")
+    orders_count = models.PositiveIntegerField("Оплаченных заказов", default=0)
+    revenue = models.DecimalField(
+        "Выручка", max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    delivered_count = models.PositiveIntegerField("Доставлено", default=0)
+    canceled_count = models.PositiveIntegerField("Отменено после оплаты", default=0)
+    refunded = models.DecimalField(
+        "Возвраты", max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    updated_at = models.DateTimeField("Обновлен", auto_now=True)
+
+    class Meta:
+        verbose_name = "Продажи ресторана за день"
+        verbose_name_plural = "Продажи ресторанов по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "day"], name="uniq_daily_sales_restaurant_day"
+            )
+        ]
+
+
+class RestaurantDailyDishSales(models.Model):
+    """
+    Продажи блюда за день. dish_id без FK: блюдо могут удалить, а отчет за прошлое должен остаться.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="+", verbose_name="Ресторан"
+    )
+    day = models.DateField("День")
+    dish_id = models.BigIntegerField("Блюдо (id)")
+    dish_name = models.CharField("Блюдо (название)", max_length=255)
+    qty = models.PositiveIntegerField("Продано, шт.", default=0)
+    revenue = models.DecimalField(
+        "Выручка", max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+
+    class Meta:
+        verbose_name = "Продажи блюда за день"
+        verbose_name_plural = "Продажи блюд по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "day", "dish_id"], name="uniq_daily_dish_sales"
+            ),
+        ]
+
+
+class SalesRollupMark(models.Model):
+    """
+    Какие события заказа уже учтены в роллапах: повторная доставка события ничего не задваивает.
+    """
+
+    order_id = models.BigIntegerField("Заказ (id)")
+    kind = models.CharField("Событие", max_length=32, choices=OrderStatus.choices)
+
+    class Meta:
+        verbose_name = "Учтенное событие продаж"
+        verbose_name_plural = "Учтенные события продаж"
+        constraints = [
+            models.UniqueConstraint(fields=["order_id", "kind"], name="uniq_sales_mark_order_kind")
+        ]
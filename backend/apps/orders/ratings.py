@@ -0,0 +1,102 @@
+"""
+Денормализованные агрегаты оценок: Restaurant.rating_count/rating_sum и
+User.courier_rating_count/courier_rating_sum.
+
+Создали Rating — тем же соединением (в транзакции вызывающего, если она есть) прибавляем
+F()-апдейтом: конкурентные оценки не теряются, AVG по Rating при показе не нужен. Кого касается
+оценка — RATING_TARGETS. Тайлы гео-выдачи (в них rating/rating_count) оценка не сбрасывает: сброс —
+это смена версий сотен тайлов на каждую оценку, а средняя за GEO_CACHE_TTL заметно не уедет.
+Удаление оценок счетчики не трогает: архивация переносит Rating в ArchivedRating, а средняя от этого
+не меняется. Сверка с фактическими оценками (рабочими и архивными) — manage.py reconcile_ratings.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.restaurants.models import Restaurant
+from .models import ArchivedRating, Rating, RatingFromRole
+
+# Клиент оценивает заказ целиком — и ресторан, и курьера; ресторан — курьера на выдаче.
+# Оценки от курьера (про клиента) не агрегируем
+RATING_TARGETS = {
+    RatingFromRole.CLIENT: ("restaurant", "courier"),
+    RatingFromRole.RESTAURANT: ("courier",),
+}
+
+
+@receiver(post_save, sender=Rating)
+def _on_rating_created(sender, instance: Rating, created: bool, raw: bool = False, **kwargs):
+    if not created or raw:
+        return
+    targets = RATING_TARGETS.get(instance.from_role, ())
+    if not targets:
+        return
+    order = instance.order
+    if "restaurant" in targets:
+        Restaurant.objects.filter(pk=order.restaurant_id).update(
+            rating_count=F("rating_count") + 1, rating_sum=F("rating_sum") + instance.stars
+        )
+    if "courier" in targets and order.courier_id:
+        get_user_model().objects.filter(pk=order.courier_id).update(
+            courier_rating_count=F("courier_rating_count") + 1,
+            courier_rating_sum=F("courier_rating_sum") + instance.stars,
+        )
+
+
+def _actual(target: str) -> Dict[int, Tuple[int, int]]:
+    """
+    Фактические (число, сумма) оценок по ресторанам или курьерам — из рабочих и архивных таблиц.
+    """
+    roles = [role for role, targets in RATING_TARGETS.items() if target in targets]
+    key = f"order__{target}_id"
+    acc: Dict[int, list] = defaultdict(lambda: [0, 0])
+    for model in (Rating, ArchivedRating):
+        rows = (
+            model.objects.filter(from_role__in=roles, **{f"{key}__isnull": False})
+            .values(key)
+            .annotate(n=Count("id"), total=Sum("stars"))
+        )
+        for row in rows:
+            acc[row[key]][0] += row["n"]
+            acc[row[key]][1] += row["total"] or 0
+    return {pk: (n, total) for pk, (n, total) in acc.items()}
+
+
+def reconcile_ratings(batch_size: int = 1000) -> Dict[str, int]:
+    """Пересчитать счетчики по фактическим оценкам. Возвращает, сколько строк поправлено."""
+    User = get_user_model()
+    fixed = {}
+    for target, model, count_field, sum_field in (
+        ("restaurant", Restaurant, "rating_count", "rating_sum"),
+        ("courier", User, "courier_rating_count", "courier_rating_sum"),
+    ):
+        actual = _actual(target)
+        changed = []
+        last_pk = 0
+        while True:
+            # По pk пачками: таблицы могут быть большими, держим в памяти только пачку
+            rows = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", count_field, sum_field)[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            for obj in rows:
+                n, total = actual.get(obj.pk, (0, 0))
+                if (getattr(obj, count_field), getattr(obj, sum_field)) != (n, total):
+                    setattr(obj, count_field, n)
+                    setattr(obj, sum_field, total)
+                    changed.append(obj)
+        with transaction.atomic():
+            model.objects.bulk_update(changed, [count_field, sum_field], batch_size=batch_size)
+        fixed[target] = len(changed)
+    return fixed
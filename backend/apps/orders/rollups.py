@@ -0,0 +1,237 @@
+"""
+Роллапы продаж ресторанов по дням: RestaurantDailySales (заказы, выручка, доставки, отмены после
+оплаты) и RestaurantDailyDishSales (штуки и выручка по блюдам). Отчет владельца читает только их —
+O(дней), а не O(заказов).
+
+День — дата создания заказа (TIME_ZONE): так инкрементальное обновление и бэкфилл считают одно и то
+же. Инкремент — по сигналу order_status_changed, после коммита, задачей tasks.update_sales_rollup:
+    -> paid       +1 заказ, +выручка, +позиции по блюдам
+    -> delivered  +1 доставка
+    -> canceled   +1 отмена и +возврат, если заказ к этому времени уже был в выручке
+Задачи могут прийти не по порядку: отмена оплаченного заказа раньше, чем учтена оплата, — тогда
+apply_order_event бросает PaidEventPending, и задача повторяется позже. Отмену из неоплаченных
+статусов не ставим вовсе.
+Каждое событие заказа учитывается один раз: метка SalesRollupMark(order_id, kind) пишется в той же
+транзакции, что и инкременты, — ретрай задачи или повтор сигнала ничего не задвоит. Разошлось
+(воркер упал между коммитом статуса и задачей, правили руками) — manage.py backfill_sales_rollups.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    PAID_STATUSES,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    Order,
+    OrderItem,
+    OrderStatus,
+    RestaurantDailyDishSales,
+    RestaurantDailySales,
+    SalesRollupMark,
+)
+from .signals import order_status_changed
+
+ROLLUP_EVENTS = (OrderStatus.PAID, OrderStatus.DELIVERED, OrderStatus.CANCELED)
+_ZERO = Decimal("0.00")
+_LINE_TOTAL = models.ExpressionWrapper(
+    F("qty") * F("price_each"), output_field=models.DecimalField(max_digits=14, decimal_places=2)
+)
+
+
+class PaidEventPending(Exception):
+    """Отмена пришла раньше, чем в роллапах учтена оплата, — задаче пора повторить позже."""
+
+
+def sales_day(dt) -> date:
+    return timezone.localtime(dt).date()
+
+
+@receiver(order_status_changed, sender=Order)
+def _on_status_changed(sender, order, to_state, from_states=(), **kwargs):
+    if to_state not in ROLLUP_EVENTS:
+        return
+    if to_state == OrderStatus.CANCELED and not set(from_states) & set(PAID_STATUSES):
+        # Отменили из неоплаченных статусов — в выручке заказа не было
+        return
+    from .tasks import update_sales_rollup
+
+    # После коммита: воркер не должен прочитать заказ раньше, чем смена статуса станет видна
+    order_id = order.id
+    transaction.on_commit(lambda: update_sales_rollup.delay(order_id, to_state))
+
+
+def apply_order_event(order_id: int, kind: str, wait_for_paid: bool = False) -> bool:
+    """
+    Учесть событие заказа в роллапах. False — уже учтено или учитывать нечего. wait_for_paid — у
+    отмены без учтенной оплаты бросить PaidEventPending (оплата еще может прийти), а не считать ее
+    отменой до оплаты.
+    """
+    with transaction.atomic():
+        order = (
+            Order.objects.filter(pk=order_id).values("restaurant_id", "created_at", "total").first()
+        )
+        if order is None:
+            return False
+        if kind == OrderStatus.CANCELED and not SalesRollupMark.objects.filter(
+            order_id=order_id, kind=OrderStatus.PAID
+        ).exists():
+            if wait_for_paid:
+                raise PaidEventPending(order_id)
+            # Отмена до оплаты — в выручке ее не было
+            return False
+        try:
+            with transaction.atomic():
+                SalesRollupMark.objects.create(order_id=order_id, kind=kind)
+        except IntegrityError:
+            return False
+
+        keys = {"restaurant_id": order["restaurant_id"], "day": sales_day(order["created_at"])}
+        if kind == OrderStatus.PAID:
+            _bump(RestaurantDailySales, keys, orders_count=1, revenue=order["total"])
+            lines = (
+                OrderItem.objects.filter(order_id=order_id)
+                .values("dish_id")
+                .annotate(n=Sum("qty"), amount=Sum(_LINE_TOTAL), name=Max("dish__name"))
+            )
+            for line in lines:
+                _bump(
+                    RestaurantDailyDishSales,
+                    dict(keys, dish_id=line["dish_id"]),
+                    set_values={"dish_name": line["name"]},
+                    qty=line["n"],
+                    revenue=line["amount"],
+                )
+        elif kind == OrderStatus.DELIVERED:
+            _bump(RestaurantDailySales, keys, delivered_count=1)
+        elif kind == OrderStatus.CANCELED:
+            _bump(RestaurantDailySales, keys, canceled_count=1, refunded=order["total"])
+        return True
+
+
+def _bump(model, keys: dict, set_values: Optional[dict] = None, **deltas) -> None:
+    """
+    UPDATE ... SET f = f + delta; строки нет — INSERT; проиграли гонку за INSERT — снова UPDATE.
+    """
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    updates.update(set_values or {})
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **(set_values or {}), **deltas)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**updates)
+
+
+def _counted(prefix: str = "") -> Q:
+    """Заказ в выручке: оплачен и дальше или отменен после оплаты (есть метка paid)."""
+    paid_marks = SalesRollupMark.objects.filter(kind=OrderStatus.PAID).values("order_id")
+    return Q(**{f"{prefix}status__in": PAID_STATUSES}) | Q(
+        **{f"{prefix}status": OrderStatus.CANCELED, f"{prefix}id__in": paid_marks}
+    )
+
+
+def rebuild_sales_rollups(day_from: date, day_to: date, restaurant_id: Optional[int] = None) -> int:
+    """
+    Пересчитать роллапы за [day_from, day_to] по заказам (рабочим и архивным) и дописать недостающие
+    метки. Одна транзакция на вызов — диапазон дробит management-команда. Возвращает число
+    дней-строк.
+    """
+    in_range = {"created_at__date__gte": day_from, "created_at__date__lte": day_to}
+    if restaurant_id is not None:
+        in_range["restaurant_id"] = restaurant_id
+    item_range = {f"order__{k}": v for k, v in in_range.items()}
+    canceled = Q(status=OrderStatus.CANCELED)
+
+    daily: Dict[Tuple[int, date], dict] = defaultdict(
+        lambda: {
+            "orders_count": 0,
+            "revenue": _ZERO,
+            "delivered_count": 0,
+            "canceled_count": 0,
+            "refunded": _ZERO,
+        }
+    )
+    dishes: Dict[Tuple[int, date, int], dict] = defaultdict(
+        lambda: {"qty": 0, "revenue": _ZERO, "dish_name": ""}
+    )
+
+    with transaction.atomic():
+        for model, item_model, dish_name in (
+            (Order, OrderItem, "dish__name"),
+            (ArchivedOrder, ArchivedOrderItem, "dish_name"),
+        ):
+            orders = model.objects.filter(_counted(), **in_range)
+            rows = (
+                orders.annotate(day=TruncDate("created_at"))
+                .values("restaurant_id", "day")
+                .annotate(
+                    n=Count("id"),
+                    amount=Sum("total"),
+                    delivered=Count("id", filter=Q(status=OrderStatus.DELIVERED)),
+                    canceled=Count("id", filter=canceled),
+                    refunded=Sum("total", filter=canceled),
+                )
+            )
+            for row in rows:
+                acc = daily[(row["restaurant_id"], row["day"])]
+                acc["orders_count"] += row["n"]
+                acc["revenue"] += row["amount"] or _ZERO
+                acc["delivered_count"] += row["delivered"]
+                acc["canceled_count"] += row["canceled"]
+                acc["refunded"] += row["refunded"] or _ZERO
+
+            lines = (
+                item_model.objects.filter(_counted("order__"), dish_id__isnull=False, **item_range)
+                .annotate(day=TruncDate("order__created_at"))
+                .values("order__restaurant_id", "day", "dish_id")
+                .annotate(n=Sum("qty"), amount=Sum(_LINE_TOTAL), name=Max(dish_name))
+            )
+            for line in lines:
+                acc = dishes[(line["order__restaurant_id"], line["day"], line["dish_id"])]
+                acc["qty"] += line["n"]
+                acc["revenue"] += line["amount"] or _ZERO
+                acc["dish_name"] = acc["dish_name"] or line["name"]
+
+            _mark(orders, OrderStatus.PAID)
+            _mark(orders.filter(status=OrderStatus.DELIVERED), OrderStatus.DELIVERED)
+            _mark(orders.filter(canceled), OrderStatus.CANCELED)
+
+        scope = {"day__gte": day_from, "day__lte": day_to}
+        if restaurant_id is not None:
+            scope["restaurant_id"] = restaurant_id
+        RestaurantDailySales.objects.filter(**scope).delete()
+        RestaurantDailyDishSales.objects.filter(**scope).delete()
+        RestaurantDailySales.objects.bulk_create(
+            [RestaurantDailySales(restaurant_id=r, day=d, **acc) for (r, d), acc in daily.items()],
+            batch_size=1000,
+        )
+        RestaurantDailyDishSales.objects.bulk_create(
+            [
+                RestaurantDailyDishSales(restaurant_id=r, day=d, dish_id=dish, **acc)
+                for (r, d, dish), acc in dishes.items()
+            ],
+            batch_size=1000,
+        )
+    return len(daily)
+
+
+def _mark(orders, kind: str) -> None:
+    SalesRollupMark.objects.bulk_create(
+        [
+            SalesRollupMark(order_id=pk, kind=kind)
+            for pk in orders.values_list("id", flat=True).iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
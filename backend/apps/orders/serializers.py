@@ -3,10 +3,11 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import List
 
+from django.db import transaction
 from rest_framework import serializers
 
 from apps.restaurants.models import Dish, Restaurant
-from .models import Order, OrderItem, OrderStatus
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus
 
 
 class OrderItemCreateSerializer(serializers.Serializer):
@@ -38,27 +39,47 @@ class OrderCreateSerializer(serializers.Serializer):
         attrs["dishes_map"] = dishes
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
+        """
+        Сумму считаем в памяти по уже загруженным блюдам и пишем заказ сразу с ней: INSERT заказа +
+        один bulk INSERT позиций, без перечитывания позиций и UPDATE суммы. Созданные позиции
+        запоминаем — to_representation отдаст их (и dish.name) через OrderSerializer без запросов в
+        БД.
+        """
         request = self.context["request"]
         user = request.user
         restaurant = validated_data["restaurant"]
         dishes_map: dict[int, Dish] = validated_data["dishes_map"]
         items: List[dict] = validated_data["items"]
 
+        lines = []
+        for it in items:
+            dish = dishes_map[it["dish_id"]]
+            lines.append((dish, int(it["qty"]) or 1))
+        total = sum((dish.price * qty for dish, qty in lines), start=Decimal("0.00"))
+
         order = Order.objects.create(
             client=user,
             restaurant=restaurant,
             status=OrderStatus.CREATED,
+            total=total,
         )
-        bulk_items = []
-        for it in items:
-            dish = dishes_map[it["dish_id"]]
-            qty = int(it["qty"]) or 1
-            bulk_items.append(OrderItem(order=order, dish=dish, qty=qty, price_each=dish.price))
+        bulk_items = [
+            OrderItem(order=order, dish=dish, qty=qty, price_each=dish.price) for dish, qty in lines
+        ]
         OrderItem.objects.bulk_create(bulk_items)
-        order.recalc_total()
+        self.created_items = bulk_items
         return order
 
+    def to_representation(self, instance):
+        # Ответ — в форме OrderSerializer, позиции — только что созданные, без перечитывания
+        context = {
+            **self.context,
+            "order_items": {instance.pk: getattr(self, "created_items", None)},
+        }
+        return OrderSerializer(instance, context=context).data
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     dish_name = serializers.CharField(source="dish.name", read_only=True)
@@ -68,8 +89,18 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ("id", "dish", "dish_name", "qty", "price_each")
 
 
+class OrderItemListSerializer(serializers.ListSerializer):
+    """
+    Позиции заказа; уже загруженные (context["order_items"][order.pk]) отдаем без запроса в БД.
+    """
+
+    def get_attribute(self, instance):
+        known = self.context.get("order_items", {}).get(instance.pk)
+        return known if known is not None else super().get_attribute(instance)
+
+
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = OrderItemListSerializer(child=OrderItemSerializer(), read_only=True)
 
     class Meta:
         model = Order
@@ -90,3 +121,27 @@ class OrderSerializer(serializers.ModelSerializer):
 
 class OrderStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=OrderStatus.choices)
+
+
+class OrderBulkStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=200
+    )
+    status = serializers.ChoiceField(choices=OrderStatus.choices)
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ("id", "dish", "dish_name", "qty", "price_each")
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """Та же форма, что у OrderSerializer: клиенту все равно, из какой таблицы пришел заказ."""
+
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields
+        read_only_fields = fields
@@ -0,0 +1,144 @@
+"""
+Переходы статусов заказа: compare-and-swap одним условным UPDATE.
+
+    UPDATE orders_order SET status = :to, updated_at = now() [, ...]
+    WHERE id = :id AND status IN (:from...) [AND доп. условия] RETURNING ...
+
+Конкурентные смены статуса не затирают друг друга: выигрывает тот, чей UPDATE нашел строку в
+ожидаемом статусе, остальные получают None. Там, где БД умеет UPDATE ... RETURNING
+(Postgres, SQLite >= 3.35), новая строка приходит тем же запросом; иначе — UPDATE и отдельные SELECT
+до и после.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.db import connections, router, transaction
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from .models import ORDER_TRANSITIONS, Order
+from .signals import order_status_changed
+
+
+class InvalidTransition(ValueError):
+    """Переход не описан в ORDER_TRANSITIONS — ошибка в вызывающем коде, а не гонка."""
+
+
+def sources_of(to_state: str) -> Set[str]:
+    """Из каких статусов можно попасть в to_state."""
+    return {src for src, targets in ORDER_TRANSITIONS.items() if to_state in targets}
+
+
+def can_transition(from_state: str, to_state: str) -> bool:
+    return to_state in ORDER_TRANSITIONS.get(from_state, ())
+
+
+def transition(
+    order_id: int,
+    from_states: Iterable[str],
+    to_state: str,
+    actor=None,
+    extra: Optional[Dict[str, Any]] = None,
+    **guards,
+) -> Optional[Order]:
+    """
+    Перевести заказ из любого из from_states в to_state. extra — что еще записать тем же UPDATE
+    (courier_id, stripe_payment_intent_id), guards — дополнительные условия фильтра в нотации ORM
+    (courier__isnull=True, restaurant__owner_id=...). Возвращает заказ с новой строкой или None,
+    если заказа нет, он уже в другом статусе или не прошел guards.
+    """
+    from_states = list(from_states)
+    illegal = [s for s in from_states if not can_transition(s, to_state)]
+    if illegal or not from_states:
+        raise InvalidTransition(f"Недопустимый переход {illegal or from_states} -> {to_state}")
+
+    updated = _apply(
+        Order.objects.filter(pk=order_id, status__in=from_states, **guards), to_state, extra
+    )
+    order = updated[0] if updated else None
+    if order is not None:
+        order_status_changed.send(
+            sender=Order, order=order, from_states=from_states, to_state=to_state, actor=actor
+        )
+    return order
+
+
+def transition_many(
+    order_ids: Iterable[int],
+    from_state: str,
+    to_state: str,
+    actor=None,
+    extra: Optional[Dict[str, Any]] = None,
+    **guards,
+) -> List[Order]:
+    """
+    Пакетный вариант transition для заказов в одном исходном статусе: один UPDATE на всю пачку.
+    Возвращает заказы, которые реально перешли (остальных уже кто-то перевел или они не прошли
+    guards).
+    """
+    if not can_transition(from_state, to_state):
+        raise InvalidTransition(f"Недопустимый переход {from_state} -> {to_state}")
+    ids = list(order_ids)
+    if not ids:
+        return []
+    orders = _apply(Order.objects.filter(pk__in=ids, status=from_state, **guards), to_state, extra)
+    for order in orders:
+        order_status_changed.send(
+            sender=Order, order=order, from_states=[from_state], to_state=to_state, actor=actor
+        )
+    return orders
+
+
+def _apply(qs, to_state: str, extra: Optional[Dict[str, Any]]) -> List[Order]:
+    values = {"status": to_state, "updated_at": timezone.now(), **(extra or {})}
+    using = router.db_for_write(Order)
+    if _can_update_returning(connections[using]):
+        return _update_returning(qs, values, using)
+    # Без RETURNING: запоминаем кандидатов, обновляем и перечитываем тех, кто теперь в to_state
+    ids = list(qs.values_list("pk", flat=True))
+    if not ids or not qs.filter(pk__in=ids).update(**values):
+        return []
+    return list(
+        Order.objects.using(using).filter(
+            pk__in=ids, status=to_state, updated_at=values["updated_at"]
+        )
+    )
+
+
+def _can_update_returning(connection) -> bool:
+    # На SQLite RETURNING появился в 3.35 — ровно с той же версии Django включает этот флаг
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and connection.features.can_return_columns_from_insert
+
+
+def _update_returning(qs, values: Dict[str, Any], using: str) -> List[Order]:
+    # Собираем UPDATE теми же средствами, что и QuerySet.update(), и дописываем RETURNING
+    query = qs.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    compiler = query.get_compiler(using)
+    compiler.pre_sql_setup()
+    sql, params = compiler.as_sql()
+    connection = connections[using]
+    fields = list(Order._meta.concrete_fields)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    with transaction.mark_for_rollback_on_error(using=using), connection.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {columns}", params)
+        rows = cursor.fetchall()
+    # Те же конвертеры, что применяет компилятор при обычной выборке (даты/Decimal в SQLite и т.п.)
+    cols = [field.get_col(Order._meta.db_table) for field in fields]
+    converters = [
+        connection.ops.get_db_converters(col) + col.get_db_converters(connection) for col in cols
+    ]
+    attnames = [f.attname for f in fields]
+    orders = []
+    for row in rows:
+        values = []
+        for value, col, funcs in zip(row, cols, converters):
+            for converter in funcs:
+                value = converter(value, col, connection)
+            values.append(value)
+        orders.append(Order.from_db(using, attnames, values))
+    return orders
@@ -0,0 +1,10 @@
+"""
+Сигналы заказов. order_status_changed шлет orders.services.transition после успешного перехода:
+    sender=Order, order=<Order с новой строкой>, from_states=<допустимые исходные>, to_state=<новый
+    статус>, actor=<User|None>
+"""
+from __future__ import annotations
+
+from django.dispatch import Signal
+
+order_status_changed = Signal()
@@ -1,15 +1,80 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from celery import shared_task
+from django.conf import settings
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
 
+def order_group(order_id: int) -> str:
+    return f"order_{order_id}"
+
+
+def restaurant_group(restaurant_id: int) -> str:
+    """Группа ленты входящих заказов ресторана (см. RestaurantOrdersConsumer)."""
+    return f"restaurant_{restaurant_id}"
+
+
 @shared_task
-def broadcast_order_event(order_id: int, payload: dict) -> None:
-    """Кидаем событие в WS-группу заказа. Лаконично, по-девелоперски."""
+def broadcast_order_event(
+    order_id: int, payload: dict, restaurant_id: Optional[int] = None
+) -> None:
+    """Кидаем событие в WS-группу заказа. Лаконично, по-девелоперски.
+    С restaurant_id — дублируем в ленту ресторана."""
     channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"order_{order_id}",
-        {"type": "order.event", "data": payload},
-    )
+    async_to_sync(_send)(channel_layer, [(order_id, payload, restaurant_id)])
+
+
+@shared_task
+def broadcast_order_events(events: list) -> None:
+    """
+    Пачка событий [(order_id, payload[, restaurant_id]), ...] — одна задача вместо задачи на каждый
+    заказ.
+    """
+    channel_layer = get_channel_layer()
+    async_to_sync(_send)(channel_layer, events)
+
+
+async def _send(channel_layer, events) -> None:
+    for order_id, payload, *rest in events:
+        message = {"type": "order.event", "data": payload}
+        await channel_layer.group_send(order_group(order_id), message)
+        if rest and rest[0] is not None:
+            await channel_layer.group_send(restaurant_group(rest[0]), message)
+
+
+@shared_task
+def purge_idempotency_keys() -> int:
+    """Чистим истекшие ключи идемпотентности (в кэше они истекают сами)."""
+    from django.utils import timezone
+    from .models import IdempotencyKey
+
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+@shared_task
+def archive_finished_orders() -> int:
+    """Beat: переносим старые завершенные заказы в архив (настройки — ORDER_ARCHIVE_*)."""
+    from .archive import archive_finished_orders as run
+
+    return run(max_batches=getattr(settings, "ORDER_ARCHIVE_MAX_BATCHES", None))
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def update_sales_rollup(self, order_id: int, kind: str) -> bool:
+    """
+    Учесть смену статуса заказа в дневных роллапах продаж (идемпотентно, см. orders.rollups).
+    Отмена обогнала оплату — повторяем через default_retry_delay; на последней попытке оплаты так и
+    не было — это отмена до оплаты.
+    """
+    from .rollups import PaidEventPending, apply_order_event
+
+    try:
+        return apply_order_event(
+            order_id, kind, wait_for_paid=self.request.retries < self.max_retries
+        )
+    except PaidEventPending as exc:
+        raise self.retry(exc=exc)
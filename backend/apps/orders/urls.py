@@ -1,11 +1,22 @@
 from __future__ import annotations
 
 from django.urls import path
-from .views import create_order, update_order_status, list_my_orders, get_order_detail
+from .views import (
+    bulk_update_order_status,
+    create_order,
+    get_order_detail,
+    list_my_orders,
+    restaurant_orders_feed,
+    restaurant_sales,
+    update_order_status,
+)
 
 urlpatterns = [
     path("orders", create_order, name="orders-create"),
     path("orders/mine", list_my_orders, name="orders-list"),
+    path("orders/incoming", restaurant_orders_feed, name="orders-incoming"),
+    path("orders/status/bulk", bulk_update_order_status, name="orders-status-bulk"),
     path("orders/<int:id>", get_order_detail, name="orders-detail"),
     path("orders/<int:id>/status", update_order_status, name="orders-status"),
+    path("restaurants/<int:id>/sales", restaurant_sales, name="restaurants-sales"),
 ]
@@ -1,37 +1,82 @@
 from __future__ import annotations
 
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import status
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db.models import Max, Prefetch, Sum, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
+from apps.restaurants.models import Restaurant
 from apps.users.models import UserRole
-from .models import Order, OrderStatus
+from foodradar.pagination import (
+    InvalidCursor,
+    bounded_count,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    page_size_from,
+)
+from .idempotency import idempotent
+from .models import (
+    ArchivedOrder,
+    Order,
+    OrderItem,
+    OrderStatus,
+    RestaurantDailyDishSales,
+    RestaurantDailySales,
+)
 from .serializers import (
+    ArchivedOrderSerializer,
+    OrderBulkStatusSerializer,
     OrderCreateSerializer,
     OrderSerializer,
     OrderStatusUpdateSerializer,
 )
-from .tasks import broadcast_order_event
+from .services import can_transition, sources_of, transition, transition_many
+from .tasks import broadcast_order_event, broadcast_order_events
+
+# Потолок для ?count=1 в истории заказов: дальше клиенту достаточно «1000+»
+ORDER_COUNT_CAP = 1000
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request: Request):
     """
     Создание заказа (корзина). Вход: restaurant_id, items:[{dish_id, qty}].
+    Поддерживает заголовок Idempotency-Key: ретрай с тем же ключом вернет тот же заказ, а не создаст
+    новый.
     """
     serializer = OrderCreateSerializer(data=request.data, context={"request": request})
     serializer.is_valid(raise_exception=True)
     order = serializer.save()
-    data = OrderSerializer(order).data
+    data = serializer.data
     # Расшарим событие для подписчиков, что заказ создан
-    broadcast_order_event.delay(order.id, {"type": "created", "order": data})
+    broadcast_order_event.delay(order.id, {"type": "created", "order": data}, order.restaurant_id)
     return Response(data, status=status.HTTP_201_CREATED)
 
 
+# Кто какие статусы ставит и когда заказ считается «своим»: роль -> (цели, поле владельца)
+_ROLE_TARGETS = {
+    UserRole.RESTAURANT: (
+        {OrderStatus.RESTAURANT_CONFIRMED, OrderStatus.READY_FOR_PICKUP, OrderStatus.CANCELED},
+        "restaurant__owner_id",
+    ),
+    UserRole.COURIER: ({OrderStatus.IN_TRANSIT, OrderStatus.DELIVERED}, "courier_id"),
+    UserRole.CLIENT: ({OrderStatus.CANCELED}, "client_id"),
+}
+# Клиент отменяет только неоплаченный заказ
+_CLIENT_CANCEL_FROM = {OrderStatus.CREATED, OrderStatus.PENDING_PAYMENT}
+
+
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated])
 def update_order_status(request: Request, id: int):  # noqa: A002
@@ -40,78 +85,253 @@ def update_order_status(request: Request, id: int):  # noqa: A002
     - Ресторан (владелец ресторана): restaurant_confirmed, ready_for_pickup, canceled
     - Курьер (назначен на заказ): in_transit, delivered
     - Клиент (создатель): canceled (пока заказ не оплачен)
+    Сам переход — один условный UPDATE (см. services.transition); права проверяются в его WHERE.
+    Если заказ в это время уже перевели в другой статус или переход не по таблице — 409.
     """
-    order = get_object_or_404(Order, pk=id)
     serializer = OrderStatusUpdateSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     new_status: str = serializer.validated_data["status"]
 
     user = request.user
-    role = getattr(user, "role", None)
-
-    allowed = False
-    if role == UserRole.RESTAURANT and order.restaurant.owner_id == user.id:
-        allowed = new_status in {
-            OrderStatus.RESTAURANT_CONFIRMED,
-            OrderStatus.READY_FOR_PICKUP,
-            OrderStatus.CANCELED,
-        }
-    elif role == UserRole.COURIER and order.courier_id == user.id:
-        allowed = new_status in {
-            OrderStatus.IN_TRANSIT,
-            OrderStatus.DELIVERED,
-        }
-    elif role == UserRole.CLIENT and order.client_id == user.id:
-        if order.status in {OrderStatus.CREATED, OrderStatus.PENDING_PAYMENT}:
-            allowed = new_status == OrderStatus.CANCELED
-
-    if not allowed:
+    targets, owner_field = _ROLE_TARGETS.get(getattr(user, "role", None), (set(), None))
+    if new_status not in targets:
         return Response({"detail": "Недостаточно прав или недопустимый переход статуса."}, status=status.HTTP_403_FORBIDDEN)
+    from_states = sources_of(new_status)
+    if user.role == UserRole.CLIENT:
+        from_states &= _CLIENT_CANCEL_FROM
+
+    order = transition(id, from_states, new_status, actor=user, **{owner_field: user.id})
+    if order is None:
+        # Не получилось — разбираемся одним запросом: нет заказа, чужой или статус уже другой
+        current = Order.objects.filter(pk=id).values("status", owner_field).first()
+        if current is None:
+            return Response({"detail": "Заказ не найден."}, status=status.HTTP_404_NOT_FOUND)
+        if current[owner_field] != user.id:
+            return Response(
+                {"detail": "Недостаточно прав или недопустимый переход статуса."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(
+            {
+                "detail": f"Переход {current['status']} -> {new_status} недопустим.",
+                "status": current["status"],
+            },
+            status=status.HTTP_409_CONFLICT,
+        )
 
-    order.status = new_status
-    order.save(update_fields=["status", "updated_at"])
     payload = {"type": "status", "order_id": order.id, "status": order.status}
-    broadcast_order_event.delay(order.id, payload)
+    broadcast_order_event.delay(order.id, payload, order.restaurant_id)
+    prefetch_related_objects(
+        [order], Prefetch("items", queryset=OrderItem.objects.select_related("dish"))
+    )
     return Response(OrderSerializer(order).data)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request: Request):
+    """
+    Пакетная смена статуса для кухни ресторана: {"order_ids": [...], "status": "ready_for_pickup"}.
+    Права и текущие статусы — одним запросом, сам переход — один CAS-UPDATE на каждый исходный
+    статус, WS-события — одной задачей. В ответе исход по каждому заказу: updated | not_found |
+    forbidden | conflict (заказ в статусе, из которого так нельзя, или его перехватили).
+    """
+    serializer = OrderBulkStatusSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    new_status: str = serializer.validated_data["status"]
+    order_ids = list(dict.fromkeys(serializer.validated_data["order_ids"]))
+
+    user = request.user
+    targets, owner_field = _ROLE_TARGETS[UserRole.RESTAURANT]
+    if getattr(user, "role", None) != UserRole.RESTAURANT or new_status not in targets:
+        return Response(
+            {"detail": "Недостаточно прав или недопустимый переход статуса."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    outcomes = {pk: {"order_id": pk, "result": "not_found", "status": None} for pk in order_ids}
+    by_source: dict[str, list[int]] = {}
+    for pk, current, owner_id in Order.objects.filter(pk__in=order_ids).values_list(
+        "id", "status", owner_field
+    ):
+        outcomes[pk].update(
+            status=current, result="forbidden" if owner_id != user.id else "conflict"
+        )
+        if owner_id == user.id and can_transition(current, new_status):
+            by_source.setdefault(current, []).append(pk)
+
+    events = []
+    for source, ids in by_source.items():
+        for order in transition_many(ids, source, new_status, actor=user, **{owner_field: user.id}):
+            outcomes[order.id].update(status=order.status, result="updated")
+            events.append(
+                (
+                    order.id,
+                    {"type": "status", "order_id": order.id, "status": order.status},
+                    order.restaurant_id,
+                )
+            )
+    if events:
+        broadcast_order_events.delay(events)
+
+    results = [outcomes[pk] for pk in order_ids]
+    return Response({"updated": len(events), "results": results})
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_my_orders(request: Request):
-    """Список заказов текущего пользователя (клиента). Поддерживает фильтр по статусу и простую пагинацию."""
+    """
+    История заказов текущего пользователя (клиента), новые сверху. Фильтр по статусу: ?status=paid
+    Пагинация keyset по (created_at, id): page_size, cursor — токен из поля next прошлой страницы.
+    Любая страница стоит как первая: seek по индексу + LIMIT, позиции и блюда — одним prefetch на
+    страницу. ?count=1 — добавить count (не больше ORDER_COUNT_CAP, дальше count_exact=false) вместо
+    полного COUNT(*). Архивные заказы (см. archive.py) идут в той же ленте, тем же курсором.
+    """
     user = request.user
-    qs = Order.objects.filter(client_id=user.id).order_by("-created_at")
+    qs = Order.objects.filter(client_id=user.id)
+    archived = ArchivedOrder.objects.filter(client_id=user.id)
     status_filter = request.query_params.get("status")
     if status_filter:
         qs = qs.filter(status=status_filter)
+        archived = archived.filter(status=status_filter)
+
+    size = page_size_from(request.query_params.get("page_size"))
+    try:
+        after = _order_cursor(request.query_params.get("cursor"))
+    except InvalidCursor:
+        return Response({"detail": "Некорректный cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Два keyset-потока с одним курсором — рабочая таблица и архив — сливаем по (created_at, id)
+    rows = list(_history_page(qs, after, size + 1)) + list(
+        _archived_page(archived, after, size + 1)
+    )
+    rows.sort(key=lambda o: (o.created_at, o.id), reverse=True)
+    del rows[size + 1:]
+    next_cursor = None
+    if len(rows) > size:
+        last = rows[size - 1]
+        next_cursor = encode_cursor({"t": last.created_at.isoformat(), "id": last.id})
+    payload = {"results": [_serialize_order(o) for o in rows[:size]], "next": next_cursor}
+    if request.query_params.get("count") in {"1", "true"}:
+        hot, hot_exact = bounded_count(qs, ORDER_COUNT_CAP)
+        cold, cold_exact = bounded_count(archived, ORDER_COUNT_CAP)
+        payload["count"] = min(hot + cold, ORDER_COUNT_CAP)
+        payload["count_exact"] = hot_exact and cold_exact and hot + cold <= ORDER_COUNT_CAP
+    return Response(payload)
+
+
+def _history_page(qs, after, limit: int):
+    qs = keyset_filter(qs, ("created_at", "id"), after, descending=True)
+    return qs.prefetch_related("items__dish")[:limit]
+
 
-    # Простая пагинация без тяжелых зависимостей
-    def _to_int(v: str | None, d: int, lo: int, hi: int) -> int:
-        try:
-            x = int(v) if v is not None else d
-        except Exception:
-            x = d
-        return max(lo, min(hi, x))
-
-    page = _to_int(request.query_params.get("page"), 1, 1, 10_000)
-    page_size = _to_int(request.query_params.get("page_size"), 20, 1, 100)
-    total = qs.count()
-    start = (page - 1) * page_size
-    end = start + page_size
-    data = OrderSerializer(qs[start:end], many=True).data
-    return Response({
-        "count": total,
-        "page": page,
-        "page_size": page_size,
-        "results": data,
-    })
+def _archived_page(qs, after, limit: int):
+    # Названия блюд в архиве хранятся в позициях — join с блюдами не нужен
+    qs = keyset_filter(qs, ("created_at", "id"), after, descending=True)
+    return qs.prefetch_related("items")[:limit]
+
+
+def _serialize_order(order) -> dict:
+    if isinstance(order, ArchivedOrder):
+        return ArchivedOrderSerializer(order).data
+    return OrderSerializer(order).data
+
+
+def _order_cursor(token):
+    position = decode_cursor(token)
+    if position is None:
+        return None
+    try:
+        created_at = parse_datetime(str(position["t"]))
+        pk = int(position["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor("Некорректный cursor") from e
+    if created_at is None:
+        raise InvalidCursor("Некорректный cursor")
+    return (created_at, pk)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def restaurant_orders_feed(request: Request):
+    """
+    Инкрементальная лента заказов ресторанов текущего владельца: всё, что создано или изменилось
+    после cursor, по возрастанию (updated_at, id). Необязательно: restaurant_id — один ресторан,
+    page_size. cursor в ответе отдаем всегда (на пустой странице — тот же): с ним дашборд опрашивает
+    ленту дальше или догоняет пропущенное после обрыва WebSocket /ws/restaurant/orders/. has_more —
+    есть ли еще сразу.
+
+    updated_at ставится до COMMIT, и заказы коммитятся не в его порядке: строка с меньшим updated_at
+    может стать видна уже после того, как курсор ушел дальше. Поэтому курсор последней страницы
+    помечен tail, и чтение с него начинается на ORDER_FEED_OVERLAP_SEC раньше. Уже отданные заказы
+    придут повторно — клиент отбрасывает те, у которых (id, updated_at) уже видел.
+    """
+    user = request.user
+    if getattr(user, "role", None) != UserRole.RESTAURANT:
+        return Response(
+            {"detail": "Лента доступна только ресторанам."}, status=status.HTTP_403_FORBIDDEN
+        )
+    qs = Order.objects.filter(restaurant__owner_id=user.id)
+    restaurant_id = request.query_params.get("restaurant_id")
+    if restaurant_id:
+        if not restaurant_id.isdigit():
+            return Response(
+                {"detail": "restaurant_id должен быть числом"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        qs = qs.filter(restaurant_id=int(restaurant_id))
+
+    size = page_size_from(request.query_params.get("page_size"))
+    token = request.query_params.get("cursor")
+    try:
+        after = _order_cursor(token)
+    except InvalidCursor:
+        return Response({"detail": "Некорректный cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    tail = after is not None and bool(decode_cursor(token).get("tail"))
+    since = after
+    if tail:
+        since = (after[0] - timedelta(seconds=settings.ORDER_FEED_OVERLAP_SEC), 0)
+    qs = keyset_filter(qs, ("updated_at", "id"), since).prefetch_related("items__dish")
+    rows = list(qs[: size + 1])
+    page = rows[:size]
+    has_more = len(rows) > size
+    position = (page[-1].updated_at, page[-1].id) if page else None
+    if not has_more and after is not None:
+        # Хвост: перечитанное окно могло кончиться раньше прежнего курсора — назад не откатываемся
+        position = max(position, after) if position else after
+    if position is not None:
+        # Внутри прохода по страницам курсор точный, иначе окно длиннее page_size не пройти
+        cursor = {"t": position[0].isoformat(), "id": position[1]}
+        if not has_more:
+            cursor["tail"] = 1
+        token = encode_cursor(cursor)
+    return Response(
+        {
+            "results": OrderSerializer(page, many=True).data,
+            "cursor": token or None,
+            "has_more": has_more,
+        }
+    )
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_order_detail(request: Request, id: int):  # noqa: A002
-    """Детали заказа. Доступ: клиент-владелец, ресторан-владелец, назначенный курьер, админ."""
-    order = get_object_or_404(Order, pk=id)
+    """
+    Детали заказа. Доступ: клиент-владелец, ресторан-владелец, назначенный курьер, админ.
+    Заказа нет в рабочей таблице — ищем в архиве (id там те же).
+    """
+    order = Order.objects.filter(pk=id).select_related("restaurant").first()
+    if order is None:
+        order = (
+            ArchivedOrder.objects.filter(pk=id)
+            .select_related("restaurant")
+            .prefetch_related("items")
+            .first()
+        )
+    if order is None:
+        return Response({"detail": "Заказ не найден."}, status=status.HTTP_404_NOT_FOUND)
     user = request.user
     role = getattr(user, "role", None)
     allowed = False
@@ -125,4 +345,109 @@ def get_order_detail(request: Request, id: int):  # noqa: A002
         allowed = True
     if not allowed:
         return Response({"detail": "Недостаточно прав для просмотра заказа."}, status=status.HTTP_403_FORBIDDEN)
-    return Response(OrderSerializer(order).data)
+    return Response(_serialize_order(order))
+
+
+# Отчет по продажам: окно по умолчанию и потолок (дней)
+SALES_DEFAULT_DAYS = 30
+SALES_MAX_DAYS = 366
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def restaurant_sales(request: Request, id: int):  # noqa: A002
+    """
+    Продажи ресторана по дням: заказы, выручка, средний чек, доставки, отмены после оплаты, топ
+    блюд. Доступ: владелец ресторана, админ. Параметры: from, to (YYYY-MM-DD, включительно; по
+    умолчанию — последние 30 дней), top — сколько блюд в топе (по умолчанию 10). Читает только
+    дневные роллапы.
+    """
+    restaurant = Restaurant.objects.filter(pk=id).only("owner_id").first()
+    if restaurant is None:
+        return Response({"detail": "Ресторан не найден."}, status=status.HTTP_404_NOT_FOUND)
+    user = request.user
+    if restaurant.owner_id != user.id and getattr(user, "role", None) != UserRole.ADMIN:
+        return Response(
+            {"detail": "Отчет доступен только владельцу ресторана."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    params = request.query_params
+    try:
+        day_to = parse_date(params["to"]) if params.get("to") else timezone.localdate()
+        day_from = (
+            parse_date(params["from"])
+            if params.get("from")
+            else day_to - timedelta(days=SALES_DEFAULT_DAYS - 1)
+        )
+    except ValueError:
+        day_to = day_from = None
+    if day_from is None or day_to is None:
+        return Response(
+            {"detail": "from/to — даты в формате YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if day_from > day_to or (day_to - day_from).days >= SALES_MAX_DAYS:
+        return Response(
+            {"detail": f"Нужен интервал from <= to не длиннее {SALES_MAX_DAYS} дней"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    top = params.get("top", "10")
+    if not top.isdigit():
+        return Response({"detail": "top должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+    top = min(int(top), 100)
+
+    scope = {"restaurant_id": id, "day__gte": day_from, "day__lte": day_to}
+    days = list(RestaurantDailySales.objects.filter(**scope).order_by("day"))
+    dishes = (
+        RestaurantDailyDishSales.objects.filter(**scope)
+        .values("dish_id")
+        .annotate(qty=Sum("qty"), revenue=Sum("revenue"), dish_name=Max("dish_name"))
+        .order_by("-qty", "-revenue", "dish_id")[:top]
+    )
+    totals = {
+        name: sum((getattr(d, name) for d in days), start=start)
+        for name, start in (
+            ("orders_count", 0),
+            ("revenue", Decimal("0.00")),
+            ("delivered_count", 0),
+            ("canceled_count", 0),
+            ("refunded", Decimal("0.00")),
+        )
+    }
+    return Response(
+        {
+            "restaurant_id": id,
+            "from": day_from.isoformat(),
+            "to": day_to.isoformat(),
+            "totals": _sales_row(totals),
+            "days": [dict(_sales_row(vars(d)), day=d.day.isoformat()) for d in days],
+            "top_dishes": [
+                {
+                    "dish_id": d["dish_id"],
+                    "dish_name": d["dish_name"],
+                    "qty": d["qty"],
+                    "revenue": _money(d["revenue"]),
+                }
+                for d in dishes
+            ],
+        }
+    )
+
+
+def _money(value) -> str:
+    # Деньги — строками с копейками, как DecimalField в остальных ответах API
+    # (SUM в SQLite теряет масштаб)
+    return str(Decimal(value or 0).quantize(Decimal("0.01")))
+
+
+def _sales_row(row) -> dict:
+    orders, revenue, refunded = row["orders_count"], row["revenue"], row["refunded"]
+    return {
+        "orders": orders,
+        "revenue": _money(revenue),
+        "avg_ticket": _money(revenue / orders if orders else 0),
+        "delivered": row["delivered_count"],
+        "canceled": row["canceled_count"],
+        "refunded": _money(refunded),
+        "net_revenue": _money(revenue - refunded),
+    }
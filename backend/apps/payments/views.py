@@ -10,15 +10,19 @@ from django.views.decorators.csrf import csrf_exempt
 import stripe
 import decimal
 
+from apps.orders.idempotency import idempotent
 from apps.orders.models import Order, OrderStatus
+from apps.orders.services import transition
 from apps.orders.tasks import broadcast_order_event
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def pay_order(request, id: int):  # noqa: A002
-    """Создаем или возвращаем PaymentIntent для заказа. Валюта — USD, MVP."""
+    """Создаем или возвращаем PaymentIntent для заказа. Валюта — USD, MVP.
+    С Idempotency-Key повтор отдается из сохраненного ответа, без похода в Stripe."""
     user = request.user
     order = get_object_or_404(Order, pk=id)
     if order.client_id != user.id:
@@ -41,13 +45,29 @@ def pay_order(request, id: int):  # noqa: A002
                 currency="usd",
                 metadata={"order_id": str(order.id)},
                 automatic_payment_methods={"enabled": True},
+                # Ретрай после обрыва связи со Stripe получит тот же PaymentIntent, а не второй
+                idempotency_key=f"order-{order.id}-payment-intent",
             )
-            order.stripe_payment_intent_id = pi["id"]
-            order.status = OrderStatus.PENDING_PAYMENT
-            order.save(update_fields=["stripe_payment_intent_id", "status", "updated_at"])
-            broadcast_order_event.delay(order.id, {"type": "payment_created", "order_id": order.id})
-    except Exception as e:  # pragma: no cover - внешнее API
-        return Response({"detail": f"Stripe error: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+            # CAS: если параллельный запрос уже создал PaymentIntent — не затираем его своим
+            updated = transition(
+                order.id,
+                [OrderStatus.CREATED],
+                OrderStatus.PENDING_PAYMENT,
+                actor=user,
+                extra={"stripe_payment_intent_id": pi["id"]},
+                stripe_payment_intent_id="",
+            )
+            if updated is None:
+                return Response(
+                    {"detail": "Оплата заказа уже начата."}, status=status.HTTP_409_CONFLICT
+                )
+            order = updated
+            broadcast_order_event.delay(
+                order.id, {"type": "payment_created", "order_id": order.id}, order.restaurant_id
+            )
+    except Exception as e:
+        # Сбой Stripe или сети — 502: ответ не сохранится под Idempotency-Key, ретрай пойдет заново
+        return Response({"detail": f"Stripe error: {e}"}, status=status.HTTP_502_BAD_GATEWAY)
 
     return Response({
         "order_id": order.id,
@@ -74,13 +94,17 @@ def stripe_webhook(request):
         pi = event["data"]["object"]
         order_id = int(pi["metadata"].get("order_id", 0)) if pi.get("metadata") else 0
         if order_id:
-            try:
-                order = Order.objects.get(pk=order_id, stripe_payment_intent_id=pi["id"])  # type: ignore[index]
-                order.status = OrderStatus.PAID
-                order.save(update_fields=["status", "updated_at"])
-                broadcast_order_event.delay(order.id, {"type": "paid", "order_id": order.id})
-            except Order.DoesNotExist:  # pragma: no cover
-                pass
+            # Повторная доставка события Stripe ничего не меняет: заказ уже не в исходном статусе
+            order = transition(
+                order_id,
+                [OrderStatus.CREATED, OrderStatus.PENDING_PAYMENT],
+                OrderStatus.PAID,
+                stripe_payment_intent_id=pi["id"],  # type: ignore[index]
+            )
+            if order is not None:
+                broadcast_order_event.delay(
+                    order.id, {"type": "paid", "order_id": order.id}, order.restaurant_id
+                )
     elif event["type"] in {"payment_intent.payment_failed", "payment_intent.canceled"}:
         pi = event["data"]["object"]
         order_id = int(pi["metadata"].get("order_id", 0)) if pi.get("metadata") else 0
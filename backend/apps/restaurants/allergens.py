@@ -0,0 +1,99 @@
+"""
+Канонический словарь аллергенов (14 из регламента ЕС 1169/2011) и битовые маски для фильтрации в
+SQL.
+
+Dish.allergens на сохранении приводится к каноническим именам, Dish.allergen_mask — OR битов
+известных аллергенов. Неизвестные строки остаются в JSON как есть (в нижнем регистре) и в маску не
+попадают. Порядок битов менять нельзя — маски лежат в БД; новые аллергены добавляем только в конец.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+CANONICAL: Tuple[str, ...] = (
+    "gluten",
+    "crustaceans",
+    "eggs",
+    "fish",
+    "peanut",
+    "soy",
+    "milk",
+    "nuts",
+    "celery",
+    "mustard",
+    "sesame",
+    "sulphites",
+    "lupin",
+    "molluscs",
+)
+
+BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(CANONICAL)}
+
+ALIASES: Dict[str, str] = {
+    "wheat": "gluten",
+    "глютен": "gluten",
+    "пшеница": "gluten",
+    "crustacean": "crustaceans",
+    "shellfish": "crustaceans",
+    "ракообразные": "crustaceans",
+    "egg": "eggs",
+    "яйца": "eggs",
+    "яйцо": "eggs",
+    "рыба": "fish",
+    "peanuts": "peanut",
+    "арахис": "peanut",
+    "soya": "soy",
+    "соя": "soy",
+    "dairy": "milk",
+    "lactose": "milk",
+    "молоко": "milk",
+    "лактоза": "milk",
+    "nut": "nuts",
+    "tree nuts": "nuts",
+    "орехи": "nuts",
+    "сельдерей": "celery",
+    "горчица": "mustard",
+    "кунжут": "sesame",
+    "sulfites": "sulphites",
+    "sulphur dioxide": "sulphites",
+    "сульфиты": "sulphites",
+    "люпин": "lupin",
+    "mollusc": "molluscs",
+    "mollusks": "molluscs",
+    "моллюски": "molluscs",
+}
+
+
+def canonical(name: str) -> str:
+    token = " ".join(str(name).strip().lower().split())
+    return ALIASES.get(token, token)
+
+
+def normalize(names: Iterable[str] | None) -> List[str]:
+    """Канонические имена без дублей и пустых строк, порядок — как во входе."""
+    out: List[str] = []
+    for name in names or []:
+        token = canonical(name)
+        if token and token not in out:
+            out.append(token)
+    return out
+
+
+def mask_of(names: Iterable[str] | None) -> int:
+    mask = 0
+    for name in names or []:
+        mask |= BITS.get(canonical(name), 0)
+    return mask
+
+
+def split_exclusion(names: Iterable[str]) -> Tuple[int, frozenset[str]]:
+    """Фильтр исключения: (маска известных аллергенов, неизвестные канонизированные строки)."""
+    tokens = normalize(names)
+    return mask_of(tokens), frozenset(t for t in tokens if t not in BITS)
+
+
+def has_excluded(names: Iterable[str] | None, mask: int, unknown: frozenset[str]) -> bool:
+    """Есть ли у блюда (по списку аллергенов) хоть один из исключенных."""
+    if mask_of(names) & mask:
+        return True
+    return bool(unknown) and any(canonical(n) in unknown for n in names or [])
@@ -5,3 +5,6 @@ class RestaurantsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.restaurants"
     verbose_name = "Рестораны"
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401 — регистрируем обработчики сигналов
@@ -0,0 +1,178 @@
+"""
+Кэш выдачи «рестораны рядом» по гео-тайлам.
+
+Координаты квантуем в тайлы GEO_CACHE_TILE_DEG, радиус — вверх до ближайшего бакета. Под ключом
+тайла лежит сериализованный список ресторанов в радиусе (бакет + полудиагональ тайла) от центра
+тайла — это надмножество ответа для любой точки внутри тайла. На попадании только пересчитываем
+точную дистанцию от реальной точки, режем по радиусу и сортируем.
+
+Инвалидация — по версиям тайлов: у тайла есть версия (случайный токен), она входит в ключи всех его
+бакетов. При изменении ресторана после коммита (signals.py, on_commit) одним set_many меняем версии
+всех тайлов, чей круг мог его задеть (вокруг старой и новой позиции); старые ключи доживают TTL
+никем не читаемыми. Счетчики hit/miss живут в том же кэше — общие для всех воркеров.
+"""
+from __future__ import annotations
+
+import math
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.geo.distance import bounding_box, haversine_km, nearest
+
+Payload = List[Dict]
+Ranked = List[Tuple[float, Dict]]
+
+_KEY_PREFIX = "geo:tile"
+_STATS_HIT = f"{_KEY_PREFIX}:stats:hit"
+_STATS_MISS = f"{_KEY_PREFIX}:stats:miss"
+
+
+def _tile_deg() -> float:
+    return float(getattr(settings, "GEO_CACHE_TILE_DEG", 0.01))
+
+
+def _buckets() -> Sequence[float]:
+    return tuple(getattr(settings, "GEO_CACHE_RADIUS_BUCKETS_KM", (1, 2, 3, 5, 7, 10)))
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "GEO_CACHE_TTL", 300))
+
+
+def tile_of(lat: float, lon: float) -> Tuple[int, int]:
+    deg = _tile_deg()
+    return (math.floor(lat / deg), math.floor(lon / deg))
+
+
+def _tile_center(ty: int, tx: int) -> Tuple[float, float]:
+    deg = _tile_deg()
+    return ((ty + 0.5) * deg, (tx + 0.5) * deg)
+
+
+def _tile_half_diag_km(ty: int, tx: int) -> float:
+    deg = _tile_deg()
+    c_lat, c_lon = _tile_center(ty, tx)
+    # Ширина тайла по долготе больше у края, ближнего к экватору — берем максимум из двух углов
+    return max(
+        haversine_km(c_lat, c_lon, ty * deg, tx * deg),
+        haversine_km(c_lat, c_lon, (ty + 1) * deg, tx * deg),
+    )
+
+
+def radius_bucket(radius_km: float) -> Optional[float]:
+    """Наименьший бакет >= radius_km; None — радиус не кэшируем."""
+    for b in _buckets():
+        if radius_km <= b:
+            return float(b)
+    return None
+
+
+def _version_key(ty: int, tx: int) -> str:
+    return f"{_KEY_PREFIX}:{ty}:{tx}:ver"
+
+
+def _tile_version(ty: int, tx: int) -> str:
+    """
+    Версия тайла. Нет (первый запрос, вытеснена, истекла) — заводим новую: старые данные не
+    всплывут.
+    """
+    key = _version_key(ty, tx)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex[:12], timeout=_ttl())
+        version = cache.get(key)
+    return version
+
+
+def _key(ty: int, tx: int, bucket: float, version: str) -> str:
+    return f"{_KEY_PREFIX}:{ty}:{tx}:{bucket:g}:{version}"
+
+
+def _incr(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:  # ключа еще нет (или вытеснен)
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def rerank(payload: Iterable[Dict], lat: float, lon: float, radius_km: float) -> Ranked:
+    """
+    Точная дистанция от (lat, lon), отсечка по радиусу. Возвращает [(дистанция_км, item)],
+    отсортированный по (дистанция, id) — это ключ keyset-пагинации. Исходные dict не мутируем.
+    """
+    items = [
+        item for item in payload if item.get("lat") is not None and item.get("lon") is not None
+    ]
+    if not items:
+        return []
+    top = nearest(
+        lat, lon, [i["lat"] for i in items], [i["lon"] for i in items], radius_km=radius_km
+    )
+    ranked = [(dist_km, {**items[i], "distance_km": round(dist_km, 3)}) for i, dist_km in top]
+    ranked.sort(key=lambda r: (r[0], r[1]["id"]))
+    return ranked
+
+
+def nearby(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    compute: Callable[[float, float, float], Iterable[Dict]],
+) -> Ranked:
+    """
+    Рестораны в радиусе от точки через тайловый кэш (формат — как у rerank).
+    compute(lat, lon, radius_km) — честный поиск, возвращает сериализованные рестораны
+    (dict c lat/lon); вызывается только на промахе.
+    """
+    bucket = radius_bucket(radius_km) if radius_km > 0 else None
+    if bucket is None:
+        return rerank(compute(lat, lon, radius_km), lat, lon, radius_km)
+
+    ty, tx = tile_of(lat, lon)
+    key = _key(ty, tx, bucket, _tile_version(ty, tx))
+    payload = cache.get(key)
+    if payload is None:
+        _incr(_STATS_MISS)
+        c_lat, c_lon = _tile_center(ty, tx)
+        payload = [
+            dict(item) for item in compute(c_lat, c_lon, bucket + _tile_half_diag_km(ty, tx))
+        ]
+        cache.set(key, payload, timeout=_ttl())
+    else:
+        _incr(_STATS_HIT)
+    return rerank(payload, lat, lon, radius_km)
+
+
+def invalidate_point(lat: Optional[float], lon: Optional[float]) -> int:
+    """
+    Сменить версии всех тайлов, в чей кэшированный круг могла попасть точка. Возвращает число
+    тайлов.
+    """
+    if lat is None or lon is None or not _buckets():
+        return 0
+    deg = _tile_deg()
+    # Полудиагональ растет к экватору: берем соседний к экватору тайл и 1% запаса на весь радиус.
+    # Круги бакетов вложены — достаточно бокса самого большого
+    ty0, tx0 = tile_of(lat, lon)
+    slack = _tile_half_diag_km(ty0 - 1 if lat >= 0 else ty0 + 1, tx0) * 1.01
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, float(max(_buckets())) + slack)
+    version = uuid.uuid4().hex[:12]
+    versions = {
+        _version_key(ty, tx): version
+        for ty in range(math.floor(min_lat / deg), math.floor(max_lat / deg) + 1)
+        for tx in range(math.floor(min_lon / deg), math.floor(max_lon / deg) + 1)
+    }
+    cache.set_many(versions, timeout=_ttl())
+    return len(versions)
+
+
+def stats() -> Dict[str, float]:
+    values = cache.get_many([_STATS_HIT, _STATS_MISS])
+    hits = int(values.get(_STATS_HIT, 0))
+    misses = int(values.get(_STATS_MISS, 0))
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
@@ -0,0 +1,57 @@
+"""
+Бэкфилл Dish.allergens/allergen_mask для строк, сохраненных до появления маски (или в обход save()).
+Пример: python manage.py backfill_allergen_masks --batch 2000
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.restaurants.allergens import mask_of, normalize
+from apps.restaurants.models import Dish
+from apps.restaurants.signals import invalidate_menu
+
+
+class Command(BaseCommand):
+    help = "Нормализовать аллергены блюд и пересчитать битовую маску."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Размер пачки bulk_update")
+
+    def handle(self, *args, **opts):
+        batch = max(1, opts["batch"])
+        scanned = updated = 0
+        touched_restaurants: set[int] = set()
+        last_pk = 0
+        while True:
+            # Идем по pk — без OFFSET и без удержания длинной транзакции на всю таблицу
+            rows = list(
+                Dish.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", "restaurant_id", "allergens", "allergen_mask")[:batch]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            scanned += len(rows)
+            changed = []
+            for dish in rows:
+                allergens = normalize(dish.allergens)
+                mask = mask_of(allergens)
+                if allergens != dish.allergens or mask != dish.allergen_mask:
+                    dish.allergens, dish.allergen_mask = allergens, mask
+                    changed.append(dish)
+                    touched_restaurants.add(dish.restaurant_id)
+            if changed:
+                with transaction.atomic():
+                    Dish.objects.bulk_update(changed, ["allergens", "allergen_mask"])
+                updated += len(changed)
+
+        for restaurant_id in touched_restaurants:
+            invalidate_menu(restaurant_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Просмотрено блюд: {scanned}, обновлено: {updated}, "
+                f"ресторанов с новым меню: {len(touched_restaurants)}"
+            )
+        )
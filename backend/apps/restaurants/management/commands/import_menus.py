@@ -0,0 +1,255 @@
+"""
+Потоковый импорт меню сети ресторанов из CSV или JSONL.
+
+Одна строка — одно блюдо вместе с данными ресторана:
+    restaurant_name, address, lat, lon, [restaurant_is_active],
+    dish_name, price, [allergens], [is_available]
+allergens в CSV — через «;» или «|», в JSONL — список. Ресторан ищем по (владелец, название, адрес),
+блюдо — по (ресторан, название). Файл читаем построчно, пишем пачками bulk_create/bulk_update,
+каждая пачка — отдельная транзакция. Кэши меню/гео сбрасываем после коммита каждой пачки — для
+ресторанов, которые она тронула: импорт, упавший посередине, не оставляет закоммиченное за старой
+версией меню.
+
+Пример: python manage.py import_menus chain.csv --owner owner@chain.example --batch 2000
+"""
+from __future__ import annotations
+
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.restaurants.allergens import mask_of, normalize
+from apps.restaurants.models import Dish, Point, Restaurant
+from apps.restaurants.signals import invalidate_menu, sync_restaurant_geo
+
+RestaurantKey = Tuple[str, str]
+
+_TRUE = {"1", "true", "yes", "y", "да"}
+
+
+def _as_bool(value, default: bool = True) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE
+
+
+def _as_allergens(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return normalize(value)
+    return normalize(str(value).replace("|", ";").split(";"))
+
+
+class Command(BaseCommand):
+    help = "Импорт ресторанов и блюд из CSV/JSONL пачками (upsert), в постоянной памяти."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к .csv или .jsonl; '-' — stdin (нужен --format)")
+        parser.add_argument("--owner", required=True, help="Email владельца сети")
+        parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+        parser.add_argument("--batch", type=int, default=1000, help="Строк в одной транзакции")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        try:
+            owner = User.objects.get(email=opts["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {opts['owner']} не найден")
+
+        fmt = opts["format"] or Path(opts["path"]).suffix.lstrip(".").lower()
+        if fmt not in {"csv", "jsonl"}:
+            raise CommandError("Не удалось определить формат: укажите --format csv|jsonl")
+        batch_size = max(1, opts["batch"])
+
+        self._owner = owner
+        stats = dict.fromkeys(
+            (
+                "rows",
+                "restaurants_created",
+                "restaurants_updated",
+                "dishes_created",
+                "dishes_updated",
+            ),
+            0,
+        )
+        started = time.perf_counter()
+
+        batch: List[dict] = []
+        for lineno, row in enumerate(self._rows(opts["path"], fmt), start=1):
+            batch.append(self._parse(row, lineno))
+            if len(batch) >= batch_size:
+                self._flush(batch, stats)
+                batch = []
+                self._progress(stats, started)
+        if batch:
+            self._flush(batch, stats)
+
+        elapsed = time.perf_counter() - started
+        rate = stats["rows"] / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: строк {stats['rows']} за {elapsed:.1f} с ({rate:.0f} строк/с); "
+                f"рестораны +{stats['restaurants_created']} ~{stats['restaurants_updated']}, "
+                f"блюда +{stats['dishes_created']} ~{stats['dishes_updated']}"
+            )
+        )
+
+    # --- чтение ---
+
+    def _rows(self, path: str, fmt: str) -> Iterator[dict]:
+        fh = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        try:
+            if fmt == "csv":
+                yield from csv.DictReader(fh)
+            else:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+    def _parse(self, row: dict, lineno: int) -> dict:
+        try:
+            price = Decimal(str(row.get("price") or "0")).quantize(Decimal("0.01"))
+            return {
+                "restaurant": (str(row["restaurant_name"]).strip(), str(row["address"]).strip()),
+                "lat": float(row["lat"]),
+                "lon": float(row["lon"]),
+                "is_active": _as_bool(row.get("restaurant_is_active")),
+                "dish_name": str(row["dish_name"]).strip(),
+                "price": price,
+                "allergens": _as_allergens(row.get("allergens")),
+                "is_available": _as_bool(row.get("is_available")),
+            }
+        except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+            raise CommandError(f"Строка {lineno}: некорректные данные ({e!r})")
+
+    # --- запись ---
+
+    @transaction.atomic
+    def _flush(self, rows: List[dict], stats: Dict[str, int]) -> None:
+        # Что поменяла пачка: меню каких ресторанов сбросить и чья позиция/активность
+        # изменилась (pk -> позиция до пачки, None — ресторан создан)
+        self._menus_touched: Set[int] = set()
+        self._geo_touched: Dict[int, Optional[Tuple[float, float]]] = {}
+        restaurants = self._upsert_restaurants(rows, stats)
+
+        # Последняя строка по блюду в пачке выигрывает
+        dishes: Dict[Tuple[int, str], dict] = {}
+        for row in rows:
+            dishes[(restaurants[row["restaurant"]].pk, row["dish_name"])] = row
+        existing = {
+            (d.restaurant_id, d.name): d
+            for d in Dish.objects.filter(
+                restaurant_id__in={rid for rid, _ in dishes}, name__in={name for _, name in dishes}
+            )
+        }
+        to_create, to_update = [], []
+        for (rid, name), row in dishes.items():
+            values = {
+                "price": row["price"],
+                "allergens": row["allergens"],
+                "allergen_mask": mask_of(row["allergens"]),  # bulk_* не зовут Dish.save()
+                "is_available": row["is_available"],
+            }
+            dish = existing.get((rid, name))
+            if dish is None:
+                to_create.append(Dish(restaurant_id=rid, name=name, **values))
+            elif any(getattr(dish, k) != v for k, v in values.items()):
+                for k, v in values.items():
+                    setattr(dish, k, v)
+                to_update.append(dish)
+            else:
+                continue
+            self._menus_touched.add(rid)
+        Dish.objects.bulk_create(to_create)
+        Dish.objects.bulk_update(to_update, ["price", "allergens", "allergen_mask", "is_available"])
+        stats["rows"] += len(rows)
+        stats["dishes_created"] += len(to_create)
+        stats["dishes_updated"] += len(to_update)
+        menus, geo = self._menus_touched, self._geo_touched
+        transaction.on_commit(lambda: self._invalidate_caches(menus, geo))
+
+    def _upsert_restaurants(
+        self, rows: List[dict], stats: Dict[str, int]
+    ) -> Dict[RestaurantKey, Restaurant]:
+        wanted: Dict[RestaurantKey, dict] = {}
+        for row in rows:
+            wanted[row["restaurant"]] = row
+        found = {
+            (r.name, r.address): r
+            for r in Restaurant.objects.filter(
+                owner=self._owner,
+                name__in={name for name, _ in wanted},
+                address__in={address for _, address in wanted},
+            )
+        }
+        to_create, to_update = [], []
+        for key, row in wanted.items():
+            r = found.get(key)
+            if r is None:
+                r = Restaurant(
+                    owner=self._owner,
+                    name=key[0],
+                    address=key[1],
+                    lat=row["lat"],
+                    lon=row["lon"],
+                    is_active=row["is_active"],
+                )
+                self._set_location(r)
+                to_create.append(r)
+                found[key] = r
+            elif (r.lat, r.lon, r.is_active) != (row["lat"], row["lon"], row["is_active"]):
+                # Позицию до пачки запоминаем при первом касании — по ней сбросим старые тайлы
+                self._geo_touched.setdefault(r.pk, (r.lat, r.lon))
+                self._menus_touched.add(r.pk)
+                r.lat, r.lon, r.is_active = row["lat"], row["lon"], row["is_active"]
+                self._set_location(r)
+                to_update.append(r)
+        Restaurant.objects.bulk_create(to_create)
+        for r in to_create:
+            self._geo_touched[r.pk] = None
+            self._menus_touched.add(r.pk)
+        fields = ["lat", "lon", "is_active"] + (
+            ["location"] if hasattr(Restaurant, "location") else []
+        )
+        Restaurant.objects.bulk_update(to_update, fields)
+        stats["restaurants_created"] += len(to_create)
+        stats["restaurants_updated"] += len(to_update)
+        return found
+
+    @staticmethod
+    def _set_location(r: Restaurant) -> None:
+        # То же, что Restaurant.save() делает для PostGIS-поля, — bulk-операции save() не вызывают
+        if hasattr(r, "location") and Point is not None:
+            r.location = Point(r.lon, r.lat)  # type: ignore[assignment]
+
+    @staticmethod
+    def _invalidate_caches(menus: Set[int], geo: Dict[int, Optional[Tuple[float, float]]]) -> None:
+        for pk in menus:
+            invalidate_menu(pk)
+        if not geo:
+            return
+        by_pk = Restaurant.objects.only("id", "lat", "lon", "is_active").in_bulk(list(geo))
+        for pk, old_position in geo.items():
+            r = by_pk.get(pk)
+            if r is not None:
+                sync_restaurant_geo(r, old_position or (r.lat, r.lon), created=old_position is None)
+
+    def _progress(self, stats: Dict[str, int], started: float) -> None:
+        elapsed = time.perf_counter() - started
+        rate = stats["rows"] / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(f"… {stats['rows']} строк, {rate:.0f} строк/с")
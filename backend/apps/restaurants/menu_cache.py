@@ -0,0 +1,94 @@
+"""
+Версионированный кэш меню ресторана.
+
+У каждого ресторана есть версия меню (случайный токен в кэше), ее меняют сигналы Dish/Restaurant.
+Версия живет MENU_CACHE_TTL, как и данные под ней, и заводится только для существующего ресторана —
+запросы к случайным id не плодят вечных ключей. Под версией лежат базовое меню (dict) и готовые
+байты ответа для каждого варианта фильтра аллергенов. ETag строится из версии и варианта, поэтому
+If-None-Match проверяется без похода в БД.
+"""
+from __future__ import annotations
+
+import hashlib
+import uuid
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .allergens import has_excluded, normalize, split_exclusion
+
+_KEY_PREFIX = "menu"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "MENU_CACHE_TTL", 24 * 3600))
+
+
+def _version_key(restaurant_id: int) -> str:
+    return f"{_KEY_PREFIX}:{restaurant_id}:ver"
+
+
+def menu_version(restaurant_id: int) -> Optional[str]:
+    """Текущая версия меню; None — версии нет (первый запрос, вытеснена, истекла)."""
+    return cache.get(_version_key(restaurant_id))
+
+
+def ensure_menu_version(restaurant_id: int) -> str:
+    """Версия меню, при необходимости новая. Звать, только убедившись, что ресторан есть."""
+    key = _version_key(restaurant_id)
+    cache.add(key, uuid.uuid4().hex[:12], timeout=_ttl())
+    return cache.get(key)
+
+
+def bump_menu_version(restaurant_id: int) -> None:
+    """
+    Меню поменялось — все закэшированные варианты и ETag'и старой версии становятся
+    недействительными.
+    """
+    cache.set(_version_key(restaurant_id), uuid.uuid4().hex[:12], timeout=_ttl())
+
+
+def variant_of(exclude: Iterable[str]) -> str:
+    """Нормализованный вариант фильтра: отсортированные канонические аллергены, '' — без фильтра."""
+    return ",".join(sorted(normalize(exclude)))
+
+
+def exclusion_of(variant: str) -> tuple[int, frozenset[str]]:
+    """(битовая маска, неизвестные аллергены) для варианта."""
+    return split_exclusion(variant.split(",")) if variant else (0, frozenset())
+
+
+def _variant_tag(variant: str) -> str:
+    return hashlib.sha1(variant.encode()).hexdigest()[:10] if variant else "all"
+
+
+def etag_for(restaurant_id: int, version: str, variant: str) -> str:
+    return f'"menu-{restaurant_id}-{version}-{_variant_tag(variant)}"'
+
+
+def get_base(restaurant_id: int, version: str) -> Optional[Dict]:
+    return cache.get(f"{_KEY_PREFIX}:{restaurant_id}:{version}:base")
+
+
+def set_base(restaurant_id: int, version: str, data: Dict) -> None:
+    cache.set(f"{_KEY_PREFIX}:{restaurant_id}:{version}:base", data, timeout=_ttl())
+
+
+def get_rendered(restaurant_id: int, version: str, variant: str) -> Optional[bytes]:
+    return cache.get(f"{_KEY_PREFIX}:{restaurant_id}:{version}:r:{_variant_tag(variant)}")
+
+
+def set_rendered(restaurant_id: int, version: str, variant: str, body: bytes) -> None:
+    cache.set(
+        f"{_KEY_PREFIX}:{restaurant_id}:{version}:r:{_variant_tag(variant)}", body, timeout=_ttl()
+    )
+
+
+def filter_allergens(base: Dict, variant: str) -> Dict:
+    """Вариант меню без блюд с указанными аллергенами — из базового меню, без БД."""
+    if not variant:
+        return base
+    mask, unknown = exclusion_of(variant)
+    dishes = [d for d in base["dishes"] if not has_excluded(d.get("allergens"), mask, unknown)]
+    return {**base, "dishes": dishes}
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-17 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['lat', 'lon'], name='idx_restaurant_latlon_active'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.14 on 2026-10-17 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0003_restaurant_active_latlon_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='allergen_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска аллергенов'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['restaurant', 'is_available', 'allergen_mask'], name='idx_dish_menu_allergens'),
+        ),
+    ]
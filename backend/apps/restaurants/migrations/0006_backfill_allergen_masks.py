@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from apps.restaurants.allergens import mask_of, normalize
+
+
+def backfill_masks(apps, schema_editor):
+    # До маски без нее фильтр в SQL (Dish.objects.without_allergens) пропускал бы блюда с исключенными
+    # аллергенами. То же, что manage.py backfill_allergen_masks, но при миграции — без ручного шага.
+    Dish = apps.get_model('restaurants', 'Dish')
+    last_pk = 0
+    while True:
+        rows = list(Dish.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'allergens', 'allergen_mask')[:1000])
+        if not rows:
+            break
+        last_pk = rows[-1].pk
+        changed = []
+        for dish in rows:
+            allergens = normalize(dish.allergens)
+            mask = mask_of(allergens)
+            if allergens != dish.allergens or mask != dish.allergen_mask:
+                dish.allergens, dish.allergen_mask = allergens, mask
+                changed.append(dish)
+        if changed:
+            Dish.objects.bulk_update(changed, ['allergens', 'allergen_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_rating_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_masks, migrations.RunPython.noop),
+    ]
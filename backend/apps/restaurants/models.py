@@ -5,6 +5,8 @@ from decimal import Decimal
 from django.db import models
 from django.conf import settings
 import os
+
+from .allergens import mask_of as allergen_mask_of, normalize as normalize_allergens
 try:
     from django.contrib.gis.db import models as gis_models  # type: ignore
     from django.contrib.gis.geos import Point  # type: ignore
@@ -31,10 +33,23 @@ class Restaurant(models.Model):
     if _GIS_IMPORTS_OK and _USE_GIS:  # pragma: no branch - конфигурируем поле при импорте модели
         location = gis_models.PointField("Геоточка", geography=True, srid=4326, null=True, blank=True)  # type: ignore[attr-defined]
     is_active = models.BooleanField("Активен", default=True)
+    # Счетчики оценок: F()-апдейт при создании Rating (orders.ratings), сверка — reconcile_ratings
+    rating_count = models.PositiveIntegerField("Оценок", default=0)
+    rating_sum = models.PositiveIntegerField("Сумма звезд", default=0)
 
     class Meta:
         verbose_name = "Ресторан"
         verbose_name_plural = "Рестораны"
+        indexes = [
+            # Гео-фолбэк без PostGIS: bbox по lat/lon среди активных. Частичный, lat первым —
+            # диапазон по lat идет поиском по индексу (с is_active первым SQLite сканировал индекс
+            # целиком), lon — покрытием
+            models.Index(
+                fields=["lat", "lon"],
+                name="idx_restaurant_latlon_active",
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def save(self, *args, **kwargs):  # pragma: no cover - банальная сборка поля
         # Если поле location существует и доступен GeoPoint — соберем его из lat/lon
@@ -45,10 +60,24 @@ class Restaurant(models.Model):
                 pass
         super().save(*args, **kwargs)
 
+    @property
+    def rating_avg(self) -> float | None:
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
     def __str__(self) -> str:  # pragma: no cover
         return self.name
 
 
+class DishQuerySet(models.QuerySet):
+    def without_allergens(self, mask: int) -> "DishQuerySet":
+        """Блюда без единого аллергена из маски — одно битовое условие в SQL (SQLite и Postgres)."""
+        if not mask:
+            return self
+        return self.alias(allergen_hit=models.F("allergen_mask").bitand(mask)).filter(
+            allergen_hit=0
+        )
+
+
 class Dish(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -59,11 +88,30 @@ class Dish(models.Model):
     name = models.CharField("Название блюда", max_length=255)
     price = models.DecimalField("Цена", max_digits=10, decimal_places=2, default=Decimal("0.00"))
     allergens = models.JSONField("Аллергены", default=list, blank=True)
+    # OR битов канонических аллергенов (см. allergens.py), пересчитывается в save()
+    allergen_mask = models.BigIntegerField("Маска аллергенов", default=0, editable=False)
     is_available = models.BooleanField("В наличии", default=True)
 
+    objects = DishQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Блюдо"
         verbose_name_plural = "Блюда"
+        indexes = [
+            # Меню ресторана: доступные блюда + маска прямо из индекса, без чтения строк
+            models.Index(
+                fields=["restaurant", "is_available", "allergen_mask"],
+                name="idx_dish_menu_allergens",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.allergens = normalize_allergens(self.allergens)
+        self.allergen_mask = allergen_mask_of(self.allergens)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "allergens" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "allergen_mask"}
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:  # pragma: no cover
         return f"{self.name} ({self.restaurant_id})"
@@ -0,0 +1,55 @@
+"""
+Поиск ресторанов рядом с точкой без PostGIS.
+
+Два режима (settings.GEO_INMEMORY_INDEX):
+- in-process сеточный индекс по Restaurant.lat/lon, синхронизируется сигналами (см. signals.py)
+  и периодически перечитывается из БД;
+- bbox-отбор в SQL по индексу (is_active, lat, lon), в питон приезжают только кандидаты.
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Tuple
+
+from django.conf import settings
+
+from apps.geo.distance import nearest
+from apps.geo.index import LazyGridIndex
+from apps.geo.queries import bbox_q
+
+
+def _load_active_points() -> Iterable[Tuple[int, float, float]]:
+    from .models import Restaurant
+
+    return (
+        Restaurant.objects.filter(is_active=True, lat__isnull=False, lon__isnull=False)
+        .values_list("id", "lat", "lon")
+        .iterator(chunk_size=5000)
+    )
+
+
+restaurant_index = LazyGridIndex(
+    _load_active_points,
+    cell_deg=getattr(settings, "GEO_INDEX_CELL_DEG", 0.01),
+    ttl=getattr(settings, "GEO_INDEX_TTL", 300),
+)
+
+
+def nearby_restaurant_ids(lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+    """Активные рестораны в радиусе: [(дистанция_км, id)] по возрастанию дистанции."""
+    if getattr(settings, "GEO_INMEMORY_INDEX", True):
+        return restaurant_index.query(lat, lon, radius_km)
+    return _nearby_via_bbox(lat, lon, radius_km)
+
+
+def _nearby_via_bbox(lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+    from .models import Restaurant
+
+    rows = list(
+        Restaurant.objects.filter(bbox_q(lat, lon, radius_km), is_active=True).values_list(
+            "id", "lat", "lon"
+        )
+    )
+    if not rows:
+        return []
+    ids, lats, lons = zip(*rows)
+    return [(dist_km, ids[i]) for i, dist_km in nearest(lat, lon, lats, lons, radius_km=radius_km)]
@@ -7,10 +7,12 @@ from .models import Restaurant, Dish
 
 class RestaurantListSerializer(serializers.ModelSerializer):
     distance_km = serializers.SerializerMethodField()
+    # Средняя оценка из денормализованных счетчиков — без подзапроса к Rating
+    rating = serializers.FloatField(source="rating_avg", read_only=True, allow_null=True)
 
     class Meta:
         model = Restaurant
-        fields = ("id", "name", "address", "lat", "lon", "distance_km")
+        fields = ("id", "name", "address", "lat", "lon", "distance_km", "rating", "rating_count")
 
     def get_distance_km(self, obj) -> float | None:  # noqa: ANN001
         d = getattr(obj, "distance", None)
@@ -0,0 +1,77 @@
+"""
+Сигналы ресторанов: держим in-process гео-индекс, тайловый кэш выдачи и версии меню в актуальном
+состоянии.
+"""
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import cache as tile_cache
+from . import menu_cache
+from .models import Dish, Restaurant
+from .search import restaurant_index
+
+
+def invalidate_menu(restaurant_id: int) -> None:
+    # Сразу и еще раз после коммита: иначе параллельный запрос между bump и COMMIT
+    # успеет положить под новую версию меню из старых данных
+    menu_cache.bump_menu_version(restaurant_id)
+    transaction.on_commit(lambda: menu_cache.bump_menu_version(restaurant_id))
+
+
+@receiver(post_init, sender=Restaurant, dispatch_uid="restaurant_geo_snapshot")
+def _remember_position(sender, instance: Restaurant, **kwargs) -> None:  # noqa: ARG001
+    # Позиция на момент загрузки — чтобы при переезде сбросить тайлы и вокруг старой точки
+    instance._geo_snapshot = (instance.__dict__.get("lat"), instance.__dict__.get("lon"))
+
+
+def invalidate_tiles(*positions: tuple) -> None:
+    # После коммита: сброс до COMMIT дал бы параллельному промаху положить старое под новую версию
+    transaction.on_commit(lambda: [tile_cache.invalidate_point(*p) for p in positions])
+
+
+def sync_restaurant_geo(instance: Restaurant, old_position: tuple, created: bool) -> None:
+    """
+    Гео-индекс и тайловый кэш после изменения ресторана (в т.ч. из bulk-операций, где сигналов нет).
+    """
+    # Индекс — тоже после коммита: откат не должен оставить в выдаче несохраненную позицию
+    pk = instance.pk
+    if instance.is_active and instance.lat is not None and instance.lon is not None:
+        lat, lon = instance.lat, instance.lon
+        transaction.on_commit(lambda: restaurant_index.upsert(pk, lat, lon))
+    else:
+        transaction.on_commit(lambda: restaurant_index.remove(pk))
+
+    # Неактивный ресторан, которого не было в выдаче, кэш не трогает
+    if created and not instance.is_active:
+        return
+    new = (instance.lat, instance.lon)
+    if not created and old_position != new:
+        invalidate_tiles(new, old_position)
+    else:
+        invalidate_tiles(new)
+
+
+@receiver(post_save, sender=Restaurant, dispatch_uid="restaurant_on_save")
+def _on_restaurant_save(
+    sender, instance: Restaurant, created: bool, **kwargs  # noqa: ARG001
+) -> None:
+    invalidate_menu(instance.pk)
+    sync_restaurant_geo(instance, getattr(instance, "_geo_snapshot", (None, None)), created)
+    instance._geo_snapshot = (instance.lat, instance.lon)
+
+
+@receiver(post_delete, sender=Restaurant, dispatch_uid="restaurant_on_delete")
+def _on_restaurant_delete(sender, instance: Restaurant, **kwargs) -> None:  # noqa: ARG001
+    pk = instance.pk  # delete() обнуляет instance.pk до коммита
+    transaction.on_commit(lambda: restaurant_index.remove(pk))
+    invalidate_tiles((instance.lat, instance.lon))
+    invalidate_menu(instance.pk)
+
+
+@receiver(post_save, sender=Dish, dispatch_uid="menu_version_on_dish_save")
+@receiver(post_delete, sender=Dish, dispatch_uid="menu_version_on_dish_delete")
+def _menu_on_dish_change(sender, instance: Dish, **kwargs) -> None:  # noqa: ARG001
+    invalidate_menu(instance.restaurant_id)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from django.urls import path
-from .views import restaurants_list, restaurant_menu
+from .views import restaurants_list, restaurant_menu, restaurants_cache_stats
 
 urlpatterns = [
     path("restaurants", restaurants_list, name="restaurants-list"),
+    path("restaurants/cache/stats", restaurants_cache_stats, name="restaurants-cache-stats"),
     path("restaurants/<int:id>/menu", restaurant_menu, name="restaurant-menu"),
 ]
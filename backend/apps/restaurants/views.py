@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from typing import List
-
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import status
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
 try:
     from django.contrib.gis.geos import Point as GeoPoint
@@ -18,74 +18,163 @@ try:
 except Exception:  # pragma: no cover - окружение без GIS
     D = None  # type: ignore
     Distance = None  # type: ignore
-import math
 
+from apps.users.models import UserRole
+from foodradar.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    keyset_slice,
+    page_size_from,
+)
+from foodradar.renderers import ORJSONRenderer
+from . import cache as tile_cache
+from . import menu_cache
 from .models import Restaurant, Dish
+from .search import nearby_restaurant_ids
 from .serializers import RestaurantListSerializer, RestaurantMenuSerializer
 
 
+def _postgis_nearby(lat: float, lon: float, radius: float):
+    """
+    QuerySet активных ресторанов в радиусе (км) по возрастанию дистанции; None — PostGIS недоступен.
+    """
+    user_point = GeoPoint(lon, lat, srid=4326) if GeoPoint else None
+    if Distance and D and user_point is not None:
+        try:
+            return (
+                Restaurant.objects.filter(is_active=True, location__isnull=False)
+                .annotate(distance=Distance("location", user_point))
+                .filter(location__distance_lte=(user_point, D(km=radius)))
+                .order_by("distance")
+            )
+        except Exception:
+            pass
+    return None
+
+
+def _nearby_restaurants(lat: float, lon: float, radius: float):
+    """Активные рестораны в радиусе (км) от точки, по возрастанию дистанции. PostGIS или фолбэк."""
+    qs = _postgis_nearby(lat, lon, radius)
+    if qs is not None:
+        return qs
+    # Фолбэк: радиус-запрос к in-process индексу, из БД тянем только попавших
+    return _load_hits(nearby_restaurant_ids(lat, lon, radius))
+
+
+def _load_hits(hits):
+    """
+    [(дистанция_км, id)] -> рестораны в том же порядке с distance; отставшие от индекса пропускаем.
+    """
+    base = Restaurant.objects.filter(is_active=True).only(
+        "id", "name", "lat", "lon", "address", "is_active", "rating_count", "rating_sum"
+    )
+    by_id = base.in_bulk([pk for _, pk in hits])
+    enriched = []
+    for dist_km, pk in hits:
+        r = by_id.get(pk)
+        if r is None:  # индекс чуть отстал от БД (удален/деактивирован в другом процессе)
+            continue
+        # Проставим distance в МЕТРАХ для сериализатора (он приведет к км)
+        r.distance = float(dist_km) * 1000.0
+        enriched.append(r)
+    return enriched
+
+
+def _serialized_nearby(lat: float, lon: float, radius: float):
+    return RestaurantListSerializer(_nearby_restaurants(lat, lon, radius), many=True).data
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def restaurants_list(request: Request):
     """
     Список активных ресторанов рядом с точкой (lat, lon) в радиусе (км).
     Пример: /api/v1/restaurants?lat=55.75&lon=37.62&radius=5
-    Если координаты не заданы — вернем все активные без сортировки по дистанции.
+    Если координаты не заданы — вернем все активные по id. Гео-выдача идет через тайловый кэш
+    (см. cache.py). Пагинация keyset: page_size (по умолчанию PAGE_SIZE), cursor — токен из поля
+    next прошлой страницы. Ключ курсора — (дистанция, id) для гео-запроса и id без координат.
     """
     lat = request.query_params.get("lat")
     lon = request.query_params.get("lon")
     radius = float(request.query_params.get("radius", 5))
+    size = page_size_from(request.query_params.get("page_size"))
+    try:
+        position = decode_cursor(request.query_params.get("cursor"))
+        after_id = int(position["id"]) if position else None
+        after_d = float(position["d"]) if position and lat and lon else None
+    except (InvalidCursor, KeyError, TypeError, ValueError):
+        return Response({"detail": "Некорректный cursor"}, status=status.HTTP_400_BAD_REQUEST)
 
-    qs = Restaurant.objects.filter(is_active=True)
+    if not (lat and lon):
+        qs = Restaurant.objects.filter(is_active=True).order_by("id")
+        if after_id is not None:
+            qs = qs.filter(id__gt=after_id)
+        rows = list(qs[: size + 1])
+        next_cursor = encode_cursor({"id": rows[size - 1].id}) if len(rows) > size else None
+        return Response(
+            {"results": RestaurantListSerializer(rows[:size], many=True).data, "next": next_cursor}
+        )
 
-    if lat and lon:
-        try:
-            lat_f = float(lat)
-            lon_f = float(lon)
-        except ValueError:
-            return Response({"detail": "lat/lon должны быть числами"}, status=status.HTTP_400_BAD_REQUEST)
-        user_point = GeoPoint(lon_f, lat_f, srid=4326) if GeoPoint else None
-        used_fallback = False
-        if Distance and D and user_point is not None:
-            try:
-                qs = (
-                    qs.filter(location__isnull=False)
-                    .annotate(distance=Distance("location", user_point))
-                    .filter(location__distance_lte=(user_point, D(km=radius)))
-                    .order_by("distance")
-                )
-            except Exception:
-                used_fallback = True
-        else:
-            used_fallback = True
-
-        if used_fallback:
-            # Фолбэк: фильтруем и сортируем по Хаверсину на питоне
-            def _haversine_km(lat1, lon1, lat2, lon2):
-                R = 6371.0
-                phi1, phi2 = math.radians(lat1), math.radians(lat2)
-                dphi = math.radians(lat2 - lat1)
-                dl = math.radians(lon2 - lon1)
-                a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-                return 2 * R * math.asin(math.sqrt(a))
-
-            base = qs.only("id", "name", "lat", "lon", "address", "is_active")
-            enriched = []
-            for r in base:
-                if r.lat is None or r.lon is None:
-                    continue
-                dist_km = _haversine_km(lat_f, lon_f, r.lat, r.lon)
-                if dist_km <= radius:
-                    # Проставим distance в МЕТРАХ для сериализатора (он приведет к км)
-                    try:
-                        setattr(r, "distance", float(dist_km) * 1000.0)
-                    except Exception:
-                        pass
-                    enriched.append((dist_km, r))
-            enriched.sort(key=lambda x: x[0])
-            qs = [r for _, r in enriched]
-    data = RestaurantListSerializer(qs, many=True).data if not isinstance(qs, list) else RestaurantListSerializer(qs, many=True).data
-    return Response({"results": data})
+    try:
+        lat_f = float(lat)
+        lon_f = float(lon)
+    except ValueError:
+        return Response(
+            {"detail": "lat/lon должны быть числами"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    after = (after_d, after_id) if position else None
+
+    if tile_cache.radius_bucket(radius) is None:
+        # Большой радиус — мимо кэша. Под PostGIS отдаем страницу прямо из SQL: keyset + LIMIT
+        qs = _postgis_nearby(lat_f, lon_f, radius)
+        if qs is not None:
+            return _postgis_page(qs, after, size)
+        return _fallback_page(lat_f, lon_f, radius, after, size)
+
+    ranked = tile_cache.nearby(lat_f, lon_f, radius, _serialized_nearby)
+
+    page, last = keyset_slice(ranked, lambda r: (r[0], r[1]["id"]), after, size)
+    next_cursor = encode_cursor({"d": last[0], "id": last[1]}) if last else None
+    return Response({"results": [item for _, item in page], "next": next_cursor})
+
+
+def _fallback_page(lat: float, lon: float, radius: float, after, size: int) -> Response:
+    """
+    Страница гео-выдачи без PostGIS и без кэша: keyset по списку (дистанция, id) из индекса, из БД
+    и в сериализатор — только строки страницы, а не все попадания в радиус.
+    """
+    hits = sorted((float(d), pk) for d, pk in nearby_restaurant_ids(lat, lon, radius))
+    page, last = keyset_slice(hits, lambda h: h, after, size)
+    rows = RestaurantListSerializer(_load_hits(page), many=True).data
+    next_cursor = encode_cursor({"d": last[0], "id": last[1]}) if last else None
+    return Response({"results": rows, "next": next_cursor})
+
+
+def _postgis_page(qs, after, size: int) -> Response:  # pragma: no cover - нужен PostGIS
+    """Страница гео-выдачи из PostGIS. В курсоре — точная дистанция в метрах, как ее считает БД."""
+    qs = qs.order_by("distance", "id")
+    if after is not None:
+        d_m, pk = after
+        qs = qs.filter(Q(distance__gt=D(m=d_m)) | Q(distance=D(m=d_m), id__gt=pk))
+    rows = list(qs[: size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        last = rows[size - 1]
+        next_cursor = encode_cursor({"d": last.distance.m, "id": last.id})
+    return Response(
+        {"results": RestaurantListSerializer(rows[:size], many=True).data, "next": next_cursor}
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def restaurants_cache_stats(request: Request):
+    """Счетчики hit/miss тайлового кэша — чтобы подбирать размер тайла/TTL. Только для админов."""
+    user = request.user
+    if not (user.is_staff or getattr(user, "role", None) == UserRole.ADMIN):
+        return Response({"detail": "Только для администраторов."}, status=status.HTTP_403_FORBIDDEN)
+    return Response(tile_cache.stats())
 
 
 @api_view(["GET"])
@@ -93,22 +182,54 @@ def restaurants_list(request: Request):
 def restaurant_menu(request: Request, id: int):  # noqa: A002 - коротко и по делу
     """
     Меню ресторана. Фильтрация по аллергенам: exclude_allergens=peanut,gluten
+    Ответ кэшируется целиком по версии меню; на If-None-Match с актуальным ETag — 304 без запросов в
+    БД.
     """
-    restaurant = get_object_or_404(Restaurant.objects.filter(is_active=True), pk=id)
-    exclude_raw = request.query_params.get("exclude_allergens", "")
-    exclude: List[str] = [x.strip() for x in exclude_raw.split(",") if x.strip()]
-
-    dishes_qs = restaurant.dishes.filter(is_available=True)
-    # Для JSONB c массивом строк самый простой путь — фильтровать на приложении. Для MVP окей.
-    if exclude:
-        dishes = [d for d in dishes_qs if not set(map(str.lower, d.allergens or [])).intersection(set(map(str.lower, exclude)))]
-    else:
-        dishes = list(dishes_qs)
-
-    # Вручную собираем сериализатор меню (включая вложенные блюда)
-    restaurant_data = RestaurantMenuSerializer(restaurant).data
-    restaurant_data["dishes"] = [
-        {"id": d.id, "name": d.name, "price": d.price, "allergens": d.allergens, "is_available": d.is_available}
-        for d in dishes
-    ]
-    return Response(restaurant_data)
+    variant = menu_cache.variant_of(request.query_params.get("exclude_allergens", "").split(","))
+    version = menu_cache.menu_version(id)
+    if version is None:
+        # Версию заводим только для живого ресторана: на случайный id — 404 без ключа в кэше
+        if not Restaurant.objects.filter(pk=id, is_active=True).exists():
+            raise Http404
+        version = menu_cache.ensure_menu_version(id)
+    etag = menu_cache.etag_for(id, version, variant)
+    if etag in _parse_if_none_match(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    body = menu_cache.get_rendered(id, version, variant)
+    if body is None:
+        base = menu_cache.get_base(id, version)
+        if base is not None:
+            data = menu_cache.filter_allergens(base, variant)
+        elif not variant:
+            data = base = _menu_from_db(id, Dish.objects.filter(is_available=True))
+            menu_cache.set_base(id, version, base)
+        else:
+            # Базы в кэше нет — фильтруем в БД по битовой маске, неизвестные аллергены добиваем тут
+            mask, unknown = menu_cache.exclusion_of(variant)
+            data = _menu_from_db(id, Dish.objects.filter(is_available=True).without_allergens(mask))
+            if unknown:
+                data = menu_cache.filter_allergens(data, variant)
+        body = ORJSONRenderer().render(data)
+        menu_cache.set_rendered(id, version, variant, body)
+
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
+def _menu_from_db(restaurant_id: int, dishes_qs) -> dict:
+    restaurant = get_object_or_404(
+        Restaurant.objects.filter(is_active=True).prefetch_related(
+            Prefetch("dishes", queryset=dishes_qs.order_by("id"))
+        ),
+        pk=restaurant_id,
+    )
+    return dict(RestaurantMenuSerializer(restaurant).data)
+
+
+def _parse_if_none_match(header: str) -> set[str]:
+    # Слабые валидаторы (W/"...") для GET сравниваем как сильные — так велит RFC 9110
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
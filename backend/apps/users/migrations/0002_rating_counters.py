@@ -0,0 +1,23 @@
+# Generated by Django 4.2.14 on 2026-10-17 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='courier_rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок курьера'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='courier_rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма звезд курьера'),
+        ),
+    ]
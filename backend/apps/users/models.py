@@ -61,6 +61,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField("Активен", default=True)
     is_staff = models.BooleanField("Сотрудник", default=False)
     date_joined = models.DateTimeField("Создан", auto_now_add=True)
+    # Оценки курьера (см. orders.ratings): счетчики вместо AVG по Rating на каждый показ
+    courier_rating_count = models.PositiveIntegerField("Оценок курьера", default=0)
+    courier_rating_sum = models.PositiveIntegerField("Сумма звезд курьера", default=0)
 
     objects = UserManager()
 
@@ -71,5 +74,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
 
+    @property
+    def courier_rating_avg(self) -> float | None:
+        if not self.courier_rating_count:
+            return None
+        return round(self.courier_rating_sum / self.courier_rating_count, 2)
+
     def __str__(self) -> str:  # pragma: no cover
         return self.email
@@ -0,0 +1,35 @@
+"""
+JWT для WebSocket: браузер не умеет слать заголовок Authorization при открытии сокета, поэтому токен
+(тот же access из simplejwt) приходит в query string: /ws/...?token=<access>. Без токена или с битым
+токеном оставляем того пользователя, что положил AuthMiddlewareStack (сессия/аноним).
+"""
+from __future__ import annotations
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+
+@database_sync_to_async
+def _user_from_token(raw: str):
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from rest_framework.exceptions import AuthenticationFailed
+
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+class JWTQueryAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get("query_string", b"").decode())
+        token = (params.get("token") or [None])[0]
+        if token:
+            user = await _user_from_token(token)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
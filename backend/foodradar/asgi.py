@@ -12,6 +12,9 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodradar.settings")
 
 django_asgi_app = get_asgi_application()
 
+# Только после инициализации Django
+from apps.users.ws_auth import JWTQueryAuthMiddleware  # noqa: E402
+
 # Импорт маршрутов WebSocket (ленивая загрузка, чтобы избежать циклов импортов)
 try:
     from .routing import websocket_urlpatterns  # type: ignore
@@ -20,5 +23,6 @@ except Exception:  # в ранней стадии проект может быт
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+    # Сессия (AuthMiddlewareStack) + JWT из ?token= — им пользуются SPA и дашборды ресторанов
+    "websocket": AuthMiddlewareStack(JWTQueryAuthMiddleware(URLRouter(websocket_urlpatterns))),
 })
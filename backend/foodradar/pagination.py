@@ -0,0 +1,108 @@
+"""
+Keyset (cursor) пагинация без OFFSET: клиент получает непрозрачный токен next и присылает его как
+cursor. Токен — base64(JSON) с ключом последней отданной строки; подписывать нечего, это просто
+позиция.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+T = TypeVar("T")
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Битый или чужой cursor — вьюхи отвечают на него 400."""
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    raw = json.dumps(position, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(raw)
+    except Exception as e:
+        raise InvalidCursor("Некорректный cursor") from e
+    if not isinstance(position, dict):
+        raise InvalidCursor("Некорректный cursor")
+    return position
+
+
+def page_size_from(
+    raw: Optional[str], default: Optional[int] = None, max_size: int = MAX_PAGE_SIZE
+) -> int:
+    """
+    page_size из query-параметра: по умолчанию — REST_FRAMEWORK.PAGE_SIZE, зажимаем в [1, max_size].
+    """
+    if default is None:
+        default = int(getattr(settings, "REST_FRAMEWORK", {}).get("PAGE_SIZE") or 20)
+    try:
+        size = int(raw) if raw is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(max_size, size))
+
+
+def keyset_slice(
+    rows: Sequence[T],
+    key: Callable[[T], Tuple],
+    after: Optional[Tuple],
+    size: int,
+) -> Tuple[List[T], Optional[Tuple]]:
+    """
+    Страница из уже отсортированного по key списка: строки строго после after, не больше size.
+    Возвращает (страница, ключ последней строки или None, если дальше ничего нет).
+    """
+    start = 0
+    if after is not None:
+        # Список отсортирован — ищем первую позицию после курсора бинарным поиском
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key(rows[mid]) <= after:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = lo
+    page = list(rows[start:start + size])
+    has_more = start + size < len(rows)
+    return page, (key(page[-1]) if has_more and page else None)
+
+
+def keyset_filter(
+    qs: QuerySet, fields: Sequence[str], after: Optional[Sequence], descending: bool = False
+) -> QuerySet:
+    """
+    Сортировка queryset по fields (все по возрастанию или все по убыванию) и seek строго после
+    позиции after — лексикографическое сравнение кортежей, раскрытое в OR-цепочку: его понимает
+    любой составной индекс.
+    """
+    qs = qs.order_by(*(f"-{f}" if descending else f for f in fields))
+    if after is None:
+        return qs
+    op = "lt" if descending else "gt"
+    cond = Q()
+    for i, field in enumerate(fields):
+        eq = {f: v for f, v in zip(fields[:i], after[:i])}
+        cond |= Q(**eq, **{f"{field}__{op}": after[i]})
+    return qs.filter(cond)
+
+
+def bounded_count(qs: QuerySet, cap: int = 1000) -> Tuple[int, bool]:
+    """
+    Счетчик без полного прохода: считаем не больше cap + 1 строк. Возвращает (число, точное ли оно);
+    если строк больше cap — (cap, False), клиенту этого хватает, чтобы написать «1000+».
+    """
+    n = qs.order_by()[: cap + 1].count()
+    return (n, True) if n <= cap else (cap, False)
@@ -0,0 +1,33 @@
+"""
+JSON-парсер на orjson. Без orjson — стандартный JSONParser.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import ORJSONRenderer
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - окружение без orjson
+    orjson = None  # type: ignore
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        raw = stream.read() if stream is not None else b""
+        try:
+            if encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+                raw = raw.decode(encoding)
+            # NaN/Infinity orjson и так не принимает — это совпадает со STRICT_JSON
+            return orjson.loads(raw)
+        except (orjson.JSONDecodeError, UnicodeDecodeError, LookupError) as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,38 @@
+"""
+JSON-рендерер на orjson для всего DRF API. Формат ответа — тот же, что у стандартного JSONRenderer:
+Decimal -> число, datetime -> ISO 8601 с «Z» для UTC, ленивые строки/UUID/QuerySet — через
+DRF-энкодер. Без orjson (или когда просят отступы — Browsable API, ?indent — либо выключены
+COMPACT/UNICODE_JSON) работаем как обычный JSONRenderer.
+"""
+from __future__ import annotations
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - окружение без orjson
+    orjson = None  # type: ignore
+
+# Даты и времена — DRF-энкодеру: у orjson свой формат (микросекунды, смещения), а контракт API
+# менять незачем
+_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+_default = encoders.JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Чего orjson не умеет (целые больше 64 бит и т.п.) — отдаем stdlib
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и DRF: U+2028/U+2029 экранируем, чтобы ответ оставался валидным JS
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
@@ -1,5 +1,6 @@
 """
-Сборка WebSocket-маршрутов проекта. По MVP трекаем заказ: /ws/track/<order_id>
+Сборка WebSocket-маршрутов проекта: трекинг заказа /ws/track/<order_id>/,
+лента входящих заказов ресторана /ws/restaurant/orders/, поток GPS курьера /ws/courier/location/
 """
 from __future__ import annotations
 
@@ -7,12 +8,24 @@ from django.urls import path
 
 # Заглушка: реальные консюмеры подцепим из apps.orders
 try:
-    from apps.orders.consumers import OrderTrackerConsumer  # type: ignore
+    from apps.orders.consumers import OrderTrackerConsumer, RestaurantOrdersConsumer  # type: ignore
 except Exception:
-    OrderTrackerConsumer = None  # type: ignore
+    OrderTrackerConsumer = RestaurantOrdersConsumer = None  # type: ignore
+
+try:
+    from apps.courier.consumers import CourierLocationConsumer  # type: ignore
+except Exception:
+    CourierLocationConsumer = None  # type: ignore
 
 websocket_urlpatterns = []
 if OrderTrackerConsumer is not None:
     websocket_urlpatterns = [
         path("ws/track/<int:order_id>/", OrderTrackerConsumer.as_asgi(), name="ws-track-order"),
+        path(
+            "ws/restaurant/orders/", RestaurantOrdersConsumer.as_asgi(), name="ws-restaurant-orders"
+        ),
     ]
+if CourierLocationConsumer is not None:
+    websocket_urlpatterns.append(
+        path("ws/courier/location/", CourierLocationConsumer.as_asgi(), name="ws-courier-location")
+    )
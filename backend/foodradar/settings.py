@@ -6,6 +6,7 @@ from __future__ import annotations
 import os
 from pathlib import Path
 import environ
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,6 +33,13 @@ USE_TZ = True
 # Флаги окружения
 USE_GIS = env("USE_GIS", default="0") == "1"
 
+# Гео-фолбэк без PostGIS: in-process сеточный индекс ресторанов (размер ячейки в градусах, TTL
+# перестройки в сек.). GEO_INMEMORY_INDEX=0 — без индекса в памяти: bbox-отбор в SQL по частичному
+# индексу (lat, lon) среди активных + точная дистанция
+GEO_INMEMORY_INDEX = env("GEO_INMEMORY_INDEX", default="1") == "1"
+GEO_INDEX_CELL_DEG = float(env("GEO_INDEX_CELL_DEG", default=0.01))
+GEO_INDEX_TTL = float(env("GEO_INDEX_TTL", default=300))
+
 # Приложения
 INSTALLED_APPS = [
     # Django
@@ -138,10 +146,104 @@ else:
         "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
     }
 
+# Кэш: Redis, если задан, иначе — память процесса (локально/в тестах)
+_cache_url = env("CACHE_REDIS_URL", default=None) or env("REDIS_URL", default=None)
+if _cache_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": _cache_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "foodradar",
+        }
+    }
+
+# Тайловый кэш «рестораны рядом»: тайл (градусы), бакеты радиуса (км; больше — без кэша), TTL (сек.)
+GEO_CACHE_TILE_DEG = float(env("GEO_CACHE_TILE_DEG", default=0.01))
+GEO_CACHE_RADIUS_BUCKETS_KM = (1, 2, 3, 5, 7, 10)
+GEO_CACHE_TTL = int(env("GEO_CACHE_TTL", default=300))
+
 # Celery: если нет Redis — гоняем задачи синхронно (eager), это облегчает локальные прогоны без докера
 CELERY_BROKER_URL = env("REDIS_URL", default=None) or env("CHANNEL_REDIS_URL", default=None)
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 CELERY_TASK_ALWAYS_EAGER = not bool(CELERY_BROKER_URL)
+# Периодические задачи (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    "purge-idempotency-keys": {
+        "task": "apps.orders.tasks.purge_idempotency_keys",
+        "schedule": 3600.0,
+    },
+    "archive-finished-orders": {
+        "task": "apps.orders.tasks.archive_finished_orders",
+        "schedule": 6 * 3600.0,
+    },
+    "flush-courier-locations": {
+        "task": "apps.courier.tasks.flush_courier_locations",
+        "schedule": 2.0,
+    },
+    "maintain-courier-tracks": {
+        "task": "apps.courier.tasks.maintain_courier_tracks",
+        "schedule": 3600.0,
+    },
+}
+
+# GPS курьеров write-behind (см. courier/buffer.py): точки копятся в буфере и пишутся пачками по
+# FLUSH_BATCH. Буфер — Redis (BUFFER_URL, по умолчанию Redis кэша) или память процесса с фоновым
+# сбросом раз в FLUSH_INTERVAL сек.; дорос до BUFFER_MAX — сбрасываем прямо в запросе
+COURIER_LOCATION_WRITE_BEHIND = env("COURIER_LOCATION_WRITE_BEHIND", default="0") == "1"
+COURIER_LOCATION_BUFFER_URL = env("COURIER_LOCATION_BUFFER_URL", default=None) or _cache_url
+COURIER_LOCATION_FLUSH_BATCH = int(env("COURIER_LOCATION_FLUSH_BATCH", default=5000))
+COURIER_LOCATION_FLUSH_INTERVAL = float(env("COURIER_LOCATION_FLUSH_INTERVAL", default=2))
+COURIER_LOCATION_BUFFER_MAX = int(env("COURIER_LOCATION_BUFFER_MAX", default=100_000))
+
+# Раздача координат по трекерам заказов (см. courier/fanout.py): не больше MAX_PER_SEC обновлений в
+# секунду на заказ, промежуточные точки схлопываются; 0 или нет общего Redis (REDIS_URL) — без
+# схлопывания, сообщение на каждый пинг
+COURIER_FANOUT_MAX_PER_SEC = float(env("COURIER_FANOUT_MAX_PER_SEC", default=2))
+COURIER_FANOUT_REDIS_URL = env("COURIER_FANOUT_REDIS_URL", default=None) or _cache_url
+
+# Поток GPS по WebSocket (см. courier/consumers.py): на соединение — очередь до QUEUE_MAX кадров,
+# запись пачками до BATCH точек (и не больше BATCH в кадре); очередь полна дольше PUT_TIMEOUT сек. —
+# кадр отбрасываем и шлем клиенту slow_down; упавшую запись повторяем WRITE_RETRIES раз
+COURIER_WS_QUEUE_MAX = int(env("COURIER_WS_QUEUE_MAX", default=256))
+COURIER_WS_BATCH = int(env("COURIER_WS_BATCH", default=100))
+COURIER_WS_PUT_TIMEOUT = float(env("COURIER_WS_PUT_TIMEOUT", default=1))
+COURIER_WS_DRAIN_TIMEOUT = float(env("COURIER_WS_DRAIN_TIMEOUT", default=5))
+COURIER_WS_WRITE_RETRIES = int(env("COURIER_WS_WRITE_RETRIES", default=2))
+
+# История GPS (см. courier/tracks.py): точки старше COMPACT_AFTER_MIN сжимаются в CourierTrack
+# (Дуглас — Пекер с допуском TOLERANCE_M, отрезки рвутся на паузах > GAP_SEC); сжатые сырые точки
+# живут RETENTION_HOURS
+COURIER_TRACK_COMPACT_AFTER_MIN = float(env("COURIER_TRACK_COMPACT_AFTER_MIN", default=60))
+COURIER_TRACK_GAP_SEC = float(env("COURIER_TRACK_GAP_SEC", default=600))
+COURIER_TRACK_TOLERANCE_M = float(env("COURIER_TRACK_TOLERANCE_M", default=15))
+COURIER_TRACK_MAX_POINTS = int(env("COURIER_TRACK_MAX_POINTS", default=50_000))
+COURIER_TRACK_DELETE_BATCH = int(env("COURIER_TRACK_DELETE_BATCH", default=5000))
+COURIER_LOCATION_RETENTION_HOURS = float(env("COURIER_LOCATION_RETENTION_HOURS", default=24))
+# Офлайн-точки старше этого (время устройства) батч и WS отклоняют
+COURIER_LOCATION_MAX_AGE_HOURS = float(
+    env("COURIER_LOCATION_MAX_AGE_HOURS", default=COURIER_LOCATION_RETENTION_HOURS)
+)
+
+# Архив заказов: доставленные/отмененные старше N дней уезжают в архивные таблицы пачками по BATCH;
+# MAX_BATCHES ограничивает один прогон beat-задачи (пусто — до конца)
+ORDER_ARCHIVE_AFTER_DAYS = int(env("ORDER_ARCHIVE_AFTER_DAYS", default=90))
+ORDER_ARCHIVE_BATCH = int(env("ORDER_ARCHIVE_BATCH", default=500))
+ORDER_ARCHIVE_MAX_BATCHES = int(env("ORDER_ARCHIVE_MAX_BATCHES", default=200)) or None
+
+# Лента /orders/incoming: с курсора последней страницы перечитываем столько секунд назад, чтобы не
+# потерять заказы, закоммиченные не в порядке updated_at; больше самой долгой транзакции заказа
+ORDER_FEED_OVERLAP_SEC = float(env("ORDER_FEED_OVERLAP_SEC", default=5))
+
+# Idempotency-Key для POST /orders и /orders/<id>/pay: сколько хранить ответ (сек.)
+# и сколько параллельный дубль ждет завершения первого запроса, прежде чем получить 409
+IDEMPOTENCY_TTL = int(env("IDEMPOTENCY_TTL", default=24 * 3600))
+IDEMPOTENCY_WAIT = float(env("IDEMPOTENCY_WAIT", default=5))
 
 # DRF
 REST_FRAMEWORK = {
@@ -153,6 +255,16 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
         "rest_framework.filters.SearchFilter",
     ),
+    # JSON через orjson (см. foodradar/renderers.py); без orjson — тот же stdlib-вывод
+    "DEFAULT_RENDERER_CLASSES": (
+        "foodradar.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "foodradar.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
@@ -169,6 +281,7 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 # CORS — для удобства в деве разрешим всё
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 # Stripe
 STRIPE_SECRET_KEY = env("STRIPE_SECRET_KEY", default="")
@@ -32,3 +32,25 @@ def auth_client(api_client):
         return api_client
 
     return _make
+
+
+@pytest.fixture(autouse=True)
+def _reset_process_state():
+    """
+    In-process гео-индекс, буфер GPS-точек и локальный кэш живут между тестами — сбрасываем,
+    чтобы не тащить чужие данные.
+    """
+    from django.core.cache import cache  # noqa: WPS433
+    from apps.courier import buffer as location_buffer  # noqa: WPS433
+    from apps.courier import fanout as location_fanout  # noqa: WPS433
+    from apps.restaurants.search import restaurant_index  # noqa: WPS433
+
+    restaurant_index.reset()
+    location_buffer.reset()
+    location_fanout.reset()
+    cache.clear()
+    yield
+    restaurant_index.reset()
+    location_buffer.reset()
+    location_fanout.reset()
+    cache.clear()
@@ -3,12 +3,13 @@ from __future__ import annotations
 from decimal import Decimal
 import uuid
 import factory
+from django.utils import timezone
 from factory.django import DjangoModelFactory
 
 from apps.users.models import User, UserRole
 from apps.restaurants.models import Restaurant, Dish
 from apps.orders.models import Order, OrderItem
-from apps.courier.models import CourierLocation
+from apps.courier.models import CourierLocation, CourierPosition
 
 
 class UserFactory(DjangoModelFactory):
@@ -74,3 +75,13 @@ class CourierLocationFactory(DjangoModelFactory):
     courier = factory.SubFactory(CourierFactory)
     lat = 55.75
     lon = 37.61
+
+
+class CourierPositionFactory(DjangoModelFactory):
+    class Meta:
+        model = CourierPosition
+
+    courier = factory.SubFactory(CourierFactory)
+    lat = 55.75
+    lon = 37.61
+    ts = factory.LazyFunction(timezone.now)
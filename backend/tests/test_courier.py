@@ -11,6 +11,7 @@ from .factories import (
     RestaurantFactory,
     OrderFactory,
     CourierLocationFactory,
+    CourierPositionFactory,
 )
 
 
@@ -46,8 +47,8 @@ def test_courier_accept_order_success(api_client, auth_client, monkeypatch):
 def test_available_orders_sorted_by_distance(api_client, auth_client):
     from rest_framework import status
     courier = CourierFactory()
-    # Последняя локация курьера — центр
-    CourierLocationFactory(courier=courier, lat=55.75, lon=37.61)
+    # Текущая позиция курьера — центр
+    CourierPositionFactory(courier=courier, lat=55.75, lon=37.61)
 
     # Ближний ресторан
     near = RestaurantFactory(lat=55.751, lon=37.62)
@@ -87,3 +88,369 @@ def test_post_location_switches_in_transit(api_client, auth_client, monkeypatch)
     assert resp.status_code == status.HTTP_201_CREATED
     order.refresh_from_db()
     assert order.status == OrderStatus.IN_TRANSIT
+
+
+@pytest.mark.django_db
+def test_available_orders_radius_cuts_far_restaurants(api_client, auth_client):
+    from rest_framework import status
+    courier = CourierFactory()
+    CourierPositionFactory(courier=courier, lat=55.75, lon=37.61)
+    near = OrderFactory(
+        restaurant=RestaurantFactory(lat=55.751, lon=37.62), status=OrderStatus.READY_FOR_PICKUP
+    )
+    OrderFactory(
+        restaurant=RestaurantFactory(lat=55.0, lon=38.0), status=OrderStatus.READY_FOR_PICKUP
+    )
+
+    c = auth_client(courier)
+    resp = c.get("/api/v1/courier/orders/available", {"radius": 5})
+    assert resp.status_code == status.HTTP_200_OK
+    assert [r["id"] for r in resp.json()["results"]] == [near.id]
+
+
+@pytest.mark.django_db
+def test_post_location_write_behind_buffers_and_flushes(auth_client, settings, monkeypatch):
+    from rest_framework import status
+    from apps.courier.buffer import flush_locations
+    from apps.courier.models import CourierLocation
+    from apps.orders import tasks as order_tasks
+    settings.COURIER_LOCATION_WRITE_BEHIND = True
+    settings.COURIER_LOCATION_BUFFER_URL = None
+    settings.COURIER_LOCATION_FLUSH_INTERVAL = 0  # без фонового потока — сбрасываем явно
+    settings.COURIER_LOCATION_FLUSH_BATCH = 2
+    sent = []
+    monkeypatch.setattr(order_tasks.broadcast_order_event, "delay", lambda *a, **k: sent.append(a))
+    courier = CourierFactory()
+    order = OrderFactory(courier=courier, status=OrderStatus.IN_TRANSIT)
+
+    c = auth_client(courier)
+    stamps = []
+    for i in range(5):
+        resp = c.post("/api/v1/courier/location", {"lat": 55.75 + i / 1000, "lon": 37.61})
+        assert resp.status_code == status.HTTP_202_ACCEPTED
+        stamps.append(resp.json()["ts"])
+    assert not CourierLocation.objects.exists()
+    assert [a[1]["type"] for a in sent] == ["courier_location"] * 5 and sent[0][0] == order.id
+
+    assert flush_locations() == 5
+    rows = list(CourierLocation.objects.filter(courier=courier).order_by("ts"))
+    assert [r.ts.isoformat() for r in rows] == stamps
+    assert rows[-1].lat == pytest.approx(55.754)
+    assert flush_locations() == 0
+
+
+@pytest.mark.django_db
+def test_courier_position_upsert_ignores_stale_points(auth_client, settings):
+    from datetime import timedelta
+    from apps.courier.buffer import flush_locations
+    from apps.courier.models import CourierLocation, CourierPosition
+    from apps.courier.positions import upsert_positions
+    courier = CourierFactory()
+    c = auth_client(courier)
+    c.post("/api/v1/courier/location", {"lat": 55.7, "lon": 37.6})
+    pos = CourierPosition.objects.get(courier=courier)
+    assert (pos.lat, pos.lon) == (55.7, 37.6)
+
+    # Точка из прошлого (догнал офлайн-буфер) позицию не откатывает, свежая — сдвигает
+    upsert_positions([(courier.id, 1.0, 1.0, pos.ts - timedelta(minutes=5))])
+    assert CourierPosition.objects.get(courier=courier).lat == 55.7
+    upsert_positions(
+        [(courier.id, 55.8, 37.7, pos.ts + timedelta(seconds=1)), (courier.id, 2.0, 2.0, pos.ts)]
+    )
+    assert CourierPosition.objects.get(courier=courier).lat == 55.8
+
+    settings.COURIER_LOCATION_WRITE_BEHIND = True
+    settings.COURIER_LOCATION_BUFFER_URL = None
+    settings.COURIER_LOCATION_FLUSH_INTERVAL = 0
+    other = CourierFactory()
+    c = auth_client(other)
+    for lat in (50.1, 50.2, 50.3):
+        c.post("/api/v1/courier/location", {"lat": lat, "lon": 30.0})
+    assert not CourierPosition.objects.filter(courier=other).exists()
+    flush_locations()
+    assert CourierPosition.objects.get(courier=other).lat == 50.3
+    assert CourierLocation.objects.filter(courier=other).count() == 3
+
+
+@pytest.mark.django_db
+def test_track_maintenance_compacts_then_purges():
+    from datetime import timedelta
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.courier.models import CourierLocation, CourierTrack
+    from apps.courier.tracks import maintain
+    courier = CourierFactory()
+    now = timezone.now()
+    start = now - timedelta(days=3)
+    # Две поездки по прямой (пауза больше GAP) и свежие точки текущей поездки
+    for trip in range(2):
+        for i in range(20):
+            CourierLocationFactory(
+                courier=courier,
+                lat=55.75,
+                lon=37.61 + i * 0.0005,
+                ts=start + timedelta(hours=trip, seconds=10 * i),
+            )
+    for i in range(3):
+        CourierLocationFactory(courier=courier, ts=now - timedelta(minutes=i))
+
+    report = maintain(now=now)
+    assert report["tracks"] == 2 and report["points_in"] == 40 and report["points_kept"] == 4
+    assert (
+        report["rows_deleted"] == 40 and report["rows_left"] == 3 and report["bytes_reclaimed"] > 0
+    )
+    track = CourierTrack.objects.filter(courier=courier).order_by("started_at").first()
+    assert track.raw_count == 20 and len(track.points) == 2
+    assert CourierLocation.objects.filter(courier=courier).count() == 3
+
+    # Повторный прогон ничего не сжимает дважды
+    out = StringIO()
+    call_command("compact_courier_tracks", stdout=out)
+    assert CourierTrack.objects.count() == 2 and "Удалено строк: 0" in out.getvalue()
+
+    # Офлайн-догрузка со временем устройства позади сжатых треков: сначала в трек, потом удаление
+    for i in range(5):
+        CourierLocationFactory(courier=courier, ts=start + timedelta(minutes=30, seconds=10 * i))
+    report = maintain(now=now)
+    assert report["tracks"] == 1 and report["points_in"] == 5 and report["rows_deleted"] == 5
+    assert CourierTrack.objects.filter(courier=courier, raw_count=5).exists()
+    # Несжатое не удаляется, даже если старше окна ретенции
+    from apps.courier.tracks import purge_compacted_points
+    CourierLocationFactory(courier=courier, ts=start)
+    assert purge_compacted_points(now=now) == 0
+
+
+@pytest.mark.django_db
+def test_post_location_batch_keeps_device_ts_and_broadcasts_newest(auth_client, monkeypatch):
+    from datetime import timedelta
+    from rest_framework import status
+    from apps.courier.models import CourierLocation, CourierPosition
+    from apps.orders import tasks as order_tasks
+    sent = []
+    monkeypatch.setattr(order_tasks.broadcast_order_event, "delay", lambda *a, **k: sent.append(a))
+    courier = CourierFactory()
+    order = OrderFactory(courier=courier, status=OrderStatus.IN_TRANSIT)
+    now = timezone.now()
+    points = [
+        {"lat": 55.752, "lon": 37.61, "device_ts": (now - timedelta(seconds=s)).isoformat()}
+        for s in (20, 60, 40)
+    ]
+
+    c = auth_client(courier)
+    resp = c.post("/api/v1/courier/location/batch", points, format="json")
+    assert resp.status_code == status.HTTP_201_CREATED and resp.json()["accepted"] == 3
+    stamps = sorted(CourierLocation.objects.filter(courier=courier).values_list("ts", flat=True))
+    assert [(now - ts).total_seconds() for ts in stamps] == pytest.approx([60, 40, 20], abs=1e-3)
+    assert CourierPosition.objects.get(courier=courier).ts == stamps[-1]
+    assert len(sent) == 1 and sent[0][0] == order.id and sent[0][1]["ts"] == stamps[-1].isoformat()
+
+    # Пачка целиком старше текущей позиции: в историю пишем, трекинг не трогаем
+    old = [{"lat": 1.0, "lon": 1.0, "device_ts": (now - timedelta(hours=1)).isoformat()}]
+    resp = c.post("/api/v1/courier/location/batch", {"points": old}, format="json")
+    assert resp.status_code == status.HTTP_201_CREATED and len(sent) == 1
+    assert CourierPosition.objects.get(courier=courier).lat == 55.752
+
+    future = [{"lat": 1.0, "lon": 1.0, "device_ts": (now + timedelta(hours=1)).isoformat()}]
+    assert (
+        c.post("/api/v1/courier/location/batch", future, format="json").status_code
+        == status.HTTP_400_BAD_REQUEST
+    )
+    stale = [{"lat": 1.0, "lon": 1.0, "device_ts": "1970-01-01T00:00:00Z"}]
+    assert (
+        c.post("/api/v1/courier/location/batch", stale, format="json").status_code
+        == status.HTTP_400_BAD_REQUEST
+    )
+    assert (
+        c.post("/api/v1/courier/location/batch", [], format="json").status_code
+        == status.HTTP_400_BAD_REQUEST
+    )
+
+
+@pytest.mark.django_db
+def test_location_fanout_coalesces_per_window(auth_client, settings, monkeypatch):
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.courier import fanout
+    from apps.orders import tasks as order_tasks
+    settings.CELERY_TASK_ALWAYS_EAGER = False  # как с брокером: сброс откладывается на окно
+    settings.COURIER_FANOUT_REDIS_URL = None
+    settings.COURIER_FANOUT_MAX_PER_SEC = 2
+    scheduled, per_ping, groups = [], [], []
+    # Общий Redis подменяем одним хранилищем на «веб» и «воркер»
+    shared = fanout.LocalFanoutStore()
+    monkeypatch.setattr(fanout, "RedisFanoutStore", lambda url: shared)
+    monkeypatch.setattr(fanout, "_schedule_flush", scheduled.append)
+    monkeypatch.setattr(
+        order_tasks.broadcast_order_event, "delay", lambda *a, **k: per_ping.append(a)
+    )
+    monkeypatch.setattr(order_tasks, "broadcast_order_events", groups.extend)
+    courier = CourierFactory()
+    orders = [OrderFactory(courier=courier, status=OrderStatus.IN_TRANSIT) for _ in range(2)]
+
+    c = auth_client(courier)
+    # Брокер есть, общего Redis нет: память веб-процесса воркер не видит — шлем каждый пинг сразу
+    c.post("/api/v1/courier/location", {"lat": 55.7, "lon": 37.61})
+    assert len(per_ping) == 2 and scheduled == [] and fanout.flush() == 0
+    per_ping.clear()
+
+    settings.COURIER_FANOUT_REDIS_URL = "redis://fanout"
+    for i in range(5):
+        c.post("/api/v1/courier/location", {"lat": 55.75 + i / 100, "lon": 37.61})
+    assert scheduled == [0.5] and per_ping == []
+
+    assert fanout.flush() == 2
+    assert sorted(oid for oid, _ in groups) == sorted(o.id for o in orders)
+    assert [payload["lat"] for _, payload in groups] == pytest.approx([55.79, 55.79])
+    c.post("/api/v1/courier/location", {"lat": 55.8, "lon": 37.61})
+    assert len(scheduled) == 2
+
+    out = StringIO()
+    call_command(
+        "bench_location_fanout", "--couriers", "50", "--seconds", "5", "--ping-hz", "4", stdout=out
+    )
+    assert "сообщений в брокер" in out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_courier_location_websocket_acks_and_persists():
+    import json
+    from asgiref.sync import async_to_sync
+    from asgiref.testing import ApplicationCommunicator
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from apps.courier.models import CourierLocation, CourierPosition
+    from foodradar.asgi import application
+    courier = UserFactory(role=UserRole.COURIER)
+    client_token = str(RefreshToken.for_user(UserFactory()).access_token)
+    token = str(RefreshToken.for_user(courier).access_token)
+
+    def _socket(query: str = ""):
+        scope = {
+            "type": "websocket",
+            "path": "/ws/courier/location/",
+            "query_string": query.encode(),
+            "headers": [],
+        }
+        return ApplicationCommunicator(application, scope)
+
+    async def scenario():
+        for query in ("", f"token={client_token}"):
+            rejected = _socket(query)
+            await rejected.send_input({"type": "websocket.connect"})
+            assert (await rejected.receive_output(timeout=2))["type"] == "websocket.close"
+
+        ws = _socket(f"token={token}")
+        await ws.send_input({"type": "websocket.connect"})
+        assert (await ws.receive_output(timeout=2))["type"] == "websocket.accept"
+
+        await ws.send_input(
+            {"type": "websocket.receive", "text": json.dumps({"seq": 1, "lat": 200, "lon": 37.6})}
+        )
+        error = json.loads((await ws.receive_output(timeout=2))["text"])
+        assert error["type"] == "error" and error["seq"] == 1
+
+        frame = {"seq": 2, "points": [{"lat": 55.75, "lon": 37.61}, {"lat": 55.76, "lon": 37.62}]}
+        await ws.send_input({"type": "websocket.receive", "text": json.dumps(frame)})
+        ack = json.loads((await ws.receive_output(timeout=5))["text"])
+        assert ack == {"type": "ack", "seq": 2, "seqs": [2], "stored": 2}
+        await ws.send_input({"type": "websocket.disconnect", "code": 1000})
+        await ws.wait(timeout=5)
+
+    async_to_sync(scenario)()
+    assert CourierLocation.objects.filter(courier=courier).count() == 2
+    assert CourierPosition.objects.get(courier=courier).lat == pytest.approx(55.76)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_courier_location_websocket_backpressure_batches_and_retries(settings, monkeypatch):
+    import asyncio
+    import json
+    import threading
+    from asgiref.sync import async_to_sync
+    from asgiref.testing import ApplicationCommunicator
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from apps.courier import consumers
+    from foodradar.asgi import application
+    settings.COURIER_WS_QUEUE_MAX = 1
+    settings.COURIER_WS_BATCH = 3
+    settings.COURIER_WS_PUT_TIMEOUT = 0.05
+    courier = UserFactory(role=UserRole.COURIER)
+    token = str(RefreshToken.for_user(courier).access_token)
+    # Писатель «висит» на БД, пока не отпустим; fail — сколько следующих записей упадет
+    release, writes, fail, published = threading.Event(), [], [0], []
+
+    def stalled_store(user, points):
+        release.wait(5)
+        if fail[0]:
+            fail[0] -= 1
+            raise RuntimeError("db down")
+        writes.append(len(points))
+        return points[-1]
+
+    def broken_publish(user, newest):
+        published.append(newest)
+        raise RuntimeError("broker down")
+
+    monkeypatch.setattr(consumers, "store_points", stalled_store)
+    monkeypatch.setattr(consumers, "publish_newest", broken_publish)
+
+    def frame(seq: int, n: int = 1) -> dict:
+        return {
+            "type": "websocket.receive",
+            "text": json.dumps({"seq": seq, "points": [{"lat": 55.7, "lon": 37.6}] * n}),
+        }
+
+    async def reply(ws) -> dict:
+        return json.loads((await ws.receive_output(timeout=5))["text"])
+
+    async def scenario():
+        scope = {
+            "type": "websocket",
+            "path": "/ws/courier/location/",
+            "query_string": f"token={token}".encode(),
+        }
+        ws = ApplicationCommunicator(application, {**scope, "headers": []})
+        await ws.send_input({"type": "websocket.connect"})
+        assert (await ws.receive_output(timeout=2))["type"] == "websocket.accept"
+
+        # Кадр больше COURIER_WS_BATCH не принимаем
+        await ws.send_input(frame(0, n=4))
+        assert (await reply(ws))["type"] == "error"
+
+        # 1 — у писателя (висит), 2 — в очереди (на один кадр), 3 — места нет: отброшен, slow_down
+        await ws.send_input(frame(1))
+        await ws.send_input(frame(2, n=2))
+        await ws.send_input(frame(3))
+        assert await reply(ws) == {"type": "slow_down", "seq": 3, "dropped": 1}
+        release.set()
+        assert (await reply(ws))["seqs"] == [1]
+        assert await reply(ws) == {"type": "ack", "seq": 2, "seqs": [2], "stored": 2}
+
+        # Запись упала один раз — повтор; упала больше повторов — ошибка со всеми потерянными seq
+        fail[0] = 1
+        await ws.send_input(frame(4))
+        assert (await reply(ws))["seqs"] == [4]
+        fail[0] = settings.COURIER_WS_WRITE_RETRIES + 1
+        await ws.send_input(frame(5))
+        lost = await reply(ws)
+        assert lost["type"] == "error" and lost["seqs"] == [5]
+        await ws.send_input({"type": "websocket.disconnect", "code": 1000})
+        await ws.wait(timeout=5)
+
+        # Очередь пошире: пока писатель занят, кадры копятся и склеиваются целиком, до BATCH точек
+        settings.COURIER_WS_QUEUE_MAX = 4
+        release.clear()
+        ws = ApplicationCommunicator(application, {**scope, "headers": []})
+        await ws.send_input({"type": "websocket.connect"})
+        assert (await ws.receive_output(timeout=2))["type"] == "websocket.accept"
+        for seq, n in ((10, 1), (11, 2), (12, 1), (13, 1)):
+            await ws.send_input(frame(seq, n))
+        await asyncio.sleep(0.1)
+        release.set()
+        assert [(await reply(ws))["seqs"] for _ in range(3)] == [[10], [11, 12], [13]]
+        await ws.send_input({"type": "websocket.disconnect", "code": 1000})
+        await ws.wait(timeout=5)
+
+    async_to_sync(scenario)()
+    # Сбой раздачи после записи не повторяет запись: каждая пачка записана и раздана ровно раз
+    assert writes == [1, 2, 1, 1, 3, 1]
+    assert len(published) == len(writes)
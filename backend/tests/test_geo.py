@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from apps.geo import distance
+from apps.geo.distance import haversine_km, nearest
+from apps.geo.index import GridIndex
+
+
+def test_grid_index_matches_full_scan():
+    rnd = random.Random(42)
+    points = {pk: (rnd.uniform(55.5, 56.0), rnd.uniform(37.3, 37.9)) for pk in range(1, 2001)}
+    index = GridIndex(cell_deg=0.02)
+    index.bulk_load((pk, lat, lon) for pk, (lat, lon) in points.items())
+
+    for _ in range(20):
+        lat, lon, radius = rnd.uniform(55.5, 56.0), rnd.uniform(37.3, 37.9), rnd.uniform(0.5, 15)
+        expected = sorted(
+            (haversine_km(lat, lon, plat, plon), pk)
+            for pk, (plat, plon) in points.items()
+            if haversine_km(lat, lon, plat, plon) <= radius
+        )
+        assert [pk for _, pk in index.query(lat, lon, radius)] == [pk for _, pk in expected]
+
+
+def test_grid_index_upsert_moves_and_remove_drops():
+    index = GridIndex(cell_deg=0.05)
+    index.upsert(1, 55.75, 37.61)
+    assert [pk for _, pk in index.query(55.75, 37.61, 1)] == [1]
+
+    index.upsert(1, 59.93, 30.31)  # переехал в другой город
+    assert index.query(55.75, 37.61, 1) == []
+    assert [pk for _, pk in index.query(59.93, 30.31, 1)] == [1]
+
+    index.remove(1)
+    assert index.query(59.93, 30.31, 1) == []
+    assert len(index) == 0
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_nearest_radius_and_top_k(monkeypatch, use_numpy):
+    if use_numpy and distance.np is None:
+        pytest.skip("NumPy не установлен")
+    if not use_numpy:
+        monkeypatch.setattr(distance, "np", None)
+    rnd = random.Random(7)
+    lats = [rnd.uniform(55.5, 56.0) for _ in range(500)]
+    lons = [rnd.uniform(37.3, 37.9) for _ in range(500)]
+    brute = sorted(
+        (haversine_km(55.75, 37.61, la, lo), i) for i, (la, lo) in enumerate(zip(lats, lons))
+    )
+
+    within = nearest(55.75, 37.61, lats, lons, radius_km=10)
+    assert [i for i, _ in within] == [i for d, i in brute if d <= 10]
+    assert all(d == pytest.approx(haversine_km(55.75, 37.61, lats[i], lons[i])) for i, d in within)
+
+    top = nearest(55.75, 37.61, lats, lons, k=5)
+    assert [i for i, _ in top] == [i for _, i in brute[:5]]
+    assert nearest(55.75, 37.61, [], [], k=5) == []
+
+
+def test_douglas_peucker_keeps_corners_only():
+    from apps.geo.simplify import douglas_peucker
+    # Прямая на восток, поворот на север; шум ~1 м на прямых участках
+    lats = [55.75 + (0.00001 if i % 2 else 0) for i in range(10)] + [
+        55.75 + 0.001 * i for i in range(1, 10)
+    ]
+    lons = [37.61 + 0.001 * i for i in range(10)] + [37.619] * 9
+    kept = douglas_peucker(lats, lons, tolerance_m=5)
+    assert kept == [0, 9, 18]
+    # Маленький допуск сохраняет шум, но точные коллинеарные точки все равно уходят
+    assert douglas_peucker(lats, lons, tolerance_m=0.1) == list(range(10)) + [18]
+    assert douglas_peucker([1.0], [2.0], 5) == [0]
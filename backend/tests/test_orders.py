@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from .factories import UserFactory, DishFactory
+
+
+def test_orjson_renderer_matches_stdlib_output():
+    from django.utils.translation import gettext_lazy
+    from rest_framework.exceptions import ParseError
+    from rest_framework.renderers import JSONRenderer
+    from foodradar.parsers import ORJSONParser
+    from foodradar.renderers import ORJSONRenderer
+
+    data = {
+        "total": Decimal("12.50"),
+        "created_at": datetime(2024, 6, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+        "label": gettext_lazy("Борщ  "),
+        1: [None, True, 1.5],
+    }
+    body = ORJSONRenderer().render(data)
+    assert body == JSONRenderer().render(data)
+    assert ORJSONParser().parse(io.BytesIO(body)) == {
+        "total": 12.5,
+        "created_at": "2024-06-01T12:00:00.123456Z",
+        "label": "Борщ  ",
+        "1": [None, True, 1.5],
+    }
+    with pytest.raises(ParseError):
+        ORJSONParser().parse(io.BytesIO(b"{oops"))
+
+
+@pytest.mark.django_db
+def test_create_order_json_roundtrip(auth_client):
+    from rest_framework import status
+    user = UserFactory()
+    dish = DishFactory(price=Decimal("9.99"))
+
+    c = auth_client(user)
+    resp = c.post(
+        "/api/v1/orders",
+        {"restaurant_id": dish.restaurant_id, "items": [{"dish_id": dish.id, "qty": 2}]},
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_201_CREATED
+    assert resp["Content-Type"] == "application/json"
+    assert resp.json()["total"] == "19.98"
+
+    bad = c.post("/api/v1/orders", data=b"{oops", content_type="application/json")
+    assert bad.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("n_items", [1, 5])
+def test_create_order_query_count_does_not_grow_with_items(
+    auth_client, django_assert_num_queries, n_items
+):
+    from rest_framework import status
+    from apps.orders.models import Order
+    user = UserFactory()
+    first = DishFactory(price=Decimal("3.50"))
+    dishes = [first] + [DishFactory(restaurant=first.restaurant) for _ in range(n_items - 1)]
+    c = auth_client(user)
+
+    # auth-юзер, ресторан, блюда, SAVEPOINT, INSERT заказа, INSERT позиций, RELEASE
+    with django_assert_num_queries(7):
+        resp = c.post(
+            "/api/v1/orders",
+            {
+                "restaurant_id": first.restaurant_id,
+                "items": [{"dish_id": d.id, "qty": 2} for d in dishes],
+            },
+            format="json",
+        )
+    assert resp.status_code == status.HTTP_201_CREATED
+    body = resp.json()
+    assert [i["dish_name"] for i in body["items"]] == [d.name for d in dishes]
+    assert all(i["id"] for i in body["items"])
+    assert Order.objects.get(pk=body["id"]).total == sum(
+        (d.price * 2 for d in dishes), Decimal("0.00")
+    )
+
+
+@pytest.mark.django_db
+def test_list_my_orders_keyset_walk(auth_client, django_assert_num_queries):
+    from rest_framework import status
+    from apps.orders.models import Order
+    from .factories import OrderFactory, OrderItemFactory
+    user = UserFactory()
+    orders = [OrderFactory(client=user) for _ in range(7)]
+    # Часть заказов — с одинаковым created_at: порядок должен решать id
+    Order.objects.filter(pk__in=[o.pk for o in orders[:4]]).update(created_at=orders[0].created_at)
+    for o in orders:
+        OrderItemFactory.create_batch(2, order=o)
+    OrderFactory()  # чужой
+
+    c = auth_client(user)
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/orders/mine?page_size=3" + (f"&cursor={cursor}" if cursor else "")
+        # auth-юзер, заказы, позиции, блюда, архив (пустой — без prefetch) — на любой странице
+        with django_assert_num_queries(5):
+            resp = c.get(url)
+        assert resp.status_code == status.HTTP_200_OK
+        body = resp.json()
+        seen += [o["id"] for o in body["results"]]
+        assert all(len(o["items"]) == 2 for o in body["results"])
+        cursor = body["next"]
+        if not cursor:
+            break
+    expected = list(
+        Order.objects.filter(client=user)
+        .order_by("-created_at", "-id")
+        .values_list("id", flat=True)
+    )
+    assert seen == expected
+
+    counted = c.get("/api/v1/orders/mine?count=1").json()
+    assert (counted["count"], counted["count_exact"]) == (7, True)
+    assert c.get("/api/v1/orders/mine?cursor=@@").status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_explain_flags_full_scans():
+    from apps.orders.management.commands.explain_hot_queries import full_scans, temp_sorts
+
+    assert full_scans("Seq Scan on orders_order  (cost=0.00..1.01 rows=1 width=4)") == [
+        "orders_order"
+    ]
+    assert full_scans("3 0 0 SCAN orders_order") == ["orders_order"]
+    assert (
+        full_scans("5 0 0 SEARCH orders_order USING INDEX idx_order_client_created (client_id=?)")
+        == []
+    )
+    assert full_scans("Index Scan using idx_order_available on orders_order") == []
+    # Проход по индексу — тоже полный проход, если он не задуман ради ORDER BY
+    scan = "3 0 0 SCAN restaurants_restaurant USING COVERING INDEX idx_restaurant_active_latlon"
+    assert full_scans(scan) == ["restaurants_restaurant"]
+    assert full_scans(scan, frozenset({"idx_restaurant_active_latlon"})) == []
+    assert (
+        temp_sorts(
+            "4 0 0 SEARCH orders_order USING INDEX x (status=?)\n"
+            "32 0 0 USE TEMP B-TREE FOR ORDER BY"
+        )
+        == 1
+    )
+
+
+@pytest.mark.django_db
+def test_hot_queries_use_indexes():
+    from django.core.management import call_command
+
+    # На SQLite все горячие запросы обязаны идти по индексам; --fail уронит тест, если нет
+    call_command("explain_hot_queries", "--fail", "--quiet")
+
+
+@pytest.mark.django_db
+def test_update_order_status_cas(auth_client, django_assert_num_queries):
+    from rest_framework import status
+    from apps.orders.models import OrderStatus
+    from apps.users.models import UserRole
+    from .factories import OrderFactory, OrderItemFactory, RestaurantFactory
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    order = OrderFactory(restaurant=RestaurantFactory(owner=owner), status=OrderStatus.PAID)
+    OrderItemFactory.create_batch(3, order=order)
+
+    c = auth_client(owner)
+    # auth-юзер, UPDATE ... RETURNING, позиции с блюдами
+    with django_assert_num_queries(3):
+        resp = c.patch(
+            f"/api/v1/orders/{order.id}/status",
+            {"status": OrderStatus.RESTAURANT_CONFIRMED},
+            format="json",
+        )
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["status"] == OrderStatus.RESTAURANT_CONFIRMED
+    assert len(resp.json()["items"]) == 3
+
+    # Повтор того же перехода — статус уже другой
+    again = c.patch(
+        f"/api/v1/orders/{order.id}/status",
+        {"status": OrderStatus.RESTAURANT_CONFIRMED},
+        format="json",
+    )
+    assert again.status_code == status.HTTP_409_CONFLICT
+
+    stranger = auth_client(UserFactory(role=UserRole.RESTAURANT))
+    resp = stranger.patch(
+        f"/api/v1/orders/{order.id}/status", {"status": OrderStatus.CANCELED}, format="json"
+    )
+    assert resp.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_transition_table_and_signal():
+    from apps.orders.models import OrderStatus
+    from apps.orders.services import InvalidTransition, transition
+    from apps.orders.signals import order_status_changed
+    from .factories import CourierFactory, OrderFactory
+    courier = CourierFactory()
+    order = OrderFactory(courier=courier, status=OrderStatus.ACCEPTED)
+
+    with pytest.raises(InvalidTransition):
+        transition(order.id, [OrderStatus.ACCEPTED], OrderStatus.DELIVERED, actor=courier)
+
+    seen = []
+
+    def _receiver(sender, order, to_state, actor, **kwargs):
+        seen.append((order.id, to_state, actor))
+
+    order_status_changed.connect(_receiver)
+    try:
+        moved = transition(
+            order.id,
+            [OrderStatus.ACCEPTED],
+            OrderStatus.IN_TRANSIT,
+            actor=courier,
+            courier_id=courier.id,
+        )
+        lost = transition(order.id, [OrderStatus.ACCEPTED], OrderStatus.IN_TRANSIT, actor=courier)
+    finally:
+        order_status_changed.disconnect(_receiver)
+    assert moved.status == OrderStatus.IN_TRANSIT and moved.updated_at > order.updated_at
+    assert moved.total == order.total and moved.created_at == order.created_at
+    assert lost is None
+    assert seen == [(order.id, OrderStatus.IN_TRANSIT, courier)]
+
+
+@pytest.mark.django_db
+def test_bulk_update_order_status(auth_client, django_assert_num_queries, monkeypatch):
+    from rest_framework import status
+    from apps.orders import views as order_views
+    from apps.orders.models import Order, OrderStatus
+    from apps.users.models import UserRole
+    from .factories import OrderFactory, RestaurantFactory
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    resto = RestaurantFactory(owner=owner)
+    paid = [OrderFactory(restaurant=resto, status=OrderStatus.PAID) for _ in range(3)]
+    confirmed = OrderFactory(restaurant=resto, status=OrderStatus.RESTAURANT_CONFIRMED)
+    delivered = OrderFactory(restaurant=resto, status=OrderStatus.DELIVERED)
+    foreign = OrderFactory(status=OrderStatus.PAID)
+
+    batches = []
+    monkeypatch.setattr(
+        order_views.broadcast_order_events, "delay", lambda events: batches.append(events)
+    )
+
+    c = auth_client(owner)
+    ids = [o.id for o in paid] + [confirmed.id, delivered.id, foreign.id, 999999]
+    # auth-юзер, права+статусы, по UPDATE на каждый исходный статус (paid, restaurant_confirmed)
+    with django_assert_num_queries(4):
+        resp = c.post(
+            "/api/v1/orders/status/bulk",
+            {"order_ids": ids, "status": OrderStatus.CANCELED},
+            format="json",
+        )
+    assert resp.status_code == status.HTTP_200_OK
+    body = resp.json()
+    assert body["updated"] == 4
+    results = {r["order_id"]: r["result"] for r in body["results"]}
+    assert results == {
+        **{o.id: "updated" for o in paid},
+        confirmed.id: "updated",
+        delivered.id: "conflict",
+        foreign.id: "forbidden",
+        999999: "not_found",
+    }
+    assert len(batches) == 1 and len(batches[0]) == 4
+    assert Order.objects.get(pk=foreign.id).status == OrderStatus.PAID
+
+
+@pytest.mark.django_db
+def test_restaurant_orders_feed(auth_client):
+    from django.utils.dateparse import parse_datetime
+    from rest_framework import status
+    from apps.orders.models import Order
+    from apps.orders.models import OrderStatus
+    from apps.orders.services import transition
+    from apps.users.models import UserRole
+    from .factories import OrderFactory, RestaurantFactory
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    first, second = RestaurantFactory(owner=owner), RestaurantFactory(owner=owner)
+    orders = [
+        OrderFactory(restaurant=first),
+        OrderFactory(restaurant=second),
+        OrderFactory(restaurant=first),
+    ]
+    OrderFactory()  # чужой ресторан
+
+    c = auth_client(owner)
+    page = c.get("/api/v1/orders/incoming?page_size=2").json()
+    assert [o["id"] for o in page["results"]] == [orders[0].id, orders[1].id] and page["has_more"]
+    page = c.get(f"/api/v1/orders/incoming?page_size=2&cursor={page['cursor']}").json()
+    assert [o["id"] for o in page["results"]] == [orders[2].id] and not page["has_more"]
+    cursor = page["cursor"]
+    seen = {(o.id, o.updated_at) for o in Order.objects.filter(pk__in=[o.id for o in orders])}
+
+    def fresh(results):
+        # Дедупликация на клиенте: хвост ленты перечитывает окно ORDER_FEED_OVERLAP_SEC
+        new = [o for o in results if (o["id"], parse_datetime(o["updated_at"])) not in seen]
+        seen.update((o["id"], parse_datetime(o["updated_at"])) for o in new)
+        return [(o["id"], o["status"]) for o in new]
+
+    # Ничего нового — только перечитанное окно, курсор тот же
+    idle = c.get(f"/api/v1/orders/incoming?cursor={cursor}").json()
+    assert fresh(idle["results"]) == [] and idle["results"]
+    assert idle["cursor"] == cursor and not idle["has_more"]
+
+    transition(orders[0].id, [OrderStatus.CREATED], OrderStatus.CANCELED)
+    changed = c.get(f"/api/v1/orders/incoming?cursor={cursor}").json()
+    assert fresh(changed["results"]) == [(orders[0].id, OrderStatus.CANCELED)]
+    cursor = changed["cursor"]
+
+    # Заказ закоммитился позже, чем курсор ушел дальше: updated_at у него меньше курсора
+    late = OrderFactory(restaurant=first)
+    Order.objects.filter(pk=late.id).update(
+        updated_at=Order.objects.get(pk=orders[0].id).updated_at - timedelta(seconds=2)
+    )
+    # Окно длиннее page_size проходим точными курсорами, хвост снова помечен
+    got, has_more = [], True
+    while has_more:
+        page = c.get(f"/api/v1/orders/incoming?page_size=2&cursor={cursor}").json()
+        got += fresh(page["results"])
+        cursor, has_more = page["cursor"], page["has_more"]
+    assert got == [(late.id, OrderStatus.CREATED)]
+
+    assert (
+        auth_client(UserFactory()).get("/api/v1/orders/incoming").status_code
+        == status.HTTP_403_FORBIDDEN
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_restaurant_orders_websocket():
+    from asgiref.sync import async_to_sync, sync_to_async
+    from asgiref.testing import ApplicationCommunicator
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from apps.orders.tasks import broadcast_order_event
+    from apps.users.models import UserRole
+    from foodradar.asgi import application
+    from .factories import OrderFactory, RestaurantFactory
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    order = OrderFactory(restaurant=RestaurantFactory(owner=owner))
+    token = str(RefreshToken.for_user(owner).access_token)
+
+    def _socket(query: str = ""):
+        # Голый ASGI-коммуникатор: channels.testing тянет daphne, а он для этого не нужен
+        scope = {
+            "type": "websocket",
+            "path": "/ws/restaurant/orders/",
+            "query_string": query.encode(),
+            "headers": [],
+        }
+        return ApplicationCommunicator(application, scope)
+
+    async def scenario():
+        anon = _socket()
+        await anon.send_input({"type": "websocket.connect"})
+        assert (await anon.receive_output(timeout=2))["type"] == "websocket.close"
+
+        ws = _socket(f"token={token}")
+        await ws.send_input({"type": "websocket.connect"})
+        assert (await ws.receive_output(timeout=2))["type"] == "websocket.accept"
+        payload = {"type": "status", "order_id": order.id, "status": "paid"}
+        await sync_to_async(broadcast_order_event)(order.id, payload, order.restaurant_id)
+        message = await ws.receive_output(timeout=2)
+        assert json.loads(message["text"]) == payload
+        await ws.send_input({"type": "websocket.disconnect", "code": 1000})
+        await ws.wait(timeout=2)
+
+    async_to_sync(scenario)()
+
+
+@pytest.mark.django_db
+def test_create_order_idempotency_key(auth_client, settings, monkeypatch):
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.utils import timezone
+    from rest_framework import status
+    from apps.orders import idempotency
+    from apps.orders.idempotency import _cache_key
+    from apps.orders.models import IdempotencyKey, Order
+    user = UserFactory()
+    dish = DishFactory()
+    c = auth_client(user)
+    body = {"restaurant_id": dish.restaurant_id, "items": [{"dish_id": dish.id, "qty": 1}]}
+
+    first = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert first.status_code == status.HTTP_201_CREATED
+    retry = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.json() == first.json() and retry["Idempotent-Replayed"] == "true"
+
+    # Кэш вытеснен — ответ поднимается из таблицы
+    cache.clear()
+    from_db = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert from_db.json()["id"] == first.json()["id"]
+    assert Order.objects.filter(client=user).count() == 1
+
+    other = c.post(
+        "/api/v1/orders",
+        {**body, "items": [{"dish_id": dish.id, "qty": 2}]},
+        format="json",
+        HTTP_IDEMPOTENCY_KEY="k-1",
+    )
+    assert other.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # Параллельный дубль, пока первый запрос (другой воркер) держит лок, — 409 после ожидания.
+    # Кэш в тестах — память процесса, поэтому лок — строка «выполняется» в таблице
+    settings.IDEMPOTENCY_WAIT = 0.1
+    IdempotencyKey.objects.create(
+        user=user,
+        key="k-2",
+        fingerprint="-",
+        status_code=None,
+        expires_at=timezone.now() + timedelta(minutes=1),
+    )
+    busy = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-2")
+    assert busy.status_code == status.HTTP_409_CONFLICT
+    assert Order.objects.filter(client=user).count() == 1
+    # Держатель упал: строка истекла — ключ снова свободен
+    IdempotencyKey.objects.filter(key="k-2").update(expires_at=timezone.now())
+    done = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-2")
+    assert done.status_code == status.HTTP_201_CREATED
+    assert IdempotencyKey.objects.get(user=user, key="k-2").status_code == status.HTTP_201_CREATED
+
+    # С общим кэшем (Redis) лок — cache.add
+    monkeypatch.setattr(idempotency, "_shared_cache", lambda: True)
+    cache.add(f"{_cache_key(user.id, 'k-3')}:lock", 1, 30)
+    busy = c.post("/api/v1/orders", body, format="json", HTTP_IDEMPOTENCY_KEY="k-3")
+    assert busy.status_code == status.HTTP_409_CONFLICT
+    assert Order.objects.filter(client=user).count() == 2
+
+
+@pytest.mark.django_db
+def test_archive_moves_finished_orders_and_reads_through(auth_client):
+    from datetime import timedelta
+    from django.utils import timezone
+    from rest_framework import status
+    from apps.orders.archive import archive_finished_orders
+    from apps.orders.models import ArchivedOrder, Order, OrderItem, OrderStatus, Rating
+    from .factories import OrderFactory, OrderItemFactory
+    user = UserFactory()
+    old = timezone.now() - timedelta(days=200)
+    done = [
+        OrderFactory(client=user, status=s) for s in (OrderStatus.DELIVERED, OrderStatus.CANCELED)
+    ]
+    OrderItemFactory.create_batch(2, order=done[0])
+    Rating.objects.create(order=done[0], from_role="client", stars=4)
+    live = OrderFactory(client=user, status=OrderStatus.IN_TRANSIT)
+    fresh_done = OrderFactory(client=user, status=OrderStatus.DELIVERED)
+    Order.objects.filter(pk__in=[o.pk for o in done + [live]]).update(updated_at=old)
+    dish_name = done[0].items.first().dish.name
+
+    assert archive_finished_orders(older_than_days=90, batch_size=1) == 2
+    assert set(Order.objects.values_list("id", flat=True)) == {live.id, fresh_done.id}
+    assert not OrderItem.objects.filter(order_id=done[0].id).exists()
+    archived = ArchivedOrder.objects.get(pk=done[0].id)
+    assert archived.items.count() == 2 and archived.ratings.get().stars == 4
+
+    c = auth_client(user)
+    detail = c.get(f"/api/v1/orders/{done[0].id}")
+    assert detail.status_code == status.HTTP_200_OK
+    assert detail.json()["items"][0]["dish_name"] == dish_name
+
+    seen, cursor = [], None
+    while True:
+        body = c.get(
+            "/api/v1/orders/mine?page_size=1" + (f"&cursor={cursor}" if cursor else "")
+        ).json()
+        seen += [o["id"] for o in body["results"]]
+        cursor = body["next"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted([o.id for o in done] + [live.id, fresh_done.id])
+    assert len(seen) == len(set(seen))
+    assert c.get("/api/v1/orders/mine?count=1").json()["count"] == 4
+    stranger = auth_client(UserFactory())
+    assert stranger.get(f"/api/v1/orders/{done[1].id}").status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_sales_rollups_incremental_match_backfill(auth_client, django_capture_on_commit_callbacks):
+    from django.core.management import call_command
+    from django.utils import timezone
+    from rest_framework import status
+    from apps.orders.models import OrderStatus, RestaurantDailyDishSales, RestaurantDailySales
+    from apps.orders.services import transition
+    from apps.orders.tasks import update_sales_rollup
+    from apps.users.models import UserRole
+    from .factories import OrderFactory, OrderItemFactory, RestaurantFactory
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    resto = RestaurantFactory(owner=owner)
+    dish = DishFactory(restaurant=resto)
+    orders = [
+        OrderFactory(restaurant=resto, status=OrderStatus.PENDING_PAYMENT, total=Decimal("30.00"))
+        for _ in range(3)
+    ]
+    for o in orders:
+        OrderItemFactory(order=o, dish=dish, qty=3)
+    unpaid = OrderFactory(restaurant=resto, status=OrderStatus.PENDING_PAYMENT)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for o in orders:
+            transition(o.id, [OrderStatus.PENDING_PAYMENT], OrderStatus.PAID)
+        transition(orders[0].id, [OrderStatus.PAID], OrderStatus.CANCELED)
+        transition(unpaid.id, [OrderStatus.PENDING_PAYMENT], OrderStatus.CANCELED)
+    # Повтор события не задваивает
+    assert update_sales_rollup(orders[1].id, OrderStatus.PAID) is False
+
+    def snapshot():
+        days = list(
+            RestaurantDailySales.objects.values(
+                "day", "orders_count", "revenue", "canceled_count", "refunded"
+            )
+        )
+        dishes = list(RestaurantDailyDishSales.objects.values("dish_id", "qty", "revenue"))
+        return days, dishes
+
+    incremental = snapshot()
+    assert incremental[0] == [{
+        "day": timezone.localdate(), "orders_count": 3, "revenue": Decimal("90.00"),
+        "canceled_count": 1, "refunded": Decimal("30.00"),
+    }]
+    assert incremental[1] == [{"dish_id": dish.id, "qty": 9, "revenue": Decimal("90.00")}]
+
+    RestaurantDailySales.objects.all().delete()
+    call_command("backfill_sales_rollups", stdout=io.StringIO())
+    assert snapshot() == incremental
+
+    body = auth_client(owner).get(f"/api/v1/restaurants/{resto.id}/sales").json()
+    assert body["totals"]["orders"] == 3 and body["totals"]["avg_ticket"] == "30.00"
+    assert body["totals"]["net_revenue"] == "60.00"
+    assert body["top_dishes"][0] == {
+        "dish_id": dish.id,
+        "dish_name": dish.name,
+        "qty": 9,
+        "revenue": "90.00",
+    }
+    stranger = auth_client(UserFactory(role=UserRole.RESTAURANT))
+    assert (
+        stranger.get(f"/api/v1/restaurants/{resto.id}/sales").status_code
+        == status.HTTP_403_FORBIDDEN
+    )
+    assert stranger.get(f"/api/v1/restaurants/{resto.id}/sales?from=2024-13-01").status_code in (
+        status.HTTP_400_BAD_REQUEST, status.HTTP_403_FORBIDDEN,
+    )
+
+
+@pytest.mark.django_db
+def test_sales_rollup_cancel_ahead_of_paid_event_retries(monkeypatch):
+    from celery.exceptions import Retry
+    from apps.orders.models import OrderStatus, RestaurantDailySales
+    from apps.orders.tasks import update_sales_rollup
+    from .factories import OrderFactory
+    order = OrderFactory(status=OrderStatus.CANCELED, total=Decimal("30.00"))
+    retried = []
+
+    def _retry(exc=None, **kwargs):
+        retried.append(exc)
+        return Retry()
+
+    monkeypatch.setattr(update_sales_rollup, "retry", _retry)
+
+    # Отмена обогнала оплату: задача уходит на повтор, роллапы не тронуты
+    assert update_sales_rollup.apply(args=(order.id, OrderStatus.CANCELED)).state == "RETRY"
+    assert len(retried) == 1 and not RestaurantDailySales.objects.exists()
+
+    assert update_sales_rollup.apply(args=(order.id, OrderStatus.PAID)).get() is True
+    cancel = update_sales_rollup.apply(args=(order.id, OrderStatus.CANCELED), retries=1)
+    assert cancel.get() is True
+    assert RestaurantDailySales.objects.values_list("canceled_count", "refunded").get() == (
+        1, Decimal("30.00")
+    )
+
+    # Последняя попытка, а оплаты так и нет — это отмена до оплаты
+    other = OrderFactory(restaurant=order.restaurant, status=OrderStatus.CANCELED)
+    last = update_sales_rollup.max_retries
+    cancel = update_sales_rollup.apply(args=(other.id, OrderStatus.CANCELED), retries=last)
+    assert cancel.get() is False and len(retried) == 1
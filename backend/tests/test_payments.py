@@ -102,3 +102,65 @@ def test_pay_order_forbidden_for_other_user(api_client, auth_client, monkeypatch
     c = auth_client(other)
     resp = c.post(f"/api/v1/orders/{order.id}/pay")
     assert resp.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_pay_order_idempotency_key_skips_stripe(auth_client, monkeypatch):
+    from rest_framework import status
+    client_user = UserFactory()
+    order = OrderFactory(
+        client=client_user, restaurant=RestaurantFactory(), status=OrderStatus.CREATED
+    )
+
+    from apps.payments import views as pay_views
+
+    calls = []
+
+    def _create(**kwargs):
+        calls.append(kwargs)
+        return {"id": "pi_idem_1", "client_secret": "cs_idem"}
+
+    monkeypatch.setattr(pay_views.stripe.PaymentIntent, "create", _create)
+    monkeypatch.setattr(pay_views.stripe.PaymentIntent, "retrieve", lambda pid: calls.append(pid))
+
+    c = auth_client(client_user)
+    first = c.post(f"/api/v1/orders/{order.id}/pay", HTTP_IDEMPOTENCY_KEY="pay-1")
+    again = c.post(f"/api/v1/orders/{order.id}/pay", HTTP_IDEMPOTENCY_KEY="pay-1")
+    assert first.status_code == again.status_code == status.HTTP_200_OK
+    assert again.json() == first.json()
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_pay_order_retries_after_stripe_failure(auth_client, monkeypatch):
+    from rest_framework import status
+    client_user = UserFactory()
+    order = OrderFactory(
+        client=client_user, restaurant=RestaurantFactory(), status=OrderStatus.CREATED
+    )
+
+    from apps.payments import views as pay_views
+
+    calls = []
+
+    def _create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise pay_views.stripe.APIConnectionError("connection reset")
+        return {"id": "pi_retry_1", "client_secret": "cs_retry"}
+
+    monkeypatch.setattr(pay_views.stripe.PaymentIntent, "create", _create)
+
+    c = auth_client(client_user)
+    failed = c.post(f"/api/v1/orders/{order.id}/pay", HTTP_IDEMPOTENCY_KEY="pay-retry")
+    assert failed.status_code == status.HTTP_502_BAD_GATEWAY
+    # Сбой не сохранен под ключом: ретрай с тем же ключом снова идет в Stripe и оплачивает
+    retried = c.post(f"/api/v1/orders/{order.id}/pay", HTTP_IDEMPOTENCY_KEY="pay-retry")
+    assert retried.status_code == status.HTTP_200_OK
+    assert retried.json()["payment_intent_id"] == "pi_retry_1"
+    assert "Idempotent-Replayed" not in retried
+    # Оба вызова — с одним ключом Stripe: если первый все же дошел, второй вернет тот же PI
+    assert len(calls) == 2
+    assert calls[0]["idempotency_key"] == calls[1]["idempotency_key"]
+    order.refresh_from_db()
+    assert order.status == OrderStatus.PENDING_PAYMENT
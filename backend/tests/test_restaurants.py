@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import pytest
+
+from .factories import RestaurantFactory
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("inmemory_index", [True, False])
+def test_restaurants_list_fallback_sorted_and_within_radius(api_client, settings, inmemory_index):
+    settings.GEO_INMEMORY_INDEX = inmemory_index
+    near = RestaurantFactory(lat=55.751, lon=37.62)
+    nearer = RestaurantFactory(lat=55.7501, lon=37.6101)
+    RestaurantFactory(lat=55.0, lon=38.0)  # далеко, за радиусом
+    RestaurantFactory(lat=55.7502, lon=37.6102, is_active=False)
+
+    resp = api_client.get("/api/v1/restaurants", {"lat": 55.75, "lon": 37.61, "radius": 5})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["id"] for r in results] == [nearer.id, near.id]
+    assert results[0]["distance_km"] < results[1]["distance_km"]
+
+
+@pytest.mark.django_db
+def test_restaurants_list_index_follows_saves(api_client, django_capture_on_commit_callbacks):
+    from django.db import transaction
+    from apps.restaurants.search import restaurant_index
+    resto = RestaurantFactory(lat=55.751, lon=37.62)
+    params = {"lat": 55.75, "lon": 37.61, "radius": 5}
+    assert [r["id"] for r in api_client.get("/api/v1/restaurants", params).json()["results"]] == [
+        resto.id
+    ]
+
+    # Индекс уже загружен — дальше его обновляют сигналы, и индекс, и тайлы — только после коммита
+    resto.lat, resto.lon = 59.93, 30.31
+    with django_capture_on_commit_callbacks() as callbacks:
+        resto.save()
+    assert [r["id"] for r in api_client.get("/api/v1/restaurants", params).json()["results"]] == [
+        resto.id
+    ]
+    for callback in callbacks:
+        callback()
+    assert api_client.get("/api/v1/restaurants", params).json()["results"] == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        moved = RestaurantFactory(lat=55.7505, lon=37.611)
+    assert [r["id"] for r in api_client.get("/api/v1/restaurants", params).json()["results"]] == [
+        moved.id
+    ]
+
+    moved.is_active = False
+    with django_capture_on_commit_callbacks(execute=True):
+        moved.save()
+    assert api_client.get("/api/v1/restaurants", params).json()["results"] == []
+
+    # Откат: несохраненная позиция в индекс не попадает
+    resto.lat, resto.lon = 55.7502, 37.6102
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError), transaction.atomic():
+            resto.save()
+            raise RuntimeError("rollback")
+    assert restaurant_index.query(55.75, 37.61, 5) == []
+
+
+@pytest.mark.django_db
+def test_restaurants_list_tile_cache_hits_and_reranks(api_client, auth_client):
+    from apps.restaurants import cache as tile_cache
+    from apps.users.models import UserRole
+    from .factories import UserFactory
+
+    a = RestaurantFactory(lat=55.7520, lon=37.6150)
+    b = RestaurantFactory(lat=55.7490, lon=37.6095)
+
+    # Две точки в одном тайле, но с разным порядком ближайших
+    first = api_client.get(
+        "/api/v1/restaurants", {"lat": 55.7515, "lon": 37.6148, "radius": 2}
+    ).json()["results"]
+    second = api_client.get(
+        "/api/v1/restaurants", {"lat": 55.7502, "lon": 37.6101, "radius": 2}
+    ).json()["results"]
+    assert tile_cache.tile_of(55.7515, 37.6148) == tile_cache.tile_of(55.7502, 37.6101)
+    assert [r["id"] for r in first] == [a.id, b.id]
+    assert [r["id"] for r in second] == [b.id, a.id]
+    assert tile_cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    admin = UserFactory(role=UserRole.ADMIN)
+    resp = auth_client(admin).get("/api/v1/restaurants/cache/stats")
+    assert resp.status_code == 200
+    assert resp.json()["hits"] == 1
+
+
+def _walk_pages(api_client, params):
+    ids, cursor = [], None
+    while True:
+        resp = api_client.get(
+            "/api/v1/restaurants", {**params, **({"cursor": cursor} if cursor else {})}
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert len(body["results"]) <= params["page_size"]
+        ids.extend(r["id"] for r in body["results"])
+        cursor = body["next"]
+        if not cursor:
+            return ids
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("radius", [5, 50])  # 50 км — мимо тайлового кэша
+def test_restaurants_list_keyset_pages_by_distance(api_client, radius, monkeypatch):
+    from apps.restaurants import views
+
+    restos = [RestaurantFactory(lat=55.75 + i * 0.002, lon=37.61) for i in range(5)]
+    twin = RestaurantFactory(lat=55.75 + 0.002, lon=37.61)  # та же дистанция — порядок по id
+    loaded = []
+    load_hits = views._load_hits
+    monkeypatch.setattr(
+        views, "_load_hits", lambda hits: loaded.append(len(hits)) or load_hits(hits)
+    )
+
+    ids = _walk_pages(api_client, {"lat": 55.75, "lon": 37.61, "radius": radius, "page_size": 2})
+    expected = [restos[0].id, restos[1].id, twin.id] + [r.id for r in restos[2:]]
+    assert ids == expected
+    if radius == 50:
+        # Мимо кэша из БД и в сериализатор идет только страница, а не все попадания
+        assert loaded == [2, 2, 2]
+
+
+@pytest.mark.django_db
+def test_restaurants_list_keyset_pages_by_id_and_rejects_bad_cursor(api_client):
+    restos = [RestaurantFactory() for _ in range(5)]
+    assert _walk_pages(api_client, {"page_size": 2}) == sorted(r.id for r in restos)
+
+    resp = api_client.get("/api/v1/restaurants", {"cursor": "!!!"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_restaurant_menu_etag_304_without_db_and_allergen_variants(
+    api_client, django_assert_num_queries
+):
+    from .factories import DishFactory
+
+    resto = RestaurantFactory()
+    plain = DishFactory(restaurant=resto, allergens=["Gluten"])
+    nutty = DishFactory(restaurant=resto, allergens=["peanut"])
+    DishFactory(restaurant=resto, is_available=False)
+    url = f"/api/v1/restaurants/{resto.id}/menu"
+
+    resp = api_client.get(url)
+    assert resp.status_code == 200
+    assert [d["id"] for d in resp.json()["dishes"]] == [plain.id, nutty.id]
+    etag = resp["ETag"]
+
+    with django_assert_num_queries(0):
+        cached = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert cached.status_code == 304
+        again = api_client.get(url)
+        assert again.status_code == 200 and again.content == resp.content
+
+    filtered = api_client.get(url, {"exclude_allergens": "PEANUT"})
+    assert [d["id"] for d in filtered.json()["dishes"]] == [plain.id]
+    assert filtered["ETag"] != etag
+
+    # Несуществующий ресторан — 404, и версия меню в кэше не заводится
+    from apps.restaurants import menu_cache
+    missing = resto.id + 1000
+    assert api_client.get(f"/api/v1/restaurants/{missing}/menu").status_code == 404
+    assert menu_cache.menu_version(missing) is None
+
+    plain.name = "Новое имя"
+    plain.save()
+    fresh = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert fresh.status_code == 200
+    assert fresh.json()["dishes"][0]["name"] == "Новое имя"
+
+
+@pytest.mark.django_db
+def test_dish_allergen_mask_filters_in_sql_and_backfill():
+    from django.core.management import call_command
+
+    from apps.restaurants.allergens import BITS, mask_of
+    from apps.restaurants.models import Dish
+    from .factories import DishFactory
+
+    resto = RestaurantFactory()
+    bread = DishFactory(restaurant=resto, allergens=["Wheat", "глютен"])
+    satay = DishFactory(restaurant=resto, allergens=["Peanuts", "soy"])
+    exotic = DishFactory(restaurant=resto, allergens=["Durian"])
+    salad = DishFactory(restaurant=resto, allergens=[])
+
+    bread.refresh_from_db()
+    assert bread.allergens == ["gluten"]
+    assert bread.allergen_mask == BITS["gluten"]
+
+    qs = Dish.objects.filter(restaurant=resto).without_allergens(mask_of(["peanut", "gluten"]))
+    assert set(qs.values_list("id", flat=True)) == {exotic.id, salad.id}
+
+    # Строки, записанные в обход save(), чинит бэкфилл
+    Dish.objects.filter(pk=satay.pk).update(allergens=["PEANUTS"], allergen_mask=0)
+    call_command("backfill_allergen_masks", batch=2)
+    satay.refresh_from_db()
+    assert satay.allergens == ["peanut"]
+    assert satay.allergen_mask == BITS["peanut"]
+
+    # То же делает миграция: строки до появления маски не проходят фильтр в SQL
+    from importlib import import_module
+    from django.apps import apps as django_apps
+    migration = import_module("apps.restaurants.migrations.0006_backfill_allergen_masks")
+    Dish.objects.filter(pk=bread.pk).update(allergen_mask=0)
+    migration.backfill_masks(django_apps, None)
+    assert set(qs.values_list("id", flat=True)) == {exotic.id, salad.id}
+
+
+@pytest.mark.django_db
+def test_restaurant_menu_exclusion_uses_canonical_names_without_cached_base(api_client):
+    from .factories import DishFactory
+
+    resto = RestaurantFactory()
+    DishFactory(restaurant=resto, allergens=["milk"])
+    durian = DishFactory(restaurant=resto, allergens=["durian"])
+    safe = DishFactory(restaurant=resto, allergens=["sesame"])
+
+    url = f"/api/v1/restaurants/{resto.id}/menu"
+    resp = api_client.get(url, {"exclude_allergens": "Lactose,DURIAN"})
+    assert [d["id"] for d in resp.json()["dishes"]] == [safe.id]
+    # Тот же вариант из базового меню в кэше
+    assert durian.id in [d["id"] for d in api_client.get(url).json()["dishes"]]
+    assert [
+        d["id"]
+        for d in api_client.get(url, {"exclude_allergens": "dairy, durian"}).json()["dishes"]
+    ] == [safe.id]
+
+
+@pytest.mark.django_db
+def test_import_menus_upserts_in_batches(tmp_path, api_client, django_capture_on_commit_callbacks):
+    from decimal import Decimal
+
+    from django.core.management import CommandError, call_command
+
+    from apps.restaurants.models import Dish, Restaurant
+    from apps.users.models import UserRole
+    from .factories import DishFactory, UserFactory
+
+    owner = UserFactory(role=UserRole.RESTAURANT)
+    existing = RestaurantFactory(
+        owner=owner, name="Chain", address="Tverskaya 1", lat=55.75, lon=37.61
+    )
+    DishFactory(restaurant=existing, name="Borsch", price=Decimal("5.00"))
+    menu_url = f"/api/v1/restaurants/{existing.id}/menu"
+    etag = api_client.get(menu_url)["ETag"]
+
+    src = tmp_path / "menus.csv"
+    src.write_text(
+        "restaurant_name,address,lat,lon,dish_name,price,allergens\n"
+        "Chain,Tverskaya 1,55.75,37.61,Borsch,7.50,\n"
+        "Chain,Tverskaya 1,55.75,37.61,Blini,4.00,eggs;Milk\n"
+        "Chain,Arbat 2,55.7495,37.5915,Blini,4.20,lactose\n",
+        encoding="utf-8",
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("import_menus", str(src), owner=owner.email, batch=2)
+        call_command("import_menus", str(src), owner=owner.email, batch=2)  # повтор — без дублей
+
+    assert Restaurant.objects.filter(owner=owner).count() == 2
+    assert Dish.objects.filter(restaurant__owner=owner).count() == 3
+    assert Dish.objects.get(restaurant=existing, name="Borsch").price == Decimal("7.50")
+    arbat_blini = Dish.objects.get(restaurant__address="Arbat 2", name="Blini")
+    assert arbat_blini.allergens == ["milk"] and arbat_blini.allergen_mask
+
+    # Кэши сброшены: меню с новой версией, новый ресторан виден в гео-выдаче
+    assert api_client.get(menu_url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    nearby = api_client.get(
+        "/api/v1/restaurants", {"lat": 55.7495, "lon": 37.5915, "radius": 1}
+    ).json()
+    assert [r["address"] for r in nearby["results"]] == ["Arbat 2"]
+
+    # Импорт упал на третьей строке: закоммиченная первая пачка меню все равно сбросила
+    etag = api_client.get(menu_url)["ETag"]
+    src.write_text(
+        "restaurant_name,address,lat,lon,dish_name,price\n"
+        "Chain,Tverskaya 1,55.75,37.61,Borsch,8.00\n"
+        "Chain,Tverskaya 1,55.75,37.61,Blini,4.00\n"
+        "Chain,Tverskaya 1,not-a-number,37.61,Pelmeni,6.00\n",
+        encoding="utf-8",
+    )
+    with django_capture_on_commit_callbacks(execute=True), pytest.raises(CommandError):
+        call_command("import_menus", str(src), owner=owner.email, batch=2)
+    assert Dish.objects.get(restaurant=existing, name="Borsch").price == Decimal("8.00")
+    assert api_client.get(menu_url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_rating_counters_feed_list_without_extra_queries(api_client, django_assert_num_queries):
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.orders.models import Order, Rating
+    from apps.restaurants.models import Restaurant
+    from .factories import CourierFactory, OrderFactory
+    courier = CourierFactory()
+    resto = RestaurantFactory(lat=55.7501, lon=37.6101)
+    orders = [OrderFactory(restaurant=resto, courier=courier, status="delivered") for _ in range(2)]
+    Rating.objects.create(order=orders[0], from_role="client", stars=5)
+    Rating.objects.create(order=orders[1], from_role="client", stars=4)
+    Rating.objects.create(order=orders[1], from_role="restaurant", stars=3)
+    Rating.objects.create(order=orders[1], from_role="courier", stars=1)  # про клиента — не считаем
+
+    resto.refresh_from_db()
+    courier.refresh_from_db()
+    assert (resto.rating_count, resto.rating_sum, resto.rating_avg) == (2, 9, 4.5)
+    assert (courier.courier_rating_count, courier.courier_rating_sum) == (3, 12)
+
+    # Прогреваем гео-индекс в другом тайле; дальше — одна выборка ресторанов, без подзапросов Rating
+    api_client.get("/api/v1/restaurants", {"lat": 50.0, "lon": 30.0, "radius": 1})
+    with django_assert_num_queries(1):
+        resp = api_client.get("/api/v1/restaurants", {"lat": 55.75, "lon": 37.61, "radius": 5})
+    row = resp.json()["results"][0]
+    assert (row["rating"], row["rating_count"]) == (4.5, 2)
+
+    # Новая оценка тайл не сбрасывает: выдача отстает не дольше GEO_CACHE_TTL
+    from django.core.cache import cache
+    Rating.objects.create(order=orders[0], from_role="client", stars=3)
+    nearby = {"lat": 55.75, "lon": 37.61, "radius": 5}
+    row = api_client.get("/api/v1/restaurants", nearby).json()["results"][0]
+    assert (row["rating"], row["rating_count"]) == (4.5, 2)
+    cache.clear()  # TTL истек
+    row = api_client.get("/api/v1/restaurants", nearby).json()["results"][0]
+    assert (row["rating"], row["rating_count"]) == (4.0, 3)
+    Rating.objects.filter(order=orders[0], stars=3).delete()
+
+    Restaurant.objects.filter(pk=resto.pk).update(rating_count=0, rating_sum=0)
+    Order.objects.filter(pk=orders[0].pk).update(courier=None)
+    call_command("reconcile_ratings", stdout=StringIO())
+    resto.refresh_from_db()
+    courier.refresh_from_db()
+    assert (resto.rating_count, resto.rating_sum) == (2, 9)
+    assert (courier.courier_rating_count, courier.courier_rating_sum) == (2, 7)